@@ -0,0 +1,20 @@
+#!/bin/sh
+# Run the benchmarks of benchmarks/bench_*.py. Baselines are only meaningful on the machine they were
+# taken on, so they are kept out of git:
+#   ./benchmark.sh --benchmark-save=<name>   saves a baseline of this machine
+#   ./benchmark.sh --benchmark-compare       compares with the last one, failing if the median time
+#                                            of a benchmark got more than 50% slower
+# The benchmarks need the development dependencies: pip install -r requirements-dev.txt
+cd "$(dirname "$0")"
+compare=
+for arg in "$@"; do
+    case "$arg" in
+        --benchmark-compare-fail*) compare=given ;;
+        --benchmark-compare*) [ -z "$compare" ] && compare=default ;;
+    esac
+done
+if [ "$compare" = default ]; then
+    set -- --benchmark-compare-fail=median:50% "$@"
+fi
+python -m pytest benchmarks -o python_files='bench_*.py' \
+    --benchmark-storage=benchmarks/baselines --benchmark-sort=fullname "$@"
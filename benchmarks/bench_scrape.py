@@ -0,0 +1,28 @@
+''' Extraction of what kt needs from saved Kattis pages, with every html parser installed '''
+from pathlib import Path
+
+import pytest
+
+from kttool import scrape
+
+PAGES = Path(__file__).absolute().parent / 'pages'
+
+CASES = [
+    ('problem.html', 'parse_samples'),
+    ('submission.html', 'parse_submission'),
+    ('problems.html', 'parse_problem_list'),
+]
+
+
+@pytest.fixture(params=scrape.available_parsers())
+def parser(request, monkeypatch):
+    monkeypatch.setenv(scrape.PARSER_ENV, request.param)
+    monkeypatch.setattr(scrape, '_parser', None)
+    return request.param
+
+
+@pytest.mark.parametrize('page, extraction', CASES)
+def test_parse(benchmark, parser, page, extraction):
+    html = (PAGES / page).read_bytes()
+    result = benchmark(getattr(scrape, extraction), html)
+    assert result
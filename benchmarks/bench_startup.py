@@ -0,0 +1,28 @@
+''' Wall time of a whole kt command, from the start of the interpreter '''
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+KT = Path(__file__).absolute().parent.parent / 'kt'
+
+
+@pytest.mark.parametrize('command', ['version', 'test'])
+def test_startup(benchmark, problem, command):
+    if command == 'test':
+        (problem / 'in1.txt').write_bytes(b'1\n')
+        (problem / 'ans1.txt').write_bytes(b'1\n')
+    args = [sys.executable, str(KT), command]
+
+    benchmark.pedantic(
+        subprocess.run,
+        args=(args, ),
+        kwargs={
+            'cwd': problem,
+            'stdout': subprocess.DEVNULL,
+            'check': True
+        },
+        rounds=20,
+        warmup_rounds=2
+    )
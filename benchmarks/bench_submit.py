@@ -0,0 +1,48 @@
+''' `kt submit --all` against the fake Kattis of the tests, with latency on every request and
+submissions judged over a few seconds, to time the uploads and the polling of a batch
+'''
+import sys
+from pathlib import Path
+
+import pytest
+
+from kttool.actions.submit import Submit
+
+sys.path.insert(0, str(Path(__file__).absolute().parents[1] / 'tests'))
+from fake_kattis import FakeKattis, FakeProblem, accepted, rejected  # noqa: E402
+
+PROBLEMS = 8
+LATENCY = 0.05
+
+
+@pytest.fixture
+def kattis():
+    problems = [
+        FakeProblem(
+            f'problem{i}', [('', '')],
+            test_cases=4,
+            timeline=rejected(4, 3, 0.2) if i % 3 == 0 else accepted(4, 0.2)
+        ) for i in range(PROBLEMS)
+    ]
+    with FakeKattis(problems, latency=LATENCY) as server:
+        yield server
+
+
+@pytest.fixture
+def folders(home, kattis, monkeypatch):
+    (home / '.kattisrc').write_text(kattis.kattisrc())
+    # the rate limit of the real Kattis would dominate the timing
+    monkeypatch.setattr(Submit, '_SUBMIT_INTERVAL', 0.)
+    ret = home / 'contest'
+    ret.mkdir()
+    for problem_id in kattis.problems:
+        (ret / problem_id).mkdir()
+        (ret / problem_id / f'{problem_id}.py').write_text('')
+    return ret
+
+
+def test_submit_batch(benchmark, kattis, folders):
+    benchmark.pedantic(
+        lambda: Submit('--all', cwd=folders).act(), rounds=3, iterations=1
+    )
+    assert len(kattis.submissions) == 3 * PROBLEMS
@@ -0,0 +1,56 @@
+''' `kt test` on samples of increasing size, and the checkers on their own '''
+import io
+
+import pytest
+
+# aliased, pytest would try to collect a class named Test
+from kttool.actions.test import Test as TestAction
+from kttool.checkers import make_checker
+
+SIZES = {'1KB': 1 << 10, '1MB': 1 << 20, '16MB': 16 << 20}
+
+
+def _numbers(size: int) -> bytes:
+    line = b'123456789 987654321\n'
+    return line * (size // len(line))
+
+
+@pytest.mark.parametrize('size', list(SIZES))
+def test_compare_samples(benchmark, problem, size):
+    data = _numbers(SIZES[size])
+    for i in range(1, 5):
+        (problem / f'in{i}.txt').write_bytes(data)
+        (problem / f'ans{i}.txt').write_bytes(data)
+    test = TestAction('--jobs', '1', cwd=problem)
+    test.read_config_from_file()
+    test._detect_code_files()
+    samples = test._gather_samples()
+
+    benchmark(test._compare_samples, samples)
+
+
+@pytest.mark.parametrize('checker_name', ['line', 'token', 'float'])
+@pytest.mark.parametrize('size', ['1MB', '16MB'])
+def test_checker(benchmark, tmp_path, checker_name, size):
+    data = _numbers(SIZES[size])
+    (tmp_path / 'in1.txt').write_bytes(b'')
+    (tmp_path / 'ans1.txt').write_bytes(data)
+    checker = make_checker(checker_name)
+
+    comparison = benchmark(
+        lambda: checker.check(
+            tmp_path / 'in1.txt', tmp_path / 'ans1.txt', io.BytesIO(data), 5
+        )
+    )
+    assert comparison.is_ac
+
+
+@pytest.mark.parametrize('count', [10, 1000, 5000])
+def test_gather_samples(benchmark, problem, count):
+    for i in range(1, count + 1):
+        (problem / f'in{i}.txt').write_bytes(b'1\n')
+        (problem / f'ans{i}.txt').write_bytes(b'1\n')
+    test = TestAction(cwd=problem)
+
+    samples = benchmark.pedantic(test._gather_samples, rounds=3)
+    assert len(samples) == count
@@ -0,0 +1,37 @@
+import json
+
+import pytest
+
+KATTISRC = '[user]\nusername = bench\ntoken = abc\n\n[kattis]\nhostname = open.kattis.com\n'
+
+
+@pytest.fixture
+def home(tmp_path, monkeypatch):
+    """ Home folder with a kattisrc and a template whose program copies its input to its output
+    without any startup cost worth measuring, so that the benchmarks time kt itself
+    """
+    (tmp_path / '.kattisrc').write_text(KATTISRC)
+    (tmp_path / '.ktconfig').write_text(
+        json.dumps({
+            'py3': {
+                'path': '',
+                'pre_script': '',
+                'script': 'cat',
+                'post_script': '',
+                'default': True
+            }
+        })
+    )
+    monkeypatch.setenv('HOME', str(tmp_path))
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    monkeypatch.setenv('KT_NO_DAEMON', '1')
+    return tmp_path
+
+
+@pytest.fixture
+def problem(home):
+    """ Problem folder with a code file, samples are added by each benchmark """
+    ret = home / 'hello'
+    ret.mkdir()
+    (ret / 'hello.py').write_text('')
+    return ret
@@ -0,0 +1,60 @@
+''' Time the html parser backends of kttool.scrape on the pages saved in benchmarks/pages
+
+    python benchmarks/html_parsers.py [--number N]
+
+Each extraction is compared with a full BeautifulSoup(html, 'html.parser') tree, which is what kt
+built for every page before the backends were introduced
+'''
+import argparse
+import os
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).absolute().parent.parent))
+
+from bs4 import BeautifulSoup  # noqa: E402
+
+from kttool import scrape  # noqa: E402
+
+PAGES = Path(__file__).absolute().parent / 'pages'
+# page and the extraction that kt runs on it
+CASES = [
+    ('problem.html', 'parse_samples'),
+    ('submission.html', 'parse_submission'),
+    ('problems.html', 'parse_problem_list'),
+]
+
+
+def _time(fn, number: int) -> float:
+    """ Best of 3 rounds, in ms per call """
+    return min(timeit.repeat(fn, number=number, repeat=3)) / number * 1e3
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--number', type=int, default=50)
+    opts = parser.parse_args()
+
+    backends = scrape.available_parsers()
+    print(f'{"page":<18}{"full bs4 tree":>15}' + ''.join(f'{x:>22}' for x in backends))
+    for page, extraction in CASES:
+        html = (PAGES / page).read_bytes()
+        baseline = _time(lambda: BeautifulSoup(html, 'html.parser'), opts.number)
+        row = f'{page:<18}{baseline:>12.2f} ms'
+        expected = None
+        for backend in backends:
+            os.environ[scrape.PARSER_ENV] = backend
+            scrape._parser = None
+            fn = getattr(scrape, extraction)
+            result = fn(html)
+            # every backend has to extract the same thing
+            assert expected is None or result == expected, (backend, result, expected)
+            expected = result
+            taken = _time(lambda: fn(html), opts.number)
+            row += f'{taken:>10.2f} ms ({baseline / taken:>5.1f}x)'
+        print(row)
+
+
+if __name__ == '__main__':
+    main()
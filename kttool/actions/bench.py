@@ -0,0 +1,288 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import math
+import os
+import shlex
+import statistics
+import subprocess
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import BinaryIO, List, Tuple
+from typing_extensions import final
+from ..base import Action, CodeFile
+from ..checkers import Checker, make_checker
+from ..logger import color_cyan, color_green, color_red, log, log_cyan, log_green, log_red
+from ..runner import AC, WA, Limits, output_file, run_program
+from ..samples import Sample, find_samples
+from ..stats import welch_test
+
+__all__ = ['Bench']
+
+
+@dataclass
+class Contender:
+    ''' Measures of one of the solutions on one sample '''
+    code: CodeFile
+    cpu_times: List[float] = field(default_factory=list)
+    wall_times: List[float] = field(default_factory=list)
+    # verdict of the first run, the other runs are only timed. A solution that fails it is not run
+    # again on the sample
+    verdict: None | str = None
+    detail: str = ''
+    output_digest: str = ''
+
+    @property
+    def median(self) -> float:
+        return statistics.median(self.cpu_times)
+
+
+@dataclass
+class SampleBench:
+    sample: Sample
+    contenders: Tuple[Contender, Contender]
+
+    @property
+    def both_accepted(self) -> bool:
+        return all(x.verdict == AC for x in self.contenders)
+
+    @property
+    def outputs_match(self) -> bool:
+        """ Whether both solutions printed the same output, only told when both were accepted """
+        a, b = self.contenders
+        return not self.both_accepted or a.output_digest == b.output_digest
+
+    @property
+    def speedup(self) -> float:
+        """ How many times faster the second solution is than the first one """
+        a, b = self.contenders
+        if not b.median:
+            return math.inf if a.median else 1.
+        return a.median / b.median
+
+    @property
+    def p_value(self) -> float:
+        a, b = self.contenders
+        return welch_test(a.cpu_times, b.cpu_times)
+
+
+@final
+class Bench(Action):
+    """Usage: kt bench <solution> <other solution> [--runs N] [--warmup K] [--pin CPU]
+               [--time-limit SEC] [--memory-limit MB] [--output-limit MB] [--checker CHECKER]
+               [--float-tolerance EPS] [--no-cache]
+
+    Tell which of two solutions of the problem is faster on its samples, and whether they agree.
+    Both are built with the pre_script of their template, then run in turns on every sample (AB, BA,
+    AB...) so that any drift of the machine affects both equally. The first output of each solution
+    is checked against the answer of the sample, a solution that fails it is not run again on that
+    sample, and the outputs of two accepted solutions are compared with each other. A table
+    gives the median cpu time of both solutions on each sample, the speedup of the second one and the
+    p-value of a Welch t-test on their cpu times
+
+    Options
+    --------
+    solution, other solution: code files of the current folder, run with their ktconfig template
+    --runs N, -n N: number of timed runs of each solution on each sample. Default is 10
+    --warmup K: untimed runs of each solution on each sample before the timed ones. Default is 1
+    --pin CPU: run both solutions on that cpu only (Linux)
+    --time-limit SEC, --memory-limit MB, --output-limit MB: limits of both solutions, as for
+        `kt test`
+    --checker CHECKER, --float-tolerance EPS: how outputs are checked against the answers, see
+        `kt test --help`
+    --no-cache: always run before_script, instead of reusing the files it produced for an unchanged
+        source (cached in ~/.cache/kt/build)
+    """
+
+    REQUIRED_CONFIG = True
+
+    _SIGNIFICANCE = 0.05
+
+    limits: Limits
+    checker: Checker
+    _opts: argparse.Namespace
+    __slots__ = 'limits', 'checker', '_opts'
+
+    def __init__(self, *args: str, cwd: None | Path = None):
+        super().__init__(cwd=cwd)
+        self._opts = self._parse_options(args)
+        self.limits = Limits()
+        self.checker = make_checker('line')
+
+    @staticmethod
+    def _parse_options(args: Tuple[str, ...]) -> argparse.Namespace:
+        parser = argparse.ArgumentParser(prog='kt bench', add_help=False)
+        parser.add_argument('solution')
+        parser.add_argument('other_solution')
+        parser.add_argument('-n', '--runs', type=int, default=10)
+        parser.add_argument('--warmup', type=int, default=1)
+        parser.add_argument('--pin', type=int, default=None)
+        Action.add_judge_options(parser)
+        parser.add_argument('--no-cache', action='store_true')
+        opts = parser.parse_args(list(args))
+        if opts.runs < 1 or opts.warmup < 0:
+            parser.error('--runs must be at least 1 and --warmup at least 0')
+        if opts.pin is not None and not hasattr(os, 'sched_setaffinity'):
+            parser.error('--pin is not supported on this system')
+        return opts
+
+    @staticmethod
+    def _digest(output: BinaryIO) -> str:
+        output.seek(0)
+        h = hashlib.sha256()
+        for chunk in iter(lambda: output.read(1 << 20), b''):
+            h.update(chunk)
+        return h.hexdigest()
+
+    def _run(self, sample: Sample, contender: Contender, timed: bool) -> None:
+        """ Run a solution once on `sample`. Its first run, warmup or not, is also judged """
+        with output_file() as output:
+            run = run_program(
+                shlex.split(f'{contender.code.script} -'),
+                sample.input_file,
+                self.limits,
+                cwd=self.cwd,
+                stdout=output,
+                cpu=self._opts.pin
+            )
+            if timed:
+                contender.cpu_times.append(run.cpu_time)
+                contender.wall_times.append(run.wall_time)
+            if contender.verdict is not None:
+                return
+            contender.verdict = run.verdict(self.limits)
+            if contender.verdict is not None:
+                contender.detail = run.describe_exit() if run.returncode else ''
+                return
+            contender.output_digest = self._digest(output)
+            output.seek(0)
+            comparison = self.checker.check(
+                sample.input_file, sample.output_file, output, 1
+            )
+        contender.verdict = AC if comparison.is_ac else WA
+
+    def _bench_sample(
+        self, sample: Sample, codes: Tuple[CodeFile, CodeFile]
+    ) -> SampleBench:
+        bench = SampleBench(sample, (Contender(codes[0]), Contender(codes[1])))
+        a, b = bench.contenders
+        for i in range(self._opts.warmup + self._opts.runs):
+            # alternate the order, so that neither solution always runs right after the other one
+            for contender in ((a, b) if i % 2 == 0 else (b, a)):
+                # timing a solution that already failed the sample would only waste time
+                if contender.verdict in (None, AC):
+                    self._run(sample, contender, timed=i >= self._opts.warmup)
+        return bench
+
+    @staticmethod
+    def _describe(contender: Contender) -> str:
+        if contender.verdict != AC:
+            return color_red(f'{contender.verdict:<13}')
+        return f'{contender.median:>8.3f} s   '
+
+    def _report(self, bench: SampleBench) -> None:
+        a, b = bench.contenders
+        line = f'{f"#{bench.sample.name}":<9}{self._describe(a)}{self._describe(b)}'
+        if not bench.both_accepted:
+            log_red(line)
+            for contender in bench.contenders:
+                if contender.detail:
+                    log_red(f'         {contender.code.path.name}: {contender.detail}')
+            return
+        speedup = bench.speedup
+        p_value = bench.p_value
+        line = f'{line}{speedup:>7.2f}x   p {"< 0.001" if p_value < 0.001 else f"{p_value:.3f}"}'
+        if not bench.outputs_match:
+            line = f'{line}   {color_red("outputs differ")}'
+        if not p_value < self._SIGNIFICANCE:
+            log(line)
+        elif speedup > 1:
+            log_green(line)
+        else:
+            log_red(line)
+
+    def _summarize(
+        self, benches: List[SampleBench], codes: Tuple[CodeFile, CodeFile]
+    ) -> None:
+        judged = [
+            x for x in benches if x.both_accepted and 0 < x.speedup < math.inf
+        ]
+        disagreements = [x.sample.name for x in benches if not x.outputs_match]
+        if disagreements:
+            log_red(
+                f'The outputs differ on {len(disagreements)} sample(s): '
+                f'{", ".join(f"#{x}" for x in disagreements)}'
+            )
+        elif all(x.both_accepted for x in benches):
+            log_green('Both solutions print the same outputs')
+        else:
+            log_green('Both solutions print the same outputs on the samples they both pass')
+        if not judged:
+            return
+        # geometric mean, so that a sample twice faster and one twice slower even out
+        speedup = math.exp(
+            statistics.fmean(math.log(x.speedup) for x in judged)
+        )
+        significant = sum(1 for x in judged if x.p_value < self._SIGNIFICANCE)
+        if not significant:
+            log(
+                f'No significant difference between {color_cyan(codes[0].path.name)} and '
+                f'{color_cyan(codes[1].path.name)} (speedup {speedup:.2f}x, geometric mean over '
+                f'{len(judged)} samples)'
+            )
+            return
+        faster, slower = codes[1].path.name, codes[0].path.name
+        if speedup < 1:
+            faster, slower, speedup = slower, faster, 1 / speedup
+        log(
+            f'{color_cyan(faster)} is {color_green(f"{speedup:.2f}x")} faster than '
+            f'{color_cyan(slower)} overall (geometric mean over {len(judged)} samples, '
+            f'significant on {significant})'
+        )
+
+    def _run_post_script(self, code: CodeFile) -> None:
+        if code.post_script:
+            log_cyan(f'running {code.post_script}')
+            subprocess.check_call(shlex.split(code.post_script), cwd=self.cwd)
+
+    def _act(self) -> None:
+        codes = (
+            self.load_code_file(Path(self._opts.solution)),
+            self.load_code_file(Path(self._opts.other_solution))
+        )
+        samples = find_samples(self.cwd)
+        if not samples:
+            log_red('No sample found')
+            return
+        self.limits = self.load_limits(self._opts)
+        self.checker = self.load_checker(self._opts)
+        log(f'Problem ID : {color_cyan(self._get_problem_id())}')
+        log(f'A          : {codes[0].path.name} ({codes[0].lang})')
+        log(f'B          : {codes[1].path.name} ({codes[1].lang})')
+        log(
+            f'Runs       : {self._opts.runs} timed and {self._opts.warmup} warmup per '
+            f'solution on each of the {len(samples)} samples'
+        )
+
+        built: List[CodeFile] = []
+        try:
+            # built one after the other, the build cache tells artifacts apart by the files each
+            # pre_script created
+            for code in codes:
+                if code not in built:
+                    self.build(code, use_cache=not self._opts.no_cache)
+                    built.append(code)
+
+            log_cyan(
+                f'{"Sample":<9}{"A (cpu)":>10}   {"B (cpu)":>10}   {"speedup":>8}   significance'
+            )
+            benches = []
+            for sample in samples:
+                bench = self._bench_sample(sample, codes)
+                self._report(bench)
+                benches.append(bench)
+            self._summarize(benches, codes)
+        finally:
+            for code in built:
+                self._run_post_script(code)
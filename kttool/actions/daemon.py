@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import argparse
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Tuple
+from typing_extensions import final
+from ..base import Action
+from ..client import connect, recv_message, send_message, socket_path
+from ..logger import color_cyan, color_green, log, log_green, log_red
+
+__all__ = ['Daemon']
+
+
+@final
+class Daemon(Action):
+    """Usage: kt daemon start|stop|status [--idle-timeout SEC] [--foreground]
+
+    Keep kt running in the background, so that the next kt commands do not have to start python,
+    import kt and its libraries and parse the config files again. While the daemon runs, `kt <command>`
+    only sends the command to it and the command runs on the same terminal, in the same folder, as
+    it would otherwise. The daemon stops by itself once no command arrived for a while
+
+    Options
+    --------
+    start: start the daemon, if it is not running yet
+    stop: stop the daemon. Commands still running are not interrupted
+    status: tell whether the daemon is running
+    --idle-timeout SEC: seconds without any command after which the daemon stops. Default is 1800
+    --foreground: with start, serve from this process instead of a background one
+    """
+
+    _START_TIMEOUT = 10.
+
+    _opts: argparse.Namespace
+    __slots__ = '_opts'
+
+    def __init__(self, *args: str, cwd: None | Path = None):
+        super().__init__(cwd=cwd)
+        self._opts = self._parse_options(args)
+
+    @staticmethod
+    def _parse_options(args: Tuple[str, ...]) -> argparse.Namespace:
+        parser = argparse.ArgumentParser(prog='kt daemon', add_help=False)
+        parser.add_argument('command', choices=['start', 'stop', 'status'])
+        parser.add_argument('--idle-timeout', type=float, default=1800.)
+        parser.add_argument('--foreground', action='store_true')
+        return parser.parse_args(list(args))
+
+    @staticmethod
+    def _control(command: str) -> None | Dict[str, Any]:
+        """ Send a control command to the daemon, None if it is not running """
+        sock = connect()
+        if sock is None:
+            return None
+        with sock:
+            send_message(sock, {'control': command})
+            return recv_message(sock.makefile('rb'))
+
+    def _serve(self) -> None:
+        from ..daemon import DaemonServer
+        DaemonServer(self._opts.idle_timeout).serve()
+
+    def _start(self) -> None:
+        status = self._control('status')
+        if status is not None:
+            log(f'kt daemon is already running (pid {color_cyan(status["pid"])})')
+            return
+        if self._opts.foreground:
+            log_green(f'kt daemon listening on {socket_path()}')
+            self._serve()
+            return
+
+        pid = os.fork()
+        if pid == 0:
+            # detach from the terminal and the session of the kt process
+            os.setsid()
+            if os.fork():
+                os._exit(0)
+            devnull = os.open(os.devnull, os.O_RDWR)
+            for fd in range(3):
+                os.dup2(devnull, fd)
+            os.chdir('/')
+            try:
+                self._serve()
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+
+        deadline = time.monotonic() + self._START_TIMEOUT
+        while time.monotonic() < deadline:
+            status = self._control('status')
+            if status is not None:
+                log_green(f'kt daemon started (pid {status["pid"]})')
+                return
+            time.sleep(0.05)
+        log_red('kt daemon did not start')
+
+    def _act(self) -> None:
+        if not hasattr(os, 'fork'):
+            raise RuntimeError('kt daemon is only available on unix systems')
+        if self._opts.command == 'start':
+            self._start()
+            return
+        status = self._control(self._opts.command)
+        if status is None:
+            log('kt daemon is not running')
+        elif self._opts.command == 'stop':
+            log_green(f'kt daemon stopped (pid {status["pid"]})')
+        else:
+            uptime = time.time() - status['started_at']
+            log(
+                f'kt daemon is running (pid {color_cyan(status["pid"])}), up for {uptime:.0f} s, '
+                f'{color_green(status["served"])} commands served, {status["running"]} running, '
+                f'stops after {status["idle_timeout"]:.0f} s without commands'
+            )
@@ -1,15 +1,19 @@
 from __future__ import annotations
 
+import argparse
+import re
 import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 from typing_extensions import final
-import bs4
-from bs4 import BeautifulSoup
+import requests
 
 from ..base import Action, require_login
+from ..cache import CachedPage, PageCache
 from ..logger import log, log_green, log_red
+from ..scrape import parse_page_text, parse_samples
 from ..utils import MAP_TEMPLATE_TO_PLANG
 
 __all__ = ['Gen']
@@ -25,23 +29,62 @@ class _SampleData:
 
 @final
 class Gen(Action):
-    """Usage: kt gen <problem_id>
+    """Usage: kt gen <problem_id> [problem_id ...] [--from-file FILE] [--offline]
 
     Generate a folder which contains the template code (for the default language of choice) and the sample inputs and outputs associated with the 
     problem id. 
+    Problem pages are cached in ~/.cache/kt/pages and only downloaded again when they changed
 
     Options
     --------
-    problem_id: Kattis problem id
+    problem_id: Kattis problem id. With several problem ids, their pages are fetched concurrently
+    --from-file FILE: also generate the problem ids listed in FILE, one per line. Empty lines and
+        lines starting with # are ignored
+    --offline: only use the cached problem pages, without any network access
     """
     REQUIRED_CONFIG = True
 
-    problem_id: str
-    __slots__ = 'problem_id'
+    # number of problem pages fetched at the same time
+    _FETCH_JOBS = 8
+
+    problem_id: None | str
+    _opts: argparse.Namespace
+    __slots__ = 'problem_id', '_opts'
+
+    def __init__(self, *args: str, cwd: None | Path = None):
+        super().__init__(cwd=cwd)
+        self._opts = self._parse_options(args)
+        if not self._opts.problem_ids and self._opts.from_file is None:
+            raise ValueError('No problem id provided')
+        self.problem_id = self._parse_problem_id(
+            self._opts.problem_ids[0]
+        ) if self._opts.problem_ids else None
+
+    @staticmethod
+    def _parse_options(args: Tuple[str, ...]) -> argparse.Namespace:
+        parser = argparse.ArgumentParser(prog='kt gen', add_help=False)
+        parser.add_argument('problem_ids', nargs='*')
+        parser.add_argument('--from-file', type=Path, default=None)
+        parser.add_argument('--offline', action='store_true')
+        return parser.parse_args(list(args))
 
-    def __init__(self, problem_id: str, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.problem_id = self._parse_problem_id(problem_id)
+    def _problem_ids(self) -> List[str]:
+        """ Problem ids given on the command line then in `--from-file`, without duplicates """
+        raw_ids = list(self._opts.problem_ids)
+        if self._opts.from_file is not None:
+            with open(self.cwd / self._opts.from_file) as f:
+                raw_ids += [
+                    line.strip() for line in f
+                    if line.strip() and not line.lstrip().startswith('#')
+                ]
+        problem_ids: List[str] = []
+        for raw_id in raw_ids:
+            problem_id = self._parse_problem_id(raw_id)
+            if not problem_id:
+                log_red(f'Unable to parse problem id {raw_id}')
+            elif problem_id not in problem_ids:
+                problem_ids.append(problem_id)
+        return problem_ids
 
     @staticmethod
     def _write_sample(sample_data: _SampleData, root_path: Path) -> None:
@@ -61,7 +104,7 @@ class Gen(Action):
     @staticmethod
     def _parse_problem_id(raw_input: str) -> Optional[str]:
         def _is_url(s: str) -> bool:
-            return 'open.kattis.com' in s
+            return '://' in s or 'kattis.com' in s
 
         def _parse_problem_id_from_url(url_like: str) -> Optional[str]:
             parts = url_like.split('/')
@@ -73,7 +116,9 @@ class Gen(Action):
             raw_input
         ) else _parse_problem_id_from_url(raw_input)
 
-    def _parse_sample_data(self, data: bs4.ResultSet) -> List[_SampleData]:
+    @staticmethod
+    def _parse_sample_data(data: List[str],
+                           problem_id: str) -> List[_SampleData]:
         sample_data = []
         if data is None:
             return []
@@ -82,8 +127,8 @@ class Gen(Action):
                 sample_data.append(
                     _SampleData(
                         sample_id=i // 2 + 1,
-                        data=data[i].text,
-                        problem_id=self.problem_id,
+                        data=data[i],
+                        problem_id=problem_id,
                         is_input=False
                     )
                 )
@@ -91,27 +136,95 @@ class Gen(Action):
                 sample_data.append(
                     _SampleData(
                         sample_id=i // 2 + 1,
-                        data=data[i].text,
-                        problem_id=self.problem_id,
+                        data=data[i],
+                        problem_id=problem_id,
                         is_input=True
                     )
                 )
         return sample_data
 
-    def _parse_samples_url(self, url: str) -> None | bs4.ResultSet:
-        page = self._request_get(url)
-        soup = BeautifulSoup(page.content, 'html.parser')
-        ret: None | bs4.ResultSet = None
-        for sample in soup.find_all('table', class_='sample'):
-            if ret is None:
-                ret = sample.find_all('pre')
-            else:
-                ret += sample.find_all('pre')
-        return ret
-
     @require_login
-    def _generate_samples(self) -> None:
-        """ Generate sample input file for `self.problem_id`
+    def _fetch_problem_page(
+        self, url: str, cached: None | CachedPage
+    ) -> requests.Response:
+        """ GET the problem page, conditionally if a version of it is cached """
+        headers = {}
+        if cached is not None and cached.etag:
+            headers['If-None-Match'] = cached.etag
+        if cached is not None and cached.last_modified:
+            headers['If-Modified-Since'] = cached.last_modified
+        return self._request_get(url, headers=headers)
+
+    def _load_problem_page(self, url: str, problem_id: str) -> CachedPage:
+        """ The problem page, its samples and its limits. The cached page is used when the server says
+        it did not change, when the server can not be reached or fails, or in offline mode
+
+        Raises
+        ------
+        RuntimeError
+            If the page is not cached in offline mode, or if the server did not answer with the
+            page and it is not cached
+        """
+        cache = PageCache()
+        host = self.get_url('hostname')
+        cached = cache.load(host, problem_id)
+        if self._opts.offline:
+            if cached is None:
+                raise RuntimeError(
+                    f'{problem_id} has never been generated, it can not be generated offline'
+                )
+            return cached
+        try:
+            response = self._fetch_problem_page(url, cached)
+        except requests.ConnectionError:
+            if cached is None:
+                raise
+            log_red(f'Unable to reach {host}, using the cached page')
+            return cached
+        if response.status_code == 304 and cached is not None:
+            return cached
+        if response.status_code >= 500 and cached is not None:
+            log_red(
+                f'{host} answered {response.status_code}, using the cached page'
+            )
+            return cached
+        if response.status_code == 404:
+            raise RuntimeError(f'Problem {problem_id} does not exist on {host}')
+        if response.status_code != 200:
+            raise RuntimeError(
+                f'Unable to fetch {problem_id}. Status code: {response.status_code}'
+            )
+
+        page = CachedPage(
+            content=response.content,
+            etag=response.headers.get('ETag', ''),
+            last_modified=response.headers.get('Last-Modified', ''),
+            samples=parse_samples(response.content),
+            limits=self._parse_limits(parse_page_text(response.content))
+        )
+        if page.samples:
+            cache.save(host, problem_id, page)
+        return page
+
+    @staticmethod
+    def _parse_limits(page_text: str) -> Dict[str, float]:
+        """ Parse the published cpu time limit (in seconds) and memory limit (in MB) of the problem """
+        text = ' '.join(page_text.split())
+        limits: Dict[str, float] = {}
+        time_limit = re.search(
+            r'CPU Time limit\s*:?\s*(\d+(?:\.\d+)?)\s*second', text, re.I
+        )
+        if time_limit is not None:
+            limits['time_limit'] = float(time_limit.group(1))
+        memory_limit = re.search(
+            r'Memory limit\s*:?\s*(\d+(?:\.\d+)?)\s*MB', text, re.I
+        )
+        if memory_limit is not None:
+            limits['memory_limit'] = float(memory_limit.group(1))
+        return limits
+
+    def _generate_samples(self, problem_id: str, page: CachedPage) -> None:
+        """ Generate sample input file for `problem_id` from its problem `page`
         The basic flow is to scrape the problem task page and retrieve the relevent fields
         Generate the sample files to problem id folder
         For example, if the problem id is distinctivecharacter, `kt gen` will
@@ -122,11 +235,11 @@ class Gen(Action):
         + distinctivecharacter/ans1.txt
         + distinctivecharacter/in2.txt
         + distinctivecharacter/ans2.txt
+        - Save the cpu time and memory limits of the problem to distinctivecharacter/.ktproblem
         - Generate a template file (distinctivecharacter.cpp) if a template file is provided in the .ktconfig file
         """
-        url = self.get_problem_url()
-        data = self._parse_samples_url(url)
-        sample_data = self._parse_sample_data(data)
+        data = page.samples
+        sample_data = self._parse_sample_data(data, problem_id)
 
         assert len(data) % 2 == 0, 'Internal error: Number of sample input '\
             f' is not equal to number of sample output data={data!r}'
@@ -135,13 +248,16 @@ class Gen(Action):
             self._write_sample(sample, self.cwd)
 
         log_green(
-            f'Generate {len(sample_data) // 2} sample(s) to {self.problem_id}'
+            f'Generate {len(sample_data) // 2} sample(s) to {problem_id}'
         )
 
+        if page.limits:
+            self.save_problem_config(page.limits, self.cwd / problem_id)
+
     def _get_problem_id(self) -> str:
         return self.problem_id
 
-    def _generate_template_file(self):
+    def _generate_template_file(self, problem_id: str) -> None:
         """_summary_
         """
         template_file = {}
@@ -161,20 +277,61 @@ class Gen(Action):
                     template_file_location
                 ).is_file():
                     continue
-                target_location = self.cwd / f'{self.problem_id}/{self.problem_id}.{MAP_TEMPLATE_TO_PLANG[k].extension}'
+                target_location = self.cwd / f'{problem_id}/{problem_id}.{MAP_TEMPLATE_TO_PLANG[k].extension}'
                 target_location.parent.mkdir(parents=True, exist_ok=True)
                 shutil.copyfile(template_file_location, target_location)
                 log_green('Template file has been generated')
                 return
         log_red(f'No default template detected in {self.kt_config}')
 
+    def _generate(self, problem_id: str, page: CachedPage) -> None:
+        log(f'Problem is {problem_id}')
+        problem_dir = self.cwd / problem_id
+        problem_dir.mkdir(parents=True, exist_ok=True)
+        self._generate_samples(problem_id, page)
+        self._generate_template_file(problem_id)
+
+    def _generate_all(self, problem_ids: List[str]) -> None:
+        """ Fetch the problem pages on a bounded pool of threads sharing the session, and generate each
+        problem folder as soon as its page arrives
+        """
+        if not self._opts.offline:
+            # any other failure to log in aborts the batch, rather than having every worker try again
+            try:
+                self.login()
+            except requests.ConnectionError:
+                log_red(
+                    f'Unable to reach {self.get_url("hostname")}, using the cached pages'
+                )
+                self._opts.offline = True
+        with ThreadPoolExecutor(
+            max_workers=min(self._FETCH_JOBS, len(problem_ids))
+        ) as executor:
+            futures = {
+                executor.submit(
+                    self._load_problem_page,
+                    self.get_problem_url(problem_id), problem_id
+                ): problem_id
+                for problem_id in problem_ids
+            }
+            for future in as_completed(futures):
+                problem_id = futures[future]
+                try:
+                    self._generate(problem_id, future.result())
+                except Exception as e:
+                    log_red(f'Unable to generate {problem_id}: {e}')
+
     def _act(self) -> None:
-        if self.problem_id is None:
+        problem_ids = self._problem_ids()
+        if not problem_ids:
             log_red(f'Unable to parse problem id')
             return
+        if len(problem_ids) > 1:
+            self._generate_all(problem_ids)
+            return
 
-        log(f'Problem is {self.problem_id}')
-        problem_dir = self.cwd / self.problem_id
-        problem_dir.mkdir(parents=True, exist_ok=True)
-        self._generate_samples()
-        self._generate_template_file()
+        problem_id = problem_ids[0]
+        self._generate(
+            problem_id,
+            self._load_problem_page(self.get_problem_url(problem_id), problem_id)
+        )
@@ -0,0 +1,288 @@
+from __future__ import annotations
+
+import argparse
+import io
+import os
+import shlex
+import subprocess
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Deque, List, Tuple
+from typing_extensions import final
+from ..base import Action, CodeFile
+from ..checkers import Checker, make_checker
+from ..logger import color_cyan, color_green, log, log_cyan, log_green, log_red
+from ..runner import AC, WA, Limits, RunResult, run_program
+from ..samples import CASE_FILE
+
+__all__ = ['Stress']
+
+
+@dataclass
+class Iteration:
+    seed: int
+    raw_input: bytes = b''
+    answer: bytes = b''
+    verdict: None | str = None
+    detail: str = ''
+    diff: List[str] = field(default_factory=list)
+    # set when the generator or the reference solution failed, which stops the whole run
+    error: str = ''
+
+    @property
+    def failed(self) -> bool:
+        return self.verdict not in (None, AC)
+
+
+@final
+class Stress(Action):
+    """Usage: kt stress <generator> <reference> <solution> [--iterations N] [--seed S] [--jobs N]
+               [--time-limit SEC] [--memory-limit MB] [--output-limit MB] [--checker CHECKER]
+               [--float-tolerance EPS] [--no-cache]
+
+    Look for an input on which the solution disagrees with a reference (usually brute force) solution.
+    For every seed, the generator is run as `<generator script> <seed>` and must print a random input.
+    Both solutions are then run on this input and the output of the solution is checked against the
+    output of the reference solution. kt stops at the first disagreement and saves the smallest failing
+    input found as a new sample in{N}.txt / ans{N}.txt, so it is picked up by `kt test` from then on
+
+    Options
+    --------
+    generator, reference, solution: code files of the current folder, run with their ktconfig template
+    --iterations N, -n N: number of seeds to try. Default is 1000
+    --seed S: first seed. Default is 1
+    --jobs N, -j N: number of iterations to run concurrently. Default is the number of cores
+    --time-limit SEC, --memory-limit MB, --output-limit MB: limits of the solution, as for `kt test`.
+        The generator and the reference solution run without limits
+    --checker CHECKER, --float-tolerance EPS: how outputs are checked, see `kt test --help`
+    --no-cache: always run before_script, instead of reusing the files it produced for an unchanged
+        source (cached in ~/.cache/kt/build)
+    """
+
+    REQUIRED_CONFIG = True
+
+    _MAX_INPUT_SHOWN = 2048
+    _PROGRESS_INTERVAL = 1.
+
+    limits: Limits
+    checker: Checker
+    _opts: argparse.Namespace
+    _stopped: threading.Event
+    _workdir: None | Path
+    __slots__ = 'limits', 'checker', '_opts', '_stopped', '_workdir'
+
+    def __init__(self, *args: str, cwd: None | Path = None):
+        super().__init__(cwd=cwd)
+        self._opts = self._parse_options(args)
+        self.limits = Limits()
+        self.checker = make_checker('line')
+        self._stopped = threading.Event()
+        self._workdir = None
+
+    @staticmethod
+    def _parse_options(args: Tuple[str, ...]) -> argparse.Namespace:
+        parser = argparse.ArgumentParser(prog='kt stress', add_help=False)
+        parser.add_argument('generator')
+        parser.add_argument('reference')
+        parser.add_argument('solution')
+        parser.add_argument('-n', '--iterations', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('-j', '--jobs', type=int, default=None)
+        Action.add_judge_options(parser)
+        parser.add_argument('--no-cache', action='store_true')
+        return parser.parse_args(list(args))
+
+    def _run_iteration(
+        self, seed: int, generator: CodeFile, reference: CodeFile,
+        solution: CodeFile
+    ) -> Iteration:
+        """ Generate the input of `seed`, then run and check both solutions on it. Like
+        `Test._run_sample`, this runs in the worker threads and must not log anything
+        """
+        it = Iteration(seed=seed)
+        if self._stopped.is_set():
+            return it
+        unlimited = Limits()
+        gen = run_program(
+            [*shlex.split(generator.script), str(seed)], b'', unlimited,
+            cwd=self.cwd
+        )
+        if gen.verdict(unlimited) is not None:
+            it.error = f'generator failed on seed {seed} ({gen.describe_exit()})'
+            return it
+        it.raw_input = gen.output
+
+        ref = run_program(
+            shlex.split(f'{reference.script} -'), it.raw_input, unlimited,
+            cwd=self.cwd
+        )
+        if ref.verdict(unlimited) is not None:
+            it.error = f'reference solution failed on seed {seed} ({ref.describe_exit()})'
+            return it
+        it.answer = ref.output
+
+        run: RunResult = run_program(
+            shlex.split(f'{solution.script} -'), it.raw_input, self.limits,
+            cwd=self.cwd
+        )
+        it.verdict = run.verdict(self.limits)
+        if it.verdict is not None:
+            it.detail = run.describe_exit() if run.returncode else ''
+            return it
+
+        # checkers read the input and the answer from files
+        input_file = self._workdir / f'in{seed}.txt'
+        answer_file = self._workdir / f'ans{seed}.txt'
+        input_file.write_bytes(it.raw_input)
+        answer_file.write_bytes(it.answer)
+        try:
+            comparison = self.checker.check(
+                input_file, answer_file, io.BytesIO(run.output), 5
+            )
+        finally:
+            input_file.unlink()
+            answer_file.unlink()
+        it.verdict = AC if comparison.is_ac else WA
+        it.diff = comparison.diff
+        return it
+
+    def _stress(
+        self, generator: CodeFile, reference: CodeFile, solution: CodeFile
+    ) -> Tuple[int, List[Iteration], str]:
+        """ Run the iterations in seed order on a pool of worker threads, each of them waiting on its
+        own subprocesses. Only a bounded window of iterations is queued at any time. Once an iteration
+        fails no new one is started, but the ones already running are still collected
+
+        Returns
+        -------
+        Tuple[int, List[Iteration], str]
+            number of iterations done, the failed iterations and the error that stopped the run if any
+        """
+        jobs = max(1, self._opts.jobs or os.cpu_count() or 1)
+        seeds = iter(
+            range(self._opts.seed, self._opts.seed + self._opts.iterations)
+        )
+        done = 0
+        failures: List[Iteration] = []
+        error = ''
+        last_progress = time.perf_counter()
+        pending: Deque[Future] = deque()
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+
+            def refill() -> None:
+                while len(pending) < 2 * jobs and not self._stopped.is_set():
+                    seed = next(seeds, None)
+                    if seed is None:
+                        return
+                    pending.append(
+                        executor.submit(
+                            self._run_iteration, seed, generator, reference,
+                            solution
+                        )
+                    )
+
+            refill()
+            while pending:
+                it: Iteration = pending.popleft().result()
+                if it.error:
+                    error = error or it.error
+                    self._stopped.set()
+                elif it.verdict is not None:
+                    done += 1
+                    if it.failed:
+                        failures.append(it)
+                        self._stopped.set()
+                refill()
+                if time.perf_counter() - last_progress >= self._PROGRESS_INTERVAL:
+                    last_progress = time.perf_counter()
+                    log(f'{done} iterations done...')
+        return done, failures, error
+
+    def _next_sample_index(self) -> int:
+        indices = [
+            # compressed samples count too, their index must not be reused
+            int(m.group(2)) for m in map(
+                CASE_FILE.fullmatch,
+                (x.name for x in self.cwd.iterdir())
+            ) if m is not None
+        ]
+        return max(indices, default=0) + 1
+
+    def _save_sample(self, it: Iteration) -> Tuple[Path, Path]:
+        idx = self._next_sample_index()
+        input_file = self.cwd / f'in{idx}.txt'
+        answer_file = self.cwd / f'ans{idx}.txt'
+        input_file.write_bytes(it.raw_input)
+        answer_file.write_bytes(it.answer)
+        return input_file, answer_file
+
+    def _report_failure(self, it: Iteration) -> None:
+        line = f'Seed {it.seed}: {it.verdict}'
+        if it.detail:
+            line = f'{line}   ({it.detail})'
+        log_red(line)
+        log_cyan('--- Input ---')
+        log(it.raw_input[:self._MAX_INPUT_SHOWN].decode(errors='replace'))
+        if len(it.raw_input) > self._MAX_INPUT_SHOWN:
+            log_cyan(f'... ({len(it.raw_input)} bytes in total)')
+        if it.diff:
+            log_cyan('--- Diff ---')
+            for line in it.diff:
+                log(line)
+        input_file, answer_file = self._save_sample(it)
+        log_cyan(f'Saved as {input_file.name} / {answer_file.name}')
+
+    def _run_post_script(self, code: CodeFile) -> None:
+        if code.post_script:
+            log_cyan(f'running {code.post_script}')
+            subprocess.check_call(shlex.split(code.post_script), cwd=self.cwd)
+
+    def _act(self) -> None:
+        codes = [
+            self.load_code_file(Path(x)) for x in (
+                self._opts.generator, self._opts.reference,
+                self._opts.solution
+            )
+        ]
+        self.limits = self.load_limits(self._opts)
+        self.checker = self.load_checker(self._opts)
+        log(f'Problem ID : {color_cyan(self._get_problem_id())}')
+        log(f'Generator  : {codes[0].path.name}')
+        log(f'Reference  : {codes[1].path.name}')
+        log(f'Solution   : {codes[2].path.name} ({codes[2].lang})')
+
+        built: List[CodeFile] = []
+        try:
+            # built one after the other, the build cache tells artifacts apart by the files each
+            # pre_script created
+            for code in codes:
+                if code not in built:
+                    self.build(code, use_cache=not self._opts.no_cache)
+                    built.append(code)
+
+            start_time = time.perf_counter()
+            with tempfile.TemporaryDirectory(prefix='kt_stress') as workdir:
+                self._workdir = Path(workdir)
+                done, failures, error = self._stress(*codes)
+            taken = time.perf_counter() - start_time
+            rate = done / taken if taken > 0 else 0.
+            log(
+                f'{color_green(done)} iterations in {taken:.2f} s ({rate:.1f} iterations/s)'
+            )
+            if error:
+                log_red(error)
+            if failures:
+                # the smallest failing input is the easiest one to debug
+                self._report_failure(
+                    min(failures, key=lambda x: (len(x.raw_input), x.seed))
+                )
+            elif not error:
+                log_green('No difference found')
+        finally:
+            for code in built:
+                self._run_post_script(code)
@@ -1,16 +1,18 @@
 from __future__ import annotations
+import argparse
+import asyncio
 import re
 import time
 from dataclasses import dataclass
-from typing import Optional, Set
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
 from typing_extensions import final
 import emoji
 import requests
-from bs4 import BeautifulSoup
-from bs4.element import ResultSet
 from reprint import output
-from ..base import Action, require_login
-from ..logger import color_cyan, color_green, color_red, log_cyan, log_green
+from ..base import Action, CodeFile, require_login
+from ..logger import color_cyan, color_green, color_red, log_cyan, log_green, log_red
+from ..scrape import parse_submission
 
 __all__ = ['Submit']
 
@@ -27,7 +29,7 @@ class SubmissionResult:
 
 @dataclass
 class SubmissionParseResult:
-    test_cases: ResultSet
+    test_cases: List[List[str]]  # classes of each test case
     overall_status: str
     run_time: str
 
@@ -40,17 +42,165 @@ class SubmissionVerdict:
     is_done: bool
     run_time: str
     is_rejected: bool
+    status: str = ''
+
+
+# status ids of the json view of a submission
+_STATUS_MAP = {
+    0: 'New',
+    1: 'New',
+    2: 'Waiting for compile',
+    3: 'Compiling',
+    4: 'Waiting for run',
+    5: 'Running',
+    6: 'Judge Error',
+    7: 'Submission Error',
+    8: 'Compile Error',
+    9: 'Run-Time Error',
+    10: 'Memory Limit Exceeded',
+    11: 'Output Limit Exceeded',
+    12: 'Time Limit Exceeded',
+    13: 'Illegal Function',
+    14: 'Wrong Answer',
+    16: 'Accepted',
+}
+_RUNNING_STATUS = 5
+_ACCEPTED_STATUS = 16
+
+
+class SubmissionPoller:
+    ''' Poll the judgement of a submission.
+    The lightweight json view of the submission is used when the server provides it, otherwise the
+    full page is parsed. Requests are conditional (If-None-Match / If-Modified-Since) whenever the
+    server sent an ETag or a Last-Modified header, and the interval between two polls adapts to the
+    state of the submission: short while it waits to be compiled or run, growing exponentially while
+    it runs, and back to short whenever a test case is judged
+    '''
+    FAST_INTERVAL = 0.25
+    RUNNING_INTERVAL = 0.5
+    MAX_INTERVAL = 4.
+    BACKOFF = 1.5
+
+    def __init__(self, action: 'Submit', submission: SubmissionResult):
+        self.action = action
+        self.submission = submission
+        self.json_supported = True
+        self.verdict: None | SubmissionVerdict = None
+        self._validators: Dict[str, str] = {}
+        self._interval = self.FAST_INTERVAL
+
+    def _conditional_get(self, url: str) -> None | requests.Response:
+        """ GET `url`, None if it did not change since the last response """
+        headers = {}
+        if 'ETag' in self._validators:
+            headers['If-None-Match'] = self._validators['ETag']
+        if 'Last-Modified' in self._validators:
+            headers['If-Modified-Since'] = self._validators['Last-Modified']
+        response = self.action._request_get(url, headers=headers)
+        if response.status_code == 304:
+            return None
+        self._validators = {
+            k: response.headers[k]
+            for k in ('ETag', 'Last-Modified') if k in response.headers
+        }
+        return response
+
+    def _poll_json(self) -> None | SubmissionVerdict:
+        response = self._conditional_get(f'{self.submission.submission_url}?json')
+        if response is None:
+            return self.verdict
+        try:
+            status = response.json()
+            return Submit._parse_json_verdict(status)
+        except (ValueError, KeyError, TypeError):
+            # no json view on this server, stick to the full page from now on
+            self.json_supported = False
+            self._validators = {}
+            return self._poll_page()
+
+    def _poll_page(self) -> None | SubmissionVerdict:
+        response = self._conditional_get(self.submission.submission_url)
+        if response is None:
+            return self.verdict
+        result = self.action._parse_results_from_soup(response.content)
+        if result is None:
+            return None
+        return Submit._parse_verdict(result)
+
+    def poll(self) -> None | SubmissionVerdict:
+        """ Fetch the current judgement of the submission
+
+        Returns
+        -------
+        None | SubmissionVerdict
+            None if the judgement could not be read yet
+        """
+        verdict = self._poll_json() if self.json_supported else self._poll_page()
+        if verdict is not None:
+            self._adapt_interval(verdict)
+            self.verdict = verdict
+        return verdict
+
+    def _adapt_interval(self, verdict: SubmissionVerdict) -> None:
+        previous = self.verdict
+        progressed = previous is None or previous.ac_test_cases != verdict.ac_test_cases \
+            or previous.status != verdict.status
+        if verdict.status != 'Running':
+            self._interval = self.FAST_INTERVAL
+        elif progressed:
+            self._interval = self.RUNNING_INTERVAL
+        else:
+            self._interval = min(self._interval * self.BACKOFF, self.MAX_INTERVAL)
+
+    @property
+    def interval(self) -> float:
+        """ Seconds to wait before the next poll """
+        return self._interval
 
 
 @final
 class Submit(Action):
-    """Usage: kt submit
+    """Usage: kt submit [folder ...] [--all] [--jobs N] [--timeout SEC]
 
     Submit the current code in the directionary (assumed to be generated using kttool) to the host and check for result. 
     If multiple suitables runable code files are detected, the user can specify which one to submit
+
+    Options
+    --------
+    folder: submit the problem of each folder instead (the folder name is the problem id), and follow
+        their judgement in a single table. The code file of a folder is the one named after the problem,
+        or the only runnable file of the folder
+    --all: submit every problem folder of the current folder
+    --jobs N, -j N: number of submissions uploaded at the same time. Default is 4
+    --timeout SEC: stop waiting for the judgement after SEC seconds. Default is 600
     """
     REQUIRED_CONFIG = True
 
+    _DEFAULT_TIMEOUT = 600.
+    _DEFAULT_JOBS = 4
+    # minimum delay between the start of two uploads of a batch, to stay clear of the rate limit
+    _SUBMIT_INTERVAL = 0.5
+
+    _opts: argparse.Namespace
+    __slots__ = '_opts',
+
+    def __init__(self, *args: str, cwd: None | Path = None):
+        super().__init__(cwd=cwd)
+        self._opts = self._parse_options(args)
+
+    @staticmethod
+    def _parse_options(args: Tuple[str, ...]) -> argparse.Namespace:
+        parser = argparse.ArgumentParser(prog='kt submit', add_help=False)
+        parser.add_argument('folders', nargs='*')
+        parser.add_argument('--all', action='store_true')
+        parser.add_argument(
+            '-j', '--jobs', type=int, default=Submit._DEFAULT_JOBS
+        )
+        parser.add_argument(
+            '--timeout', type=float, default=Submit._DEFAULT_TIMEOUT
+        )
+        return parser.parse_args(list(args))
+
     _PENDING_STATE = {
         'Compiling', 'Running', 'New', 'Waiting for compile', 'Waiting for run'
     }
@@ -77,8 +227,7 @@ class Submit(Action):
         status = parsed_result.overall_status
         rejected = False
 
-        for res in parsed_result.test_cases:
-            _class = res.get('class', None)
+        for _class in parsed_result.test_cases:
             if not _class:
                 continue
             if 'is-accepted' in _class:
@@ -104,133 +253,141 @@ class Submit(Action):
             ac_test_cases=ac_ct,
             is_done=finished,
             run_time=parsed_result.run_time,
-            is_rejected=rejected
+            is_rejected=rejected,
+            status=status
         )
 
-    def _is_finished(
-        self, output_lines: output.SignalDict,
-        submission_result: SubmissionResult,
-        parsed_result: Optional[SubmissionParseResult]
-    ) -> bool:
-        """ Judge whether the result and status obtained from kattis submission
-        page has indicated whether the solution judgement has been done
-
-        Parameters
-        ----------
-        output_lines : output
-            console object to print multiple lines inline
-        result : SubmissionParseResult
-            Parsed result objects
-
-        Returns
-        -------
-        bool
-            Whether if the task has been finished marking from kattis
+    @staticmethod
+    def _parse_json_verdict(status: dict) -> SubmissionVerdict:
+        """ Build the verdict from the json view of a submission, which holds the status id, the
+        index of the test case being judged and the html of the submission row
         """
-        if parsed_result is None:
-            return False
-
-        verdict: None | SubmissionVerdict = self._parse_verdict(parsed_result)
-        if verdict is None:
-            return False
-        res = [AC_ICON] * verdict.ac_test_cases
-        if verdict.is_rejected:
-            res.append(RJ_ICON)
-        while len(res) < verdict.num_test_cases:
-            res.append(SK_ICON)
+        status_id = int(status['status_id'])
+        testcase_index = int(status.get('testcase_index') or 0)
+        row_html = status.get('row_html') or ''
+        text = _STATUS_MAP.get(status_id, f'Unknown status {status_id}')
+        total = re.search(r'Test case \d+/(\d+)', row_html)
+        num_test_cases = int(total.group(1)) if total is not None else 0
+        run_time = re.search(r'data-type="cpu"[^>]*>\s*([^<]*?)\s*<', row_html)
+
+        finished = status_id > _RUNNING_STATUS
+        rejected = finished and status_id != _ACCEPTED_STATUS
+        if status_id == _ACCEPTED_STATUS:
+            ac_ct = num_test_cases
+            verdict = color_green(text)
+        elif rejected:
+            ac_ct = max(0, testcase_index - 1)
+            verdict = color_red(text)
+        else:
+            ac_ct = testcase_index
+            verdict = color_cyan(text)
+        return SubmissionVerdict(
+            verdict=verdict,
+            num_test_cases=max(num_test_cases, ac_ct + rejected),
+            ac_test_cases=ac_ct,
+            is_done=finished,
+            run_time=run_time.group(1).replace('&nbsp;', ' ')
+            if run_time is not None else '',
+            is_rejected=rejected and testcase_index > 0,
+            status=text
+        )
 
+    def _display_verdict(
+        self, output_lines: output.SignalDict,
+        submission_result: SubmissionResult, verdict: SubmissionVerdict
+    ) -> None:
         display_output = {
             'current time': time.strftime('%02l:%M%p %Z on %b %d, %Y'),
             'language': self.lang,
             'problem id': self._get_problem_id(),
-            'running time': parsed_result.run_time,
+            'running time': verdict.run_time,
             'submission id': submission_result.submission_id,
             'submission result': verdict.verdict,
-            'test cases': emoji.emojize(' '.join(res), use_aliases=True)
+            'test cases': self._render_test_cases(verdict)
         }
         for k, v in display_output.items():
             output_lines[k.ljust(20)] = str(v)
 
-        return verdict.is_done
-
-    @require_login
-    def _query_submission_id_url(
-        self, submission_result: SubmissionResult
-    ) -> BeautifulSoup:
-        page = self._request_get(submission_result.submission_url)
-        soup = BeautifulSoup(page.content, 'html.parser')
-        return soup
+    @staticmethod
+    def _render_test_cases(verdict: SubmissionVerdict) -> str:
+        res = [AC_ICON] * verdict.ac_test_cases
+        if verdict.is_rejected:
+            res.append(RJ_ICON)
+        while len(res) < verdict.num_test_cases:
+            res.append(SK_ICON)
+        return emoji.emojize(' '.join(res), use_aliases=True)
 
     def _parse_results_from_soup(
-        self, soup: BeautifulSoup
+        self, page: bytes
     ) -> Optional[SubmissionParseResult]:
-
-        try:
-            submission_data = soup.find(
-                'div', class_='status testcase testcase-row'
-            )
-            status_ret = soup.find(
-                'div', class_='status'
-            ).next_element.next_element
-
-            runtime_ret = status_ret.next_element
-            return SubmissionParseResult(
-                submission_data, status_ret.text, runtime_ret.text
-            )
-        except:
-            ...
+        row = parse_submission(page)
+        if row is None:
+            return None
+        return SubmissionParseResult(row.test_cases, row.status, row.run_time)
 
     def _render_result(self, submission_result: SubmissionResult) -> None:
-        """ Continuously polling for result from `submission_url_ret`
+        """ Poll the judgement of the submission until it is done or the deadline is reached
 
         Parameters
         ----------
-        submission_url_ret : str
-            url for the submission to be checked
+        submission_result : SubmissionResult
+            the submission to be checked
         """
-        time_out = 60
-        cur_time = 0
+        poller = SubmissionPoller(self, submission_result)
+        deadline = time.monotonic() + self._opts.timeout
         done = False
-        sleep_time = 0.4
 
         with output(output_type='dict') as output_lines:
-            while cur_time < time_out:
+            while time.monotonic() < deadline:
                 try:
-                    soup: BeautifulSoup = self._query_submission_id_url(
-                        submission_result
-                    )
-                    result = self._parse_results_from_soup(soup)
-                    done = self._is_finished(
-                        output_lines, submission_result, result
-                    )
-                    if done:
-                        break
+                    verdict = poller.poll()
+                    if verdict is not None:
+                        self._display_verdict(
+                            output_lines, submission_result, verdict
+                        )
+                        done = verdict.is_done
+                        if done:
+                            break
                 except Exception as ex:
                     log_cyan(f'Waitinng for result...')
 
-                time.sleep(sleep_time)
-                cur_time += sleep_time
+                time.sleep(
+                    max(0., min(poller.interval, deadline - time.monotonic()))
+                )
+        if not done:
+            log_cyan(
+                f'Still judging after {self._opts.timeout:g} s, see {submission_result.submission_url}'
+            )
 
     @require_login
     def _submit_code_file(self) -> Optional[SubmissionResult]:
         problem_id = self._get_problem_id()
         if not self._detect_code_files():
             return None
+        return self._submit(
+            problem_id, CodeFile(
+                self.file_name, self.lang, self.pre_script, self.script,
+                self.post_script
+            )
+        )
+
+    def _submit(self, problem_id: str, code: CodeFile) -> SubmissionResult:
+        """ Submit `code` as a solution of `problem_id`, the user must be logged in """
         data = {
             'submit': 'true',
             'submit_ctr': 2,
-            'language': self.lang,
+            'language': code.lang,
             'mainclass': '',
             'problem': problem_id,
             'tag': '',
             'script': 'true'
         }
         files = []
-        with open(self.file_name) as sub_file:
+        with open(code.path) as sub_file:
             files.append(
                 (
                     'sub_file[]', (
-                        self.file_name.name, sub_file.read(),
+                        code.path.name, sub_file.read(),
                         'application/octet-stream'
                     )
                 )
@@ -256,8 +413,145 @@ class Submit(Action):
                 err = f'Status code: {ret.status_code}'
             raise RuntimeError(f'Submission failed: {err}')
 
+    def _find_code_file(self, folder: Path) -> None | CodeFile:
+        """ Code file to submit from a problem folder, without asking: the one named after the problem,
+        or the only runnable file of the folder
+        """
+        extensions = self._acceptable_file_ext()
+        runnable_files = sorted(
+            x for x in folder.iterdir()
+            if x.is_file() and x.suffix[1:] in extensions
+        )
+        named = [x for x in runnable_files if x.stem == folder.name]
+        if named:
+            runnable_files = named
+        if len(runnable_files) != 1:
+            return None
+        return self.load_code_file(runnable_files[0])
+
+    def _batch_folders(self) -> List[Path]:
+        if self._opts.all:
+            return sorted(
+                x.resolve() for x in self.cwd.iterdir()
+                if x.is_dir() and not x.name.startswith('.')
+            )
+        # a folder given twice is submitted once
+        return list(
+            dict.fromkeys((self.cwd / x).resolve() for x in self._opts.folders)
+        )
+
+    def _render_row(
+        self, submission: SubmissionResult, verdict: None | SubmissionVerdict
+    ) -> str:
+        if verdict is None:
+            return f'{submission.submission_id:<10} {color_cyan("Submitted")}'
+        return f'{submission.submission_id:<10} {verdict.verdict:<30} {verdict.run_time:<8} ' \
+            f'{self._render_test_cases(verdict)}'
+
+    def _row_label(self, folder: Path) -> str:
+        """ Label of the row of `folder` in the table of a batch, its path from the current folder """
+        try:
+            label = str(folder.relative_to(self.cwd.resolve()))
+        except ValueError:
+            label = str(folder)
+        return label.ljust(24)
+
+    async def _submit_batch(self, jobs: List[Tuple[Path, CodeFile]]) -> None:
+        """ Submit every (problem folder, code file) of `jobs` and track their judgement in one table.
+        The problem id is the name of the folder, rows are keyed by folder so that two folders of the
+        same problem have a row each.
+
+        kt logs in once, then at most `--jobs` submissions are uploaded at the same time, at least
+        `_SUBMIT_INTERVAL` seconds apart. The requests themselves are blocking, so they run in the
+        default thread pool over the shared session. A single polling loop follows every pending
+        submission, each of them with its own `SubmissionPoller` and its own polling interval
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.login)
+        semaphore = asyncio.Semaphore(self._opts.jobs)
+        spacing = asyncio.Lock()
+        pollers: Dict[Path, SubmissionPoller] = {}
+        next_poll: Dict[Path, float] = {}
+        new_submission = asyncio.Event()
+
+        with output(output_type='dict') as output_lines:
+            rows = {folder: self._row_label(folder) for folder, _ in jobs}
+            for folder, code in jobs:
+                output_lines[rows[folder]] = f'{"":<10} Waiting to submit {code.path.name}'
+
+            async def submit_one(folder: Path, code: CodeFile) -> None:
+                async with semaphore:
+                    async with spacing:
+                        await asyncio.sleep(self._SUBMIT_INTERVAL)
+                    try:
+                        submission = await loop.run_in_executor(
+                            None, self._submit, folder.name, code
+                        )
+                    except Exception as e:
+                        output_lines[rows[folder]] = f'{"":<10} {color_red(str(e))}'
+                        return
+                output_lines[rows[folder]] = self._render_row(submission, None)
+                pollers[folder] = SubmissionPoller(self, submission)
+                next_poll[folder] = time.monotonic()
+                new_submission.set()
+
+            async def poll_one(folder: Path) -> None:
+                poller = pollers[folder]
+                try:
+                    verdict = await loop.run_in_executor(None, poller.poll)
+                except Exception:
+                    verdict = None
+                output_lines[rows[folder]] = self._render_row(
+                    poller.submission, verdict
+                )
+                if verdict is not None and verdict.is_done:
+                    del next_poll[folder]
+                else:
+                    next_poll[folder] = time.monotonic() + poller.interval
+
+            submitting = asyncio.ensure_future(
+                asyncio.gather(*(submit_one(*job) for job in jobs))
+            )
+            deadline = time.monotonic() + self._opts.timeout
+            while time.monotonic() < deadline and (
+                next_poll or not submitting.done()
+            ):
+                now = time.monotonic()
+                due = [k for k, t in next_poll.items() if t <= now]
+                if due:
+                    await asyncio.gather(*(poll_one(k) for k in due))
+                    continue
+                wake_up = min(next_poll.values(), default=deadline)
+                new_submission.clear()
+                try:
+                    await asyncio.wait_for(
+                        new_submission.wait(),
+                        max(0., min(wake_up, deadline) - now)
+                    )
+                except asyncio.TimeoutError:
+                    pass
+            if not submitting.done():
+                submitting.cancel()
+        for folder in next_poll:
+            log_cyan(
+                f'{rows[folder].strip()}: still judging after {self._opts.timeout:g} s, see '
+                f'{pollers[folder].submission.submission_url}'
+            )
+
     def _act(self) -> None:
         '''Submit the code file for kattis judge'''
+        if self._opts.folders or self._opts.all:
+            jobs: List[Tuple[Path, CodeFile]] = []
+            for folder in self._batch_folders():
+                code = self._find_code_file(folder) if folder.is_dir() else None
+                if code is None:
+                    log_red(f'No code file to submit in {folder}, skipped')
+                    continue
+                jobs.append((folder, code))
+            if jobs:
+                asyncio.run(self._submit_batch(jobs))
+            return
+
         submission_result: SubmissionResult = self._submit_code_file()
         if submission_result is None:
             return
@@ -1,11 +1,17 @@
 from __future__ import annotations
-from ast import List
+import argparse
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
-import random
+from typing import List, Tuple
+import requests
 from .gen import Gen
 from ..base import Action
-from bs4 import BeautifulSoup
+from ..catalogue import CataloguedProblem, ProblemCatalogue
+from ..logger import color_green, log, log_cyan, log_red
+from ..scrape import parse_problem_list
 from typing_extensions import final
 
 __all__ = ['Surprise']
@@ -23,32 +29,42 @@ class KattisProblem:
 
 @final
 class Surprise(Action):
-    """Usage: kt surprise [lower_bound] [upperBound]
+    """Usage: kt surprise [lower_bound] [upperBound] [--refresh]
 
     Randomly retrieve a problem from Kattis whose difficulty belongs to the range
     Naturally lower_bound has to be <= upperbound
+    Problems that already have a folder in the current folder are skipped. The problems and their
+    difficulty are looked up in a local catalogue (~/.cache/kt/problems.sqlite3), crawled again
+    once a week
 
     Options
     --------
     lower_bound: lower range bound to randomize. Default is 0
     upper_bound: lower range bound to randomize. Default is 10
+    --refresh: crawl the problem list of Kattis again before picking a problem
     """
     REQUIRED_CONFIG = True
-    _FIRST_INDEX = 0
-    _LAST_INDEX = 35
-    __slots__ = '_easiest_difficulty', '_hardest_difficulty'
-
-    def __init__(
-        self,
-        easiest_difficulty: float = 0.,
-        hardest_difficulty: float = 10.,
-        *,
-        cwd: None | Path = None
-    ):
+    # number of listing pages fetched at the same time
+    _CRAWL_JOBS = 8
+    # the listing is paginated, stop crawling there whatever happens
+    _MAX_PAGES = 200
+    _MAX_AGE = 7 * 24 * 3600
+    __slots__ = '_easiest_difficulty', '_hardest_difficulty', '_opts'
+
+    def __init__(self, *args: str, cwd: None | Path = None):
         super().__init__(cwd=cwd)
-        self._easiest_difficulty = float(easiest_difficulty)
-        self._hardest_difficulty = float(hardest_difficulty)
-        assert easiest_difficulty <= hardest_difficulty
+        self._opts = self._parse_options(args)
+        self._easiest_difficulty = self._opts.lower_bound
+        self._hardest_difficulty = self._opts.upper_bound
+        assert self._easiest_difficulty <= self._hardest_difficulty
+
+    @staticmethod
+    def _parse_options(args: Tuple[str, ...]) -> argparse.Namespace:
+        parser = argparse.ArgumentParser(prog='kt surprise', add_help=False)
+        parser.add_argument('lower_bound', type=float, nargs='?', default=0.)
+        parser.add_argument('upper_bound', type=float, nargs='?', default=10.)
+        parser.add_argument('--refresh', action='store_true')
+        return parser.parse_args(list(args))
 
     @staticmethod
     def _parse_difficulty(val: str) -> DifficultyFixed | DifficultyRange:
@@ -61,43 +77,95 @@ class Surprise(Action):
     def _parse_id(val: str) -> str:
         return val.split('/')[-1]
 
-    def _get_random_list(self) -> List[KattisProblem]:
+    def _get_list(self, page: int) -> List[KattisProblem]:
+        """ Problems of a page of the problem listing, empty past the last page. Raises if the page
+        could not be fetched, which must not be mistaken for the end of the listing
+        """
         ret = []
-        page = self._request_get(
-            f'https://{self.get_url("hostname")}/problems?page={random.randint(self._FIRST_INDEX - 1, self._LAST_INDEX)}&order=%2Bdifficulty_category'
+        response = self._request_get(
+            f'{self.get_host_url()}/problems?page={page}&order=%2Bdifficulty_category'
         )
-        soup = BeautifulSoup(page.content, 'html.parser')
-        table = soup.find_all('table', class_='table2')[0].find_next('tbody')
-        for row in table.find_all('tr'):
+        if self._is_logged_out(response):
+            raise RuntimeError(f'Page {page} of the problem list needs a login')
+        response.raise_for_status()
+        for href, difficulty in parse_problem_list(response.content):
             ret.append(
                 KattisProblem(
-                    id=self._parse_id(row.find_next('a', href=True)['href']),
-                    difficulty=self._parse_difficulty(
-                        row.find_next('span', class_='difficulty_number').text
-                    )
+                    id=self._parse_id(href),
+                    difficulty=self._parse_difficulty(difficulty)
                 )
             )
         return ret
 
-    def _match(self, problem: KattisProblem) -> bool:
+    @staticmethod
+    def _catalogued(problem: KattisProblem) -> CataloguedProblem:
         if isinstance(problem.difficulty, DifficultyFixed):
-            return self._easiest_difficulty <= problem.difficulty <= self._hardest_difficulty
-        return self._easiest_difficulty <= problem.difficulty[0] \
-            and problem.difficulty[1] <= self._hardest_difficulty
+            return CataloguedProblem(
+                problem.id, problem.difficulty, problem.difficulty
+            )
+        return CataloguedProblem(problem.id, *problem.difficulty)
+
+    def _crawl(self, catalogue: ProblemCatalogue, host: str) -> None:
+        """ Fetch the listing pages in waves of `_CRAWL_JOBS` concurrent requests until the first empty
+        page (or a page repeating the previous one). Each page is stored as soon as its wave is done,
+        so an interrupted crawl still refreshes the pages it went through. Only a crawl that reached
+        the end of the listing forgets the problems it did not see and counts as a full crawl
+        """
+        log_cyan(f'Crawling the problem list of {host}...')
+        started_at = time.time()
+        previous: List[KattisProblem] = []
+        total = 0
+        complete = False
+        try:
+            with ThreadPoolExecutor(max_workers=self._CRAWL_JOBS) as executor:
+                for first in range(0, self._MAX_PAGES, self._CRAWL_JOBS):
+                    wave = executor.map(
+                        self._get_list, range(first, first + self._CRAWL_JOBS)
+                    )
+                    for problems in wave:
+                        if not problems or problems == previous:
+                            complete = True
+                            break
+                        catalogue.upsert(
+                            host, [self._catalogued(x) for x in problems],
+                            started_at
+                        )
+                        total += len(problems)
+                        previous = problems
+                    if complete:
+                        break
+        except (requests.RequestException, RuntimeError) as e:
+            log_red(f'The crawl stopped early: {e}')
+        if not complete:
+            log_red(
+                f'Updated {total} problems, the rest of the catalogue is kept until a full crawl'
+            )
+            return
+        catalogue.complete_crawl(host, started_at)
+        log(f'{color_green(total)} problems in the catalogue')
 
-    def _problem_already_being_attempted(self, problem: KattisProblem) -> bool:
-        if (self.cwd / problem.id).is_dir():
+    def _problem_already_being_attempted(self, problem_id: str) -> bool:
+        if (self.cwd / problem_id).is_dir():
             return True
         return False
 
     def _act(self) -> None:
-        problem: None | KattisProblem = None
-        while problem is None:
-            for a_problem in self._get_random_list():
-                if not self._match(a_problem):
-                    continue
-                if self._problem_already_being_attempted(a_problem):
-                    continue
-                problem = a_problem
-                break
+        host = self.get_url('hostname')
+        with ProblemCatalogue() as catalogue:
+            last_crawl = catalogue.last_crawl(host)
+            if self._opts.refresh or last_crawl is None or time.time(
+            ) - last_crawl > self._MAX_AGE:
+                self._crawl(catalogue, host)
+            candidates = [
+                x for x in catalogue.query(
+                    host, self._easiest_difficulty, self._hardest_difficulty
+                ) if not self._problem_already_being_attempted(x.id)
+            ]
+        if not candidates:
+            log_red(
+                f'No problem left with a difficulty between {self._easiest_difficulty:g} '
+                f'and {self._hardest_difficulty:g}'
+            )
+            return
+        problem = random.choice(candidates)
         Gen(problem.id, cwd=self.cwd).act()
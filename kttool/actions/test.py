@@ -1,186 +1,706 @@
+from __future__ import annotations
+
+import argparse
+import contextlib
+import datetime
 import json
+import math
 import os
 import re
 import shlex
+import statistics
 import subprocess
+import sys
 import tempfile
+import threading
 import time
-from dataclasses import dataclass
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
 from pathlib import Path
-from typing import List, Tuple
+from typing import BinaryIO, Iterator, List, Set, TextIO, Tuple
 from typing_extensions import final
-import psutil
 from ..base import Action
-from ..logger import (
-    color_cyan, color_green, color_red, log, log_cyan, log_green, log_red,
-    strike_through
+from ..checkers import (
+    BUILTIN_CHECKERS, Checker, ExternalChecker, FloatChecker, make_checker
+)
+from ..history import CaseRecord, HistoricRun, RunHistory, source_hash
+from ..logger import color_cyan, color_green, log, log_cyan, log_green, log_red
+from ..runner import (
+    AC, RTE, WA, Limits, RunResult, output_file, run_program
 )
-from ..utils import (launch_subprocess, make_list_equal)
+from ..samples import CASE_FILE, Sample, SampleIndex, is_compressed, open_case
+from ..sandbox import CgroupSandbox, CpuPool, ProcessSandbox, Sandbox, make_sandbox
+from ..stats import summarize
+from ..utils import kill_test_subprocesses
 
 __all__ = ['Test']
 
-AC = "Accepted".ljust(13, " ")
-WA = "Wrong Answer".ljust(13, " ")
+INTERNAL_ERROR = 'Internal Error'
+# colors and strike through of the rendered diffs, left out of the reports
+_TERMINAL_ESCAPES = re.compile(r'\x1b\[[\d;]*m|\u0336')
 
 
 @dataclass
-class Sample:
-    index: int
-    input_file: Path
-    output_file: Path
+class SampleResult:
+    sample: Sample
+    verdict: None | str = None
+    detail: str = ''
+    # median over the timed runs of the sample, and the peak memory of all of them
+    taken: float = 0.
+    cpu_time: float = 0.
+    mem_used: float = 0.
+    wall_times: List[float] = field(default_factory=list)
+    cpu_times: List[float] = field(default_factory=list)
+    output_size: int = 0
+    # start of the input (one byte more than shown, to tell whether there is more), only read to
+    # show a wrong answer, and the size of its file
+    input_head: bytes = b''
+    input_size: int = 0
+    diff: List[str] = field(default_factory=list)
+    internal_error: None | Exception = None
+    trace: str = ''
 
 
 @final
 class Test(Action):
-    """Usage: kt test
+    """Usage: kt test [--jobs N] [--time-limit SEC] [--memory-limit MB] [--output-limit MB]
+               [--mismatches K] [--checker CHECKER] [--float-tolerance EPS]
+               [--no-cache] [--watch] [--format json|junit] [--report FILE] [--compare]
+               [--repeat N] [--warmup K] [--pin CPU] [--margin FRACTION]
+               [--sandbox auto|cgroup|process]
 
     Run the set of scripts to compile and test the runable code file. 
     - before_script that executed once before testing your code against the samples
     - script to run the code/binary
     - after_script that usually does the clean up
+
+    Options
+    --------
+    --jobs N, -j N: number of samples to run concurrently. Default is the number of cores
+    --time-limit SEC: cpu time limit of each sample. Default is the limit of the problem saved by `kt gen`
+    --memory-limit MB: memory limit of each sample. Default is the limit of the problem saved by `kt gen`
+    --output-limit MB: output limit of each sample. Default is 8 MB
+    Use 0 to disable a limit. Without any time limit, a sample is still killed after 10 s
+    --mismatches K: stop comparing a sample after K mismatches. Default is 5
+    --checker CHECKER: how outputs are checked, one of
+        line: lines have to match, the whitespaces around each line are ignored. This is the default
+        token: tokens have to match, whitespaces and newlines between tokens are ignored
+        float: like token, but numbers only have to be close enough (see --float-tolerance)
+        case: like token, but tokens are compared case insensitively
+        any other value is the command of a Kattis style output validator, run as
+        `<command> input judge_answer feedback_dir < output`
+    --float-tolerance EPS: absolute and relative tolerance of the float checker. Default is 1e-6
+    The checker can also be saved in .ktproblem, with the keys checker, float_tolerance,
+    float_absolute_tolerance and float_relative_tolerance
+    --watch, -w: keep running, test the code again whenever it or the samples are saved. Only the
+        samples that changed are tested again if the code did not change
+    --no-cache: always run before_script, instead of reusing the files it produced for an unchanged
+        source (cached in ~/.cache/kt/build)
+    --format json|junit: also write a report of the run, with the verdict, wall and cpu time, peak
+        memory and output size of each sample. The report goes to stdout and everything else to stderr
+    --report FILE: write the report to FILE instead. The format defaults to junit for a .xml file and
+        to json otherwise
+    --compare: compare the cpu time and memory usage of each sample with the previous run of the problem
+    Every run is recorded in ~/.cache/kt/history.sqlite3, with the hash of the tested source
+    --repeat N: run each sample N times and report the min, median, p95 and standard deviation of its
+        wall and cpu times. The median is the time reported and recorded. Default is 1
+    --warmup K: run each sample K more times before the timed runs, without measuring them. Default is 0
+    --pin CPU: run the code on that cpu only (Linux). With --repeat or --pin, samples are run one at a
+        time unless --jobs is given
+    --margin FRACTION: flag the samples whose median cpu time is within FRACTION of the time limit.
+        Default is 0.1
+    --sandbox auto|cgroup|process: how the code is confined (Linux). cgroup runs each sample in a
+        cgroup v2 of its own, with memory.max and pids.max, pinned to a cpu of its own (or to the cpu
+        of --pin), and takes its cpu time and peak memory from the cgroup. The memory and pids
+        controllers must be enabled in the cgroup of kt, or in the one $KT_CGROUP points to, and kt
+        enables them (and cpuset) there when they are not. process runs it as a plain subprocess
+        limited by rlimits. Default is auto, cgroup when its controllers are already enabled, which
+        never changes the configuration of the cgroup
     """
 
     REQUIRED_CONFIG = True
 
-    def _compare_samples(self, samples: List[Sample]) -> None:
-        rusage_denom = 1 << 20
+    _DEFAULT_MARGIN = 0.1
+    _MAX_INPUT_SHOWN = 2048
+    # with --compare, changes of cpu time or memory usage above this share are highlighted, unless
+    # they are within the noise of the measures
+    _REGRESSION = 0.1
+    _TIME_NOISE = 0.01
+    _MEMORY_NOISE = 1.
 
-        for sample in samples:
-            is_ac = True
-            actual = []
-            expected = []
-            diff = []
-            try:
-                with open(sample.output_file, 'r') as f:
-                    expected = [l.strip(" \n") for l in f.readlines()]
-                with open(sample.input_file, 'rb') as f:
-                    raw_input_fixture = f.read()
-                p = launch_subprocess(
-                    shlex.split(f'{self.script} -'),
-                    stdin=subprocess.PIPE,
-                    stdout=subprocess.PIPE,
-                    shell=False,
-                    preexec_fn=os.setsid
-                )
-                proc = psutil.Process(p.pid)
-                mem_used = proc.memory_info().rss / rusage_denom
-                start_time = time.perf_counter()
-                raw_output = p.communicate(raw_input_fixture)[0].decode()
-                p.wait()
-                taken = time.perf_counter() - start_time
-                actual = [z.strip(" \n") for z in raw_output.split('\n')]
-                make_list_equal(actual, expected)
-
-                for i in range(len(expected)):
-                    ''' 
-                    Compare the values line by line
-                    For each line, compare the values from left to right. 
-                    '''
-                    ith_line_exp = [z for z in expected[i].split(' ')]
-                    ith_line_actual = [z for z in actual[i].split(' ')]
-
-                    make_list_equal(ith_line_exp, ith_line_actual)
-                    current_diff = ''
-                    for j in range(len(ith_line_exp)):
-                        lhs = ith_line_exp[j]
-                        rhs = ith_line_actual[j]
-                        is_good, now_diff = self._compare_entity(rhs, lhs)
-                        is_ac &= is_good
-                        current_diff += now_diff
-
-                    diff.append(current_diff)
-
-                if is_ac:
-                    log_green(
-                        f'Test Case #{sample.index}: {AC} ... {taken:.3f} s   {mem_used:.2f} M'
-                    )
-                else:
-                    log_red(
-                        f'Test Case #{sample.index}: {WA} ... {taken:.3f} s   {mem_used:.2f} M'
-                    )
-                    log_cyan('--- Input ---')
-                    log(raw_input_fixture.decode())
-                    log_cyan('--- Diff ---')
-                    for i in range(len(diff)):
-                        log(diff[i])
+    jobs: int
+    limits: Limits
+    checker: Checker
+    _opts: argparse.Namespace
+    _cancelled: threading.Event
+    _report_stream: None | TextIO
+    _index: None | SampleIndex
+    sandbox: Sandbox
+    _cpus: None | CpuPool
+    __slots__ = 'jobs', 'limits', 'checker', '_opts', '_cancelled', '_report_stream', '_index', \
+        'sandbox', '_cpus'
+
+    def __init__(self, *args: str, cwd: None | Path = None):
+        super().__init__(cwd=cwd)
+        self._opts = self._parse_options(args)
+        # repeated or pinned runs are timed one at a time, unless told otherwise
+        timing = self._opts.repeat > 1 or self._opts.pin is not None
+        self.jobs = max(
+            1, self._opts.jobs or (1 if timing else os.cpu_count()) or 1
+        )
+        self.limits = Limits()
+        self.checker = make_checker('line')
+        self._cancelled = threading.Event()
+        self._index = None
+        self._report_stream = None
+        self.sandbox = ProcessSandbox()
+        self._cpus = None
+
+    @staticmethod
+    def _parse_options(args: Tuple[str, ...]) -> argparse.Namespace:
+        parser = argparse.ArgumentParser(prog='kt test', add_help=False)
+        parser.add_argument('--format', choices=['json', 'junit'], default=None)
+        parser.add_argument('--report', type=Path, default=None)
+        parser.add_argument('--compare', action='store_true')
+        parser.add_argument('-j', '--jobs', type=int, default=None)
+        Action.add_judge_options(parser)
+        parser.add_argument('--mismatches', type=int, default=5)
+        parser.add_argument('--no-cache', action='store_true')
+        parser.add_argument('-w', '--watch', action='store_true')
+        parser.add_argument('--repeat', type=int, default=1)
+        parser.add_argument('--warmup', type=int, default=0)
+        parser.add_argument('--pin', type=int, default=None)
+        parser.add_argument(
+            '--margin', type=float, default=Test._DEFAULT_MARGIN
+        )
+        parser.add_argument(
+            '--sandbox', choices=['auto', 'cgroup', 'process'], default='auto'
+        )
+        opts = parser.parse_args(list(args))
+        if opts.repeat < 1 or opts.warmup < 0:
+            parser.error('--repeat must be at least 1 and --warmup at least 0')
+        if opts.mismatches < 1:
+            parser.error('--mismatches must be at least 1')
+        if not 0 <= opts.margin < 1:
+            parser.error('--margin must be between 0 and 1')
+        if opts.pin is not None:
+            if not hasattr(os, 'sched_setaffinity'):
+                parser.error('--pin is not supported on this system')
+            if opts.pin not in os.sched_getaffinity(0):
+                parser.error(f'cpu {opts.pin} is not available')
+        if opts.format is not None and opts.watch:
+            parser.error('--format can not be used with --watch')
+        if opts.report is not None and opts.format is None:
+            opts.format = 'junit' if opts.report.suffix == '.xml' else 'json'
+        return opts
+
+    def _run_sample(self, sample: Sample) -> SampleResult:
+        """ Run the code against a single sample and compare its output with the expected answer.
+        This is called from the worker threads so it must not log anything, the verdict is
+        reported back to the main thread through the returned `SampleResult`
+        """
+        result = SampleResult(sample=sample)
+        if self._cancelled.is_set():
+            return result
+        try:
+            for _ in range(self._opts.warmup):
+                with output_file() as output:
+                    self._execute(sample, output)
+            # every timed run is judged, the first one that is not accepted stops the sample
+            for _ in range(self._opts.repeat):
+                if self._cancelled.is_set():
+                    return SampleResult(sample=sample)
+                self._judge_run(sample, result)
+                if result.verdict != AC:
+                    break
+            result.taken = statistics.median(result.wall_times)
+            result.cpu_time = statistics.median(result.cpu_times)
+            if result.verdict == WA:
+                with open_case(sample.input_file) as f:
+                    result.input_head = f.read(self._MAX_INPUT_SHOWN + 1)
+                result.input_size = sample.input_file.stat().st_size
+
+        except Exception as e:
+            result.internal_error = e
+            result.trace = traceback.format_exc()
+        return result
+
+    def _execute(self, sample: Sample, output: BinaryIO) -> RunResult:
+        # the program reads the sample file and writes to an anonymous file, which the checker
+        # reads back, so kt never holds the whole input or output of a sample
+        cpus = self._cpus.take() if self._cpus is not None else contextlib.nullcontext(
+            self._opts.pin
+        )
+        with cpus as cpu:
+            return run_program(
+                shlex.split(f'{self.script} -'),
+                sample.input_file,
+                self.limits,
+                stdout=output,
+                cpu=cpu,
+                sandbox=self.sandbox
+            )
+
+    def _load_sandbox(self) -> None:
+        # runs in a cgroup are always pinned, to the cpu of --pin or to one of the pool
+        self.sandbox = make_sandbox(self._opts.sandbox, pin=True)
+        # in cgroups, concurrent samples do not compete for a cpu either
+        if isinstance(self.sandbox, CgroupSandbox) and self._opts.pin is None:
+            self._cpus = CpuPool(os.sched_getaffinity(0))
+
+    def _judge_run(self, sample: Sample, result: SampleResult) -> None:
+        """ Run the code once against `sample` and add the measures and the verdict to `result` """
+        with output_file() as output:
+            run = self._execute(sample, output)
+            result.wall_times.append(run.wall_time)
+            result.cpu_times.append(run.cpu_time)
+            result.mem_used = max(result.mem_used, run.peak_memory)
+            result.output_size = run.output_size
+            result.verdict = run.verdict(self.limits)
+            if result.verdict is not None:
+                if result.verdict == RTE:
+                    result.detail = run.describe_exit()
+                return
+
+            output.seek(0)
+            comparison = self.checker.check(
+                sample.input_file, sample.output_file, output,
+                self._opts.mismatches
+            )
+        result.verdict = AC if comparison.is_ac else WA
+        result.diff = comparison.diff
+
+    def _is_near_time_limit(self, result: SampleResult) -> bool:
+        """ Whether the median cpu time of an accepted sample is within the margin of the time limit """
+        time_limit = self.limits.time_limit
+        return result.verdict == AC and time_limit is not None and \
+            result.cpu_time >= (1 - self._opts.margin) * time_limit
+
+    def _report(self, result: SampleResult) -> None:
+        sample = result.sample
+        if result.internal_error is not None:
+            self._record_unexpected_exception(
+                sample, result.internal_error, result.trace
+            )
+            return
+
+        usage = f'{result.taken:.3f} s   cpu {result.cpu_time:.3f} s   {result.mem_used:.2f} M'
+        line = f'Test Case #{sample.name}: {result.verdict:<21} ... {usage}'
+        if len(result.wall_times) > 1:
+            line = f'{line}   (median of {len(result.wall_times)} runs)'
+        if result.verdict == AC:
+            log_green(line)
+            self._report_timing(result)
+            return
+        if result.detail:
+            line = f'{line}   ({result.detail})'
+        log_red(line)
+        if result.verdict == WA:
+            log_cyan('--- Input ---')
+            log(
+                result.input_head[:self._MAX_INPUT_SHOWN].decode(errors='replace')
+            )
+            if len(result.input_head) > self._MAX_INPUT_SHOWN:
+                compressed = ' compressed' if is_compressed(sample.input_file) else ''
+                log_cyan(f'... ({result.input_size} bytes{compressed} in total)')
+            log_cyan('--- Diff ---')
+            for i in range(len(result.diff)):
+                log(result.diff[i])
+        self._report_timing(result)
 
-            except subprocess.CalledProcessError as e:
-                log_red(f'Test case #{sample.index}: Runtime Error {e!r}')
-            except Exception as e:
-                self._record_unexpected_exception(sample, e)
+    def _report_timing(self, result: SampleResult) -> None:
+        if len(result.wall_times) > 1:
+            log(f'    wall  {summarize(result.wall_times).describe()}')
+            log(f'    cpu   {summarize(result.cpu_times).describe()}')
+        if self._is_near_time_limit(result):
+            log_cyan(
+                f'    median cpu time {result.cpu_time:.3f} s is within {self._opts.margin:.0%} '
+                f'of the time limit ({self.limits.time_limit:g} s)'
+            )
+
+    def _run_samples(self, samples: List[Sample]) -> Iterator[SampleResult]:
+        """ Yield the result of every sample in index order.
+        With more than one job, the samples are run by a bounded pool of worker threads (each of them
+        only waits on its own subprocess) and the results are yielded as soon as all the samples
+        before them are done
+        """
+        if self.jobs == 1 or len(samples) <= 1:
+            for sample in samples:
+                yield self._run_sample(sample)
+            return
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            futures = [
+                executor.submit(self._run_sample, sample) for sample in samples
+            ]
+            for future in futures:
+                yield future.result()
+
+    def _compare_samples(self, samples: List[Sample]) -> List[SampleResult]:
+        results = []
+        for result in self._run_samples(samples):
+            if self._cancelled.is_set():
+                break
+            self._report(result)
+            results.append(result)
+        return results
 
     @staticmethod
-    def _record_unexpected_exception(sample: Sample, ex: Exception) -> None:
-        import traceback
+    def _record_unexpected_exception(
+        sample: Sample, ex: Exception, trace: str
+    ) -> None:
         p = Path(tempfile.gettempdir())
         p.mkdir(parents=True, exist_ok=True)
         tmp_file = p / 'kt_test.log'
         with open(tmp_file, 'w+') as f:
-            f.write(traceback.format_exc())
+            f.write(trace)
         log_red(
-            f'Test case #{sample.index}: Internal Error {ex!r}. More info at {tmp_file}'
+            f'Test case #{sample.name}: Internal Error {ex!r}. More info at {tmp_file}'
         )
 
     def _gather_samples(self) -> List[Sample]:
-        input_files = [
-            x for x in self.cwd.iterdir()
-            if x.is_file() and x.stem.startswith('in')
-        ]
-        output_files = [
-            x for x in self.cwd.iterdir()
-            if x.is_file() and x.stem.startswith('ans')
-        ]
-        usable_samples: List[Sample] = []
-
-        in_pattern = re.compile("in(\d+).txt")
-        ans_pattern = re.compile("ans(\d+).txt")
-        for input_file in input_files:
-            try:
-                idx = int(in_pattern.search(input_file.name).group(1))
-                for output_file in output_files:
-                    if idx == int(
-                        ans_pattern.search(output_file.name).group(1)
-                    ):
-                        usable_samples.append(
-                            Sample(
-                                index=idx,
-                                input_file=Path(input_file).absolute(),
-                                output_file=Path(output_file).absolute()
-                            )
-                        )
-                        break
-            except:
-                ...
+        self._index = SampleIndex(self.cwd)
+        usable_samples = self._index.samples()
         log(f'{color_green(len(usable_samples))} samples found.')
-        # run test from ascending number of file index
-        return sorted(usable_samples, key=lambda x: x.index)
+        return usable_samples
 
     def _act(self) -> None:
         """ Run the executable file against sample input and output files present in the folder
         The sample files will only be recognized if the conditions hold:
-        - Naming style should be in{idx}.txt and ans{txt}.txt
-        - for in{idx}.txt, there must exist a ans{idx}.txt with the same `idx`
+        - Naming style should be in{idx}.txt and ans{txt}.txt, optionally compressed (.gz or .zst)
+        - for in{idx}.txt, there must exist a ans{idx}.txt with the same `idx` in the same folder
+        Samples are looked for in the folder and in its subfolders
         """
+        if self._opts.report is not None:
+            with open(self._opts.report, 'w') as report:
+                self._test(report)
+            return
+        self._test(self._report_stream)
+
+    def act(self) -> None:
+        if self._opts.format is None or self._opts.report is not None:
+            super().act()
+            return
+        # the report goes to stdout, the usual output of kt to stderr
+        self._report_stream = sys.stdout
+        with contextlib.redirect_stdout(sys.stderr):
+            super().act()
+
+    def _test(self, report: None | TextIO) -> None:
+        """ Test the code, then write the report of the run to `report` if there is one """
         if not self._detect_code_files():
             return
 
         # Get sample files that match the condition
         usable_samples = self._gather_samples()
+        self.limits = self.load_limits(self._opts)
+        self.checker = self.load_checker(self._opts)
+        self._load_sandbox()
         # run test
         log(f'Problem ID : {color_cyan(self._get_problem_id())}')
         log(f'Lanuage    : {self.lang}')
-        if self.pre_script:
-            log_cyan(f'running {self.pre_script}')
-            subprocess.check_call(shlex.split(self.pre_script))
+        log(f'Limits     : {self._describe_limits()}')
+        log(f'Checker    : {self._describe_checker()}')
+        log(f'Sandbox    : {self.sandbox.describe()}')
+        if self._opts.watch:
+            try:
+                self._watch()
+            finally:
+                self._run_post_script()
+            return
+
+        self.run_pre_script(use_cache=not self._opts.no_cache)
+
+        started_at = time.time()
+        results = self._compare_samples(usable_samples)
+
+        self._run_post_script()
+        self._conclude(results, started_at, report)
+
+    def _conclude(
+        self, results: List[SampleResult], started_at: float,
+        report: None | TextIO
+    ) -> None:
+        """ Record a run in the history, compare it with the previous run of the problem if asked
+        to, and write its report
+        """
+        if self._cancelled.is_set() or not results:
+            return
+        problem_id = self._get_problem_id()
+        digest = source_hash(self.file_name)
+        with RunHistory() as history:
+            run_id = history.record(
+                problem_id, digest, self.lang,
+                [self._case_record(x) for x in results], started_at
+            )
+            previous = history.previous(problem_id, before=run_id)
+        if self._opts.compare:
+            self._show_comparison(results, previous, digest)
+        if report is not None:
+            render = self._json_report if self._opts.format == 'json' else self._junit_report
+            report.write(render(results, run_id, digest, started_at))
+            # keep the hashes of the sample files for the next report
+            self._index.save()
+
+    @staticmethod
+    def _verdict(result: SampleResult) -> str:
+        return INTERNAL_ERROR if result.internal_error is not None else result.verdict
+
+    @staticmethod
+    def _case_record(result: SampleResult) -> CaseRecord:
+        return CaseRecord(
+            sample=result.sample.name,
+            verdict=Test._verdict(result),
+            wall_time=result.taken,
+            cpu_time=result.cpu_time,
+            peak_memory=result.mem_used,
+            output_size=result.output_size
+        )
+
+    def _classify_change(self, before: float, after: float,
+                         noise: float) -> Tuple[float, int]:
+        """ Relative change from `before` to `after`, and whether it is a regression (1), an
+        improvement (-1) or neither (0). Changes within `noise` are neither
+        """
+        if before:
+            change = (after - before) / before
+        else:
+            change = math.inf if after else 0.
+        if abs(after - before) <= noise or abs(change) <= self._REGRESSION:
+            return change, 0
+        return change, 1 if change > 0 else -1
+
+    def _show_comparison(
+        self, results: List[SampleResult], previous: None | HistoricRun,
+        digest: str
+    ) -> None:
+        if previous is None:
+            log_cyan('No previous run of this problem to compare with')
+            return
+        when = datetime.datetime.fromtimestamp(previous.started_at
+                                               ).strftime('%Y-%m-%d %H:%M:%S')
+        source = 'same source' if previous.source_hash == digest else 'another revision of the source'
+        log_cyan(f'--- Compared with the run of {when} ({source}) ---')
+        regressions = 0
+        for result in results:
+            name = result.sample.name
+            before = previous.cases.get(name)
+            if before is None:
+                log(f'Test Case #{name}: not run before')
+                continue
+            time_change, time_trend = self._classify_change(
+                before.cpu_time, result.cpu_time, self._TIME_NOISE
+            )
+            memory_change, memory_trend = self._classify_change(
+                before.peak_memory, result.mem_used, self._MEMORY_NOISE
+            )
+            verdict = self._verdict(result)
+            line = f'Test Case #{name}: cpu {before.cpu_time:.3f} s -> {result.cpu_time:.3f} s ' \
+                f'({time_change:+.0%})   memory {before.peak_memory:.2f} M -> {result.mem_used:.2f} M ' \
+                f'({memory_change:+.0%})'
+            if verdict != before.verdict:
+                line = f'{line}   {before.verdict} -> {verdict}'
+            if time_trend > 0 or memory_trend > 0 or (
+                before.verdict == AC and verdict != AC
+            ):
+                regressions += 1
+                log_red(line)
+            elif time_trend < 0 or memory_trend < 0:
+                log_green(line)
+            else:
+                log(line)
+        if regressions:
+            log_red(f'{regressions} test case(s) regressed')
+        else:
+            log_green('No regression')
 
-        self._compare_samples(usable_samples)
+    def _relative(self, path: Path) -> str:
+        return str(path.relative_to(self.cwd))
 
+    def _report_cases(self, results: List[SampleResult]) -> Iterator[dict]:
+        for result in results:
+            yield {
+                'sample': result.sample.name,
+                'input': self._relative(result.sample.input_file),
+                'answer': self._relative(result.sample.output_file),
+                'input_sha256': self._index.digest(result.sample.input_file),
+                'answer_sha256': self._index.digest(result.sample.output_file),
+                'verdict': self._verdict(result),
+                'detail': result.detail if result.internal_error is None else repr(
+                    result.internal_error
+                ),
+                'wall_time': result.taken,
+                'cpu_time': result.cpu_time,
+                'peak_memory': result.mem_used,
+                'output_size': result.output_size,
+                'runs': len(result.wall_times),
+                'wall_time_summary': asdict(summarize(result.wall_times))
+                if result.wall_times else None,
+                'cpu_time_summary': asdict(summarize(result.cpu_times))
+                if result.cpu_times else None,
+                'near_time_limit': self._is_near_time_limit(result),
+                'diff': [_TERMINAL_ESCAPES.sub('', x) for x in result.diff],
+            }
+
+    def _json_report(
+        self, results: List[SampleResult], run_id: int, digest: str,
+        started_at: float
+    ) -> str:
+        cases = list(self._report_cases(results))
+        return json.dumps(
+            {
+                'problem_id': self._get_problem_id(),
+                'language': self.lang,
+                'source': self.file_name.name,
+                'source_hash': digest,
+                'run_id': run_id,
+                'started_at': datetime.datetime.fromtimestamp(started_at).isoformat(),
+                'limits': {
+                    'time_limit': self.limits.time_limit,
+                    'memory_limit': self.limits.memory_limit,
+                    'output_limit': self.limits.output_limit,
+                },
+                'checker': self._describe_checker(),
+                'sandbox': self.sandbox.name,
+                'passed': sum(1 for x in cases if x['verdict'] == AC),
+                'total': len(cases),
+                'cases': cases,
+            },
+            indent=2
+        ) + '\n'
+
+    def _junit_report(
+        self, results: List[SampleResult], run_id: int, digest: str,
+        started_at: float
+    ) -> str:
+        from xml.etree import ElementTree
+        problem_id = self._get_problem_id()
+        cases = list(self._report_cases(results))
+        suites = ElementTree.Element('testsuites')
+        suite = ElementTree.SubElement(
+            suites,
+            'testsuite',
+            name=problem_id,
+            tests=str(len(cases)),
+            failures=str(
+                sum(1 for x in cases if x['verdict'] not in (AC, INTERNAL_ERROR))
+            ),
+            errors=str(sum(1 for x in cases if x['verdict'] == INTERNAL_ERROR)),
+            time=f'{sum(x["wall_time"] for x in cases):.3f}',
+            timestamp=datetime.datetime.fromtimestamp(started_at).isoformat()
+        )
+        properties = ElementTree.SubElement(suite, 'properties')
+        for name, value in (
+            ('language', self.lang), ('source', self.file_name.name),
+            ('source_hash', digest), ('run_id', run_id),
+            ('checker', self._describe_checker()), ('sandbox', self.sandbox.name)
+        ):
+            ElementTree.SubElement(
+                properties, 'property', name=name, value=str(value)
+            )
+        for case in cases:
+            testcase = ElementTree.SubElement(
+                suite,
+                'testcase',
+                classname=problem_id,
+                name=f'sample {case["sample"]}',
+                time=f'{case["wall_time"]:.3f}'
+            )
+            if case['verdict'] == INTERNAL_ERROR:
+                ElementTree.SubElement(
+                    testcase, 'error', message=case['detail']
+                )
+            elif case['verdict'] != AC:
+                failure = ElementTree.SubElement(
+                    testcase,
+                    'failure',
+                    type=case['verdict'],
+                    message=' '.join(
+                        x for x in (case['verdict'], case['detail']) if x
+                    )
+                )
+                failure.text = '\n'.join(case['diff'])
+            ElementTree.SubElement(testcase, 'system-out').text = \
+                f'cpu {case["cpu_time"]:.3f} s, memory {case["peak_memory"]:.2f} M, ' \
+                f'output {case["output_size"]} bytes'
+        return ElementTree.tostring(
+            suites, encoding='unicode', xml_declaration=True
+        ) + '\n'
+
+    def _run_post_script(self) -> None:
         if self.post_script:
             log_cyan(f'running {self.post_script}')
             subprocess.check_call(shlex.split(self.post_script))
 
-    @staticmethod
-    def _compare_entity(lhs: str, rhs: str) -> Tuple[bool, str]:
-        if lhs == rhs:
-            return True, f'{lhs} '
-        return False, f'{color_red(strike_through(lhs))}{color_green(rhs)} '
\ No newline at end of file
+    def _is_watched(self, name: str) -> bool:
+        return name == self.file_name.name or CASE_FILE.fullmatch(
+            name
+        ) is not None
+
+    def _rerun(self, changed: None | Set[str]) -> None:
+        """ Rebuild the code if it changed, then run the samples affected by the `changed` files
+        (every sample if `changed` is None)
+        """
+        try:
+            rebuild = changed is None or self.file_name.name in changed
+            if rebuild:
+                self.run_pre_script(use_cache=not self._opts.no_cache)
+            samples = self._gather_samples()
+            if not rebuild:
+                # only the problem folder itself is watched, not its subfolders
+                samples = [
+                    x for x in samples if not x.group and
+                    (x.input_file.name in changed or x.output_file.name in changed)
+                ]
+            started_at = time.time()
+            self._conclude(self._compare_samples(samples), started_at, None)
+        except Exception as e:
+            log_red(f'{e}')
+        if not self._cancelled.is_set():
+            log_cyan('Waiting for changes... (Ctrl+C to stop)')
+
+    def _watch(self) -> None:
+        """ Test the code, then test it again whenever the code or the samples are saved. A run
+        still in progress when a new change arrives is cancelled, and its running processes killed
+        """
+        from ..watch import make_watcher, wait_for_changes
+        watcher = make_watcher(self.cwd)
+        changed: None | Set[str] = None  # None means everything
+        try:
+            while True:
+                run = threading.Thread(
+                    target=self._rerun, args=(changed, ), daemon=True
+                )
+                run.start()
+                more = wait_for_changes(watcher, self._is_watched)
+                if run.is_alive():
+                    log_cyan('Change detected, cancelling the current run')
+                    self._cancelled.set()
+                    kill_test_subprocesses()
+                    run.join()
+                    self._cancelled.clear()
+                    # the cancelled run may not have covered its own changes
+                    changed = None if changed is None else changed | more
+                else:
+                    changed = more
+        finally:
+            watcher.close()
+            self._cancelled.set()
+            kill_test_subprocesses()
+
+    def _describe_checker(self) -> str:
+        if isinstance(self.checker, ExternalChecker):
+            return ' '.join(self.checker.command)
+        name = next(
+            k for k, v in BUILTIN_CHECKERS.items() if type(self.checker) is v
+        )
+        if isinstance(self.checker, FloatChecker):
+            return f'{name} (absolute {self.checker.absolute_tolerance:g}, relative {self.checker.relative_tolerance:g})'
+        return name
+
+    def _describe_limits(self) -> str:
+        time_limit = f'{self.limits.time_limit} s' if self.limits.time_limit else \
+            f'none (killed after {self.limits.wall_time_limit} s)'
+        memory_limit = f'{self.limits.memory_limit} M' if self.limits.memory_limit else 'none'
+        return f'time {time_limit}   memory {memory_limit}'
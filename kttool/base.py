@@ -1,35 +1,95 @@
 from __future__ import annotations
 
 import abc
+import argparse
+import copy
 import json
 import os
+import shlex
+import subprocess
+import threading
 from configparser import ConfigParser, NoOptionError
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Callable
-
-import requests
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Callable, Tuple
+from urllib.parse import urlparse
 
+from kttool.cache import BuildCache, CookieCache
 from kttool.logger import color_green, log, log_cyan, log_red
 from kttool.utils import (
-    HEADERS, KATTIS_RC_URL, MAP_TEMPLATE_TO_PLANG, PLanguage, ask_with_default
+    HEADERS, KATTIS_RC_URL, KT_PROBLEM_CONFIG, MAP_TEMPLATE_TO_PLANG, PLanguage,
+    ask_with_default
 )
 
+if TYPE_CHECKING:
+    # requests takes longer to import than the rest of kt, commands that stay offline never need it
+    import requests
+    from kttool.checkers import Checker
+    from kttool.runner import Limits
+
+
+# hosts served over plain http
+_LOCAL_HOSTS = {'localhost', '127.0.0.1', '::1'}
+
 
 class ConfigError(Exception):
     pass
 
 
+# parsed config files with the modification time and size they were parsed at. A long lived process
+# (see kttool/daemon.py) parses each of them once instead of once per command
+_parsed_files: Dict[Path, Tuple[Tuple[int, int], Any]] = {}
+
+
+def _parse_cached(path: Path, parse: Callable[[Path], Any]) -> Any:
+    """ `parse(path)`, parsed again only when the file changed since the last call """
+    stat = path.stat()
+    key = stat.st_mtime_ns, stat.st_size
+    cached = _parsed_files.get(path)
+    if cached is None or cached[0] != key:
+        cached = _parsed_files[path] = key, parse(path)
+    return cached[1]
+
+
+def _read_kattisrc(path: Path) -> ConfigParser:
+    cfg = ConfigParser()
+    cfg.read(path)
+    return cfg
+
+
+def _read_json(path: Path) -> Any:
+    with open(path) as f:
+        return json.load(f)
+
+
+def warm_config(home: Path) -> None:
+    """ Parse the config files of `home` ahead of the commands that need them """
+    for name, parse in (('.kattisrc', _read_kattisrc), ('.ktconfig', _read_json)):
+        try:
+            _parse_cached(home / name, parse)
+        except Exception:
+            # the command reports the problem if it needs the file
+            pass
+
+
+@dataclass(frozen=True)
+class CodeFile:
+    ''' A code file and the scripts of its template, with `$%file%$` expanded '''
+    path: Path
+    lang: str
+    pre_script: str
+    script: str
+    post_script: str
+
+
 def require_login(fn: Callable) -> Callable:
     def inner(self: 'Action', *args, **kwargs):
-        did_login = False
         if not self.is_logged_in:
-            did_login = True
-            self.login()
-        ret = fn(self, *args, **kwargs)
-        if did_login:
-            # poor man way to "timeout" the login attempt and invalidate the cookies
-            self.is_logged_in = False
-        return ret
+            with self._login_lock:
+                # another thread may have logged in while this one waited
+                if not self.is_logged_in:
+                    self.login()
+        return fn(self, *args, **kwargs)
 
     return inner
 
@@ -47,6 +107,7 @@ class Action(abc.ABC):
     config_path: Path
     cfg: None | ConfigParser
     cookies: Any
+    _session: None | requests.Session
     kt_config: Path
 
     file_name: None | Path
@@ -55,9 +116,13 @@ class Action(abc.ABC):
     script: None | str
     post_script: None | str
     is_logged_in: bool
+    # the session is shared by the threads of an action, they log in one at a time
+    _login_lock: threading.RLock
+    # number of successful logins, tells a thread whether the session was renewed by another one
+    _logins: int
 
-    __slots__ = 'cwd', 'config_path', 'cfg', 'cookies', 'kt_config', 'file_name', 'lang', \
-        'pre_script', 'script', 'post_script', 'is_logged_in'
+    __slots__ = 'cwd', 'config_path', 'cfg', 'cookies', '_session', 'kt_config', 'file_name', \
+        'lang', 'pre_script', 'script', 'post_script', 'is_logged_in', '_login_lock', '_logins'
 
     def __init__(self, *, cwd: None | Path = None):
         self.config_path = Path.home() / '.kattisrc'  # kattis config file
@@ -65,6 +130,7 @@ class Action(abc.ABC):
         self.cfg = None
         self.cwd = cwd or Path().absolute()
         self.cookies = None
+        self._session = None
 
         self.file_name = None
         self.lang = None
@@ -72,6 +138,8 @@ class Action(abc.ABC):
         self.script = None
         self.post_script = None
         self.is_logged_in = False
+        self._login_lock = threading.RLock()
+        self._logins = 0
 
     def get_url(self, option: str, default: str = '') -> str:
         """ Get appropriate urls from kattisrc file
@@ -91,8 +159,16 @@ class Action(abc.ABC):
         if self.cfg.has_option('kattis', option):
             return self.cfg.get('kattis', option)
 
+        return f'{self.get_host_url()}/{default}'
+
+    def get_host_url(self) -> str:
+        """ Scheme and host of the Kattis instance of the kattisrc file. A server on this machine
+        (eg the fake Kattis of the tests) is reached over plain http
+        """
         kattis_host = self.cfg.get('kattis', 'hostname')
-        return f'https://{kattis_host}/{default}'
+        scheme = 'http' if urlparse(f'//{kattis_host}'
+                                    ).hostname in _LOCAL_HOSTS else 'https'
+        return f'{scheme}://{kattis_host}'
 
     def read_config_from_file(self) -> None:
         """ kttool deals with 2 config files:
@@ -112,14 +188,13 @@ class Action(abc.ABC):
             with open(self.kt_config, 'w') as f:
                 f.write('{}\n')
 
-        self.cfg = ConfigParser()
         if not self.config_path.is_file():
             raise RuntimeError(
                 f'No valid config file at {self.config_path}. '
                 f'Please download it at {KATTIS_RC_URL}'
             )
 
-        self.cfg.read(self.config_path)
+        self.cfg = _parse_cached(self.config_path, _read_kattisrc)
         username = self.cfg.get('user', 'username')
         password = token = None
         try:
@@ -143,15 +218,75 @@ class Action(abc.ABC):
         log(f'Username: {color_green(username)}')
         Action._PRINTED_OUT_USERNAME = True
 
-    def login(self) -> None:
-        """ Try to login and obtain cookies from succesful signin
+    @property
+    def session(self) -> requests.Session:
+        """ HTTP session shared by every request of this action, so that connections are kept alive
+        and reused. It is created on first use
+        """
+        if self._session is None:
+            import requests
+            self._session = requests.Session()
+            self._session.headers.update(HEADERS)
+            self.cookies = self._session.cookies
+        return self._session
+
+    def _cookie_cache_key(self) -> Tuple[str, str]:
+        return self.cfg.get('kattis', 'hostname'), self.cfg.get('user', 'username')
+
+    def _restore_cookies(self) -> bool:
+        cookies = CookieCache().load(*self._cookie_cache_key())
+        if not cookies:
+            return False
+        for cookie in cookies:
+            self.session.cookies.set(**cookie)
+        return True
+
+    def _save_cookies(self) -> None:
+        CookieCache().save(
+            *self._cookie_cache_key(), [
+                {
+                    'name': c.name,
+                    'value': c.value,
+                    'domain': c.domain,
+                    'path': c.path,
+                    'expires': c.expires,
+                    'secure': c.secure
+                } for c in self.session.cookies
+            ]
+        )
+
+    def login(self, force: bool = False) -> None:
+        """ Try to login and obtain cookies from succesful signin. The cookies are saved to disk, and
+        reused by the next logins until they expire or the server rejects them
+
+        Parameters
+        ----------
+        force : bool, optional
+            log in again even if there are saved cookies, by default False
 
         Raises
         ------
         RuntimeError
             If login fails
         """
+        with self._login_lock:
+            try:
+                self._login(force)
+            except BaseException:
+                self.is_logged_in = False
+                raise
+            self._logins += 1
+
+    def _login(self, force: bool) -> None:
+        if force:
+            CookieCache().clear(*self._cookie_cache_key())
+            self.session.cookies.clear()
+        elif self._restore_cookies():
+            self.is_logged_in = True
+            return
 
+        # is_logged_in is left as is until the login is done, so that the other threads that see
+        # the session expire in the meantime wait for it and replay their request
         username = self.cfg.get('user', 'username')
         password = token = ''
         try:
@@ -168,7 +303,7 @@ class Action(abc.ABC):
             login_args['password'] = password
         if token:
             login_args['token'] = token
-        login_reply = self._request_post(login_url, data=login_args)
+        login_reply = self.session.post(login_url, data=login_args)
 
         if login_reply.status_code != 200:
             if login_reply.status_code == 403:
@@ -178,23 +313,42 @@ class Action(abc.ABC):
             else:
                 err = f'Status code: {login_reply.status_code}'
             raise RuntimeError(f'Login failed. {err}')
-        self.cookies = login_reply.cookies
+        self._save_cookies()
         self.is_logged_in = True
 
     def _get_problem_id(self) -> str:
         # Assuming user is in the folder with the name of the problem id
         return self.cwd.name
 
-    def _request_get(self, uri: str) -> requests.Response:
-        return requests.get(uri, cookies=self.cookies, headers=HEADERS)
-
-    def _request_post(self, uri: str, *args, **kwargs) -> requests.Response:
-        return requests.post(
-            uri, *args, **kwargs, cookies=self.cookies, headers=HEADERS
-        )
+    @staticmethod
+    def _is_logged_out(response: requests.Response) -> bool:
+        """ Whether the server rejected the session, either with a 403 or by redirecting to the login page """
+        if response.status_code == 403:
+            return True
+        return bool(response.history) and urlparse(
+            response.url
+        ).path.rstrip('/').endswith('/login')
+
+    def _request(self, method: str, uri: str, **kwargs) -> requests.Response:
+        logins = self._logins
+        response = self.session.request(method, uri, **kwargs)
+        if self.is_logged_in and self._is_logged_out(response):
+            # the saved session expired, log in again and replay the request once. The threads
+            # that saw it expire at the same time only log in once
+            with self._login_lock:
+                if self._logins == logins:
+                    self.login(force=True)
+            response = self.session.request(method, uri, **kwargs)
+        return response
+
+    def _request_get(self, uri: str, **kwargs) -> requests.Response:
+        return self._request('GET', uri, **kwargs)
+
+    def _request_post(self, uri: str, **kwargs) -> requests.Response:
+        return self._request('POST', uri, **kwargs)
 
     def get_problem_url(self, supplied_id: None | str = None) -> str:
-        domain = f"https://{self.get_url('hostname')}"
+        domain = self.get_host_url()
         problem_id = supplied_id or self._get_problem_id()
         return os.path.join(domain, 'problems', problem_id)
 
@@ -206,14 +360,9 @@ class Action(abc.ABC):
         RuntimeError
             If no executable code detected
         """
-        acceptable_file_ext: Dict[str, PLanguage] = {}
+        acceptable_file_ext = self._acceptable_file_ext()
         opt = 0
         i = 0
-        existed_templates = self.load_kt_config()
-
-        for k in existed_templates.keys():
-            acceptable_file_ext[MAP_TEMPLATE_TO_PLANG[k].extension
-                               ] = MAP_TEMPLATE_TO_PLANG[k]
 
         files = [x for x in self.cwd.iterdir() if x.is_file()]
         runnable_files: List[Path] = []
@@ -234,33 +383,94 @@ class Action(abc.ABC):
                 log_red('Invalid option chosen')
                 return False
 
-        self.file_name = runnable_files[opt]
-        alias = acceptable_file_ext[runnable_files[opt].suffix[1:]].alias
-        self.lang = acceptable_file_ext[runnable_files[opt].suffix[1:]
-                                       ].full_name
-
-        file_name = self.file_name.stem
-        self.pre_script = existed_templates.get(alias,
-                                                {}).get('pre_script').replace(
-                                                    '$%file%$', file_name
-                                                )
-        self.script = existed_templates.get(alias, {}).get('script').replace(
-            '$%file%$', file_name
-        )
-        self.post_script = existed_templates.get(alias,
-                                                 {}).get('post_script').replace(
-                                                     '$%file%$', file_name
-                                                 )
+        code = self.load_code_file(runnable_files[opt])
+        self.file_name = code.path
+        self.lang = code.lang
+        self.pre_script = code.pre_script
+        self.script = code.script
+        self.post_script = code.post_script
         return True
 
+    def _acceptable_file_ext(self) -> Dict[str, PLanguage]:
+        acceptable_file_ext: Dict[str, PLanguage] = {}
+        for k in self.load_kt_config().keys():
+            acceptable_file_ext[MAP_TEMPLATE_TO_PLANG[k].extension
+                               ] = MAP_TEMPLATE_TO_PLANG[k]
+        return acceptable_file_ext
+
+    def load_code_file(self, path: Path) -> CodeFile:
+        """ Expand the template matching the extension of a code file
+
+        Parameters
+        ----------
+        path : Path
+            the code file, relative to the current folder
+
+        Returns
+        -------
+        CodeFile
+            the code file along with the scripts to build, run and clean it
+
+        Raises
+        ------
+        RuntimeError
+            If there is no template for this kind of file
+        """
+        path = self.cwd / path
+        if not path.is_file():
+            raise RuntimeError(f'{path} does not exist')
+        plang = self._acceptable_file_ext().get(path.suffix[1:])
+        if plang is None:
+            raise RuntimeError(f'No template configured for {path.name}')
+        template = self.load_kt_config().get(plang.alias, {})
+
+        def expand(key: str) -> str:
+            return (template.get(key) or '').replace('$%file%$', path.stem)
+
+        return CodeFile(
+            path=path,
+            lang=plang.full_name,
+            pre_script=expand('pre_script'),
+            script=expand('script'),
+            post_script=expand('post_script')
+        )
+
+    def run_pre_script(self, use_cache: bool = True) -> None:
+        """ Run the pre_script of the detected code file (usually the compilation step).
+        Unless `use_cache` is False, the files it produces are restored from the build cache when
+        neither the source nor the command have changed since they were cached
+        """
+        self.build(
+            CodeFile(
+                self.file_name, self.lang, self.pre_script, self.script,
+                self.post_script
+            ), use_cache
+        )
+
+    def build(self, code: CodeFile, use_cache: bool = True) -> None:
+        """ Run the pre_script of `code`, see `run_pre_script` """
+        if not code.pre_script:
+            return
+        if not use_cache:
+            log_cyan(f'running {code.pre_script}')
+            subprocess.check_call(shlex.split(code.pre_script), cwd=self.cwd)
+            return
+        cache = BuildCache()
+        key = cache.key(self.cwd, code.path, code.pre_script)
+        if cache.restore(key, self.cwd):
+            log_cyan(f'using cached build of {code.path.name}')
+            return
+        log_cyan(f'running {code.pre_script}')
+        cache.compile(key, self.cwd, code.path, code.pre_script)
+
     def load_kt_config(self) -> dict:
         if not self.kt_config.is_file():
             with open(self.kt_config, 'w+') as f:
                 json.dump({}, f)
 
         try:
-            with open(self.kt_config) as f:
-                return json.load(f)
+            # callers are free to modify the templates they get
+            return copy.deepcopy(_parse_cached(self.kt_config, _read_json))
         except:
             log_red('kattis config maybe corrupted, resetting..')
 
@@ -268,6 +478,97 @@ class Action(abc.ABC):
             json.dump({}, f)
         return {}
 
+    def load_problem_config(self, problem_dir: None | Path = None) -> dict:
+        """ Load the settings of a problem (eg its time and memory limits) saved in its folder
+
+        Parameters
+        ----------
+        problem_dir : None | Path, optional
+            folder of the problem, by default the current folder
+
+        Returns
+        -------
+        dict
+            the problem settings, empty if there is none
+        """
+        problem_config = (problem_dir or self.cwd) / KT_PROBLEM_CONFIG
+        if not problem_config.is_file():
+            return {}
+        try:
+            with open(problem_config) as f:
+                return json.load(f)
+        except:
+            log_red(f'{problem_config} maybe corrupted, ignoring..')
+        return {}
+
+    def save_problem_config(
+        self, values: dict, problem_dir: None | Path = None
+    ) -> None:
+        """ Merge `values` into the settings saved in the problem folder """
+        problem_dir = problem_dir or self.cwd
+        problem_config = self.load_problem_config(problem_dir)
+        problem_config.update(values)
+        with open(problem_dir / KT_PROBLEM_CONFIG, 'w') as f:
+            json.dump(problem_config, f, indent=2)
+
+    @staticmethod
+    def add_judge_options(parser: argparse.ArgumentParser) -> None:
+        """ Options of the commands that judge runs of a solution, read by `load_limits` and
+        `load_checker`
+        """
+        parser.add_argument('--time-limit', type=float, default=None)
+        parser.add_argument('--memory-limit', type=float, default=None)
+        parser.add_argument('--output-limit', type=float, default=None)
+        parser.add_argument('--checker', default=None)
+        parser.add_argument('--float-tolerance', type=float, default=None)
+
+    def load_limits(self, opts: argparse.Namespace) -> Limits:
+        """ Limits of the runs of a solution. The ones given on the command line (see
+        `add_judge_options`) take precedence over the ones of the problem, and 0 disables a limit
+        """
+        from kttool.runner import DEFAULT_OUTPUT_LIMIT, Limits
+        problem_config = self.load_problem_config()
+
+        def pick(cli_value: None | float, key: str,
+                 default: None | float = None) -> None | float:
+            value = cli_value if cli_value is not None else problem_config.get(
+                key, default
+            )
+            return value or None  # 0 disables the limit
+
+        return Limits(
+            time_limit=pick(opts.time_limit, 'time_limit'),
+            memory_limit=pick(opts.memory_limit, 'memory_limit'),
+            output_limit=pick(
+                opts.output_limit, 'output_limit', DEFAULT_OUTPUT_LIMIT
+            )
+        )
+
+    def load_checker(self, opts: argparse.Namespace) -> Checker:
+        """ Checker of the outputs of a solution. The checker and the float tolerance given on the
+        command line (see `add_judge_options`) take precedence over the ones of the problem
+        """
+        from kttool.checkers import DEFAULT_FLOAT_TOLERANCE, make_checker
+        problem_config = self.load_problem_config()
+        name = opts.checker or problem_config.get('checker', 'line')
+        if opts.float_tolerance is not None:
+            absolute_tolerance = relative_tolerance = opts.float_tolerance
+        else:
+            tolerance = problem_config.get(
+                'float_tolerance', DEFAULT_FLOAT_TOLERANCE
+            )
+            absolute_tolerance = problem_config.get(
+                'float_absolute_tolerance', tolerance
+            )
+            relative_tolerance = problem_config.get(
+                'float_relative_tolerance', tolerance
+            )
+        return make_checker(
+            name,
+            absolute_tolerance=absolute_tolerance,
+            relative_tolerance=relative_tolerance
+        )
+
     @abc.abstractmethod
     def _act(self) -> None:
         raise NotImplementedError()
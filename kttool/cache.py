@@ -0,0 +1,345 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Set, Tuple
+
+__all__ = [
+    'BuildCache', 'CachedPage', 'CookieCache', 'PageCache', 'cache_root',
+    'evict_lru'
+]
+
+
+def cache_root() -> Path:
+    ''' Root folder of every cache of kttool, `$XDG_CACHE_HOME/kt` (`~/.cache/kt` by default) '''
+    xdg_cache_home = os.environ.get('XDG_CACHE_HOME')
+    root = Path(xdg_cache_home) if xdg_cache_home else Path.home() / '.cache'
+    return root / 'kt'
+
+
+def _size(path: Path) -> int:
+    if path.is_file():
+        return path.stat().st_size
+    return sum(p.stat().st_size for p in path.rglob('*') if p.is_file())
+
+
+def evict_lru(directory: Path, max_size: int) -> None:
+    """ Remove the least recently used entries (files or folders) of `directory` until their total
+    size is at most `max_size` bytes. The modification time of an entry is its last use
+    """
+    if not directory.is_dir():
+        return
+    entries = [(p.stat().st_mtime, _size(p), p) for p in directory.iterdir()]
+    total = sum(size for _, size, _ in entries)
+    for _, size, p in sorted(entries, key=lambda x: x[0]):
+        if total <= max_size:
+            break
+        if p.is_dir():
+            shutil.rmtree(p, ignore_errors=True)
+        else:
+            p.unlink(missing_ok=True)
+        total -= size
+
+
+_Snapshot = Dict[str, Tuple[int, int]]
+# modification time (in ns) and size of a file
+_Stamp = Tuple[int, int]
+# versions of the compilers already read by this process, see `BuildCache._compiler_version`
+_compiler_versions: Dict[str, Tuple[_Stamp, str]] = {}
+# options of the usual compilers naming their output file
+_OUTPUT_OPTIONS = ('-o', '--output')
+
+
+class BuildCache:
+    ''' Cache of the files produced by the `pre_script` of a template (eg the compiled binary).
+    An entry is keyed on the content of the source, the expanded `pre_script` and the version of the
+    compiler, so that an unchanged source is never compiled twice
+    '''
+    MAX_SIZE = 512 << 20
+
+    def __init__(self, root: None | Path = None, max_size: int = MAX_SIZE):
+        self.root = root or cache_root() / 'build'
+        self.max_size = max_size
+        # files each pre_script produced the last time it ran in a folder, kept apart from the
+        # entries so that they are not evicted with them
+        self.outputs_root = self.root.with_name(f'{self.root.name}.outputs')
+        # versions of the compilers by path, along with the stamp of the compiler they were read from
+        self.versions_path = self.root.with_name(f'{self.root.name}.compilers.json')
+
+    def _known_versions(self) -> Dict[str, Tuple[_Stamp, str]]:
+        try:
+            with open(self.versions_path) as f:
+                return {
+                    compiler: (tuple(stamp), version)
+                    for compiler, (stamp, version) in json.load(f).items()
+                }
+        except (OSError, ValueError, TypeError):
+            return {}
+
+    def _record_version(self, compiler: str, stamp: _Stamp, version: str) -> None:
+        versions = self._known_versions()
+        versions[compiler] = (stamp, version)
+        try:
+            self.versions_path.parent.mkdir(parents=True, exist_ok=True)
+            staging = self.versions_path.with_suffix(f'.{os.getpid()}.tmp')
+            with open(staging, 'w') as f:
+                json.dump(versions, f)
+            os.replace(staging, self.versions_path)
+        except OSError:
+            pass
+
+    def _compiler_version(self, pre_script: str) -> str:
+        """ Output of `<compiler> --version`, only run again once the compiler file changed. The
+        versions are kept in memory and on disk so that a cached build spawns no process
+        """
+        args = shlex.split(pre_script)
+        compiler = shutil.which(args[0]) if args else None
+        if compiler is None:
+            return ''
+        try:
+            st = os.stat(compiler)
+        except OSError:
+            return compiler
+        stamp = (st.st_mtime_ns, st.st_size)
+        known = _compiler_versions.get(compiler)
+        if known is None or known[0] != stamp:
+            known = self._known_versions().get(compiler)
+        if known is not None and known[0] == stamp:
+            _compiler_versions[compiler] = known
+            return known[1]
+        try:
+            version = subprocess.run(
+                [compiler, '--version'],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                timeout=10
+            ).stdout.decode(errors='replace')
+        except (OSError, subprocess.SubprocessError):
+            return compiler
+        _compiler_versions[compiler] = (stamp, version)
+        self._record_version(compiler, stamp, version)
+        return version
+
+    @staticmethod
+    def _named_outputs(args: List[str]) -> Set[str]:
+        """ Files named as the output of the command, by `-o file`, `-ofile` or `--output=file` """
+        ret = set()
+        for i, arg in enumerate(args):
+            if arg in _OUTPUT_OPTIONS and i + 1 < len(args):
+                ret.add(args[i + 1])
+            elif arg.startswith('--output='):
+                ret.add(arg[len('--output='):])
+            elif arg.startswith('-o') and len(arg) > 2:
+                ret.add(arg[2:])
+        return ret
+
+    def _outputs_path(self, cwd: Path, pre_script: str) -> Path:
+        name = hashlib.sha256(f'{cwd.absolute()}\0{pre_script}'.encode()).hexdigest()
+        return self.outputs_root / f'{name}.json'
+
+    def _known_outputs(self, cwd: Path, pre_script: str) -> Set[str]:
+        try:
+            with open(self._outputs_path(cwd, pre_script)) as f:
+                return set(json.load(f))
+        except (OSError, ValueError):
+            return set()
+
+    def key(self, cwd: Path, source: Path, pre_script: str) -> str:
+        """ Hash of everything the output of `pre_script` depends on: the source, any other file
+        of `cwd` named in `pre_script`, the command itself and the version of the compiler. The
+        files the command produces are left out, whether they are named as its output or were
+        created by its previous run, so that the key does not depend on the previous build
+        """
+        h = hashlib.sha256()
+        h.update(pre_script.encode())
+        h.update(self._compiler_version(pre_script).encode())
+        args = shlex.split(pre_script)
+        outputs = self._named_outputs(args) | self._known_outputs(cwd, pre_script)
+        inputs = {source.name} | {
+            arg
+            for arg in args if arg not in outputs and (cwd / arg).is_file()
+        }
+        for name in sorted(inputs):
+            h.update(name.encode())
+            with open(cwd / name, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    h.update(chunk)
+        return h.hexdigest()
+
+    @staticmethod
+    def _snapshot(cwd: Path) -> _Snapshot:
+        ret: _Snapshot = {}
+        for p in cwd.iterdir():
+            if p.is_file():
+                st = p.stat()
+                ret[p.name] = (st.st_mtime_ns, st.st_size)
+        return ret
+
+    def restore(self, key: str, cwd: Path) -> bool:
+        """ Copy the cached files of `key` to `cwd`
+
+        Returns
+        -------
+        bool
+            False if there is no such entry
+        """
+        entry = self.root / key
+        if not entry.is_dir():
+            return False
+        for p in entry.iterdir():
+            shutil.copy2(p, cwd / p.name)
+        os.utime(entry)  # mark as recently used
+        return True
+
+    def _store(self, key: str, cwd: Path, artifacts: List[str]) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        entry = self.root / key
+        staging = Path(tempfile.mkdtemp(prefix=f'.{key}', dir=self.root))
+        for name in artifacts:
+            shutil.copy2(cwd / name, staging / name)
+        try:
+            staging.rename(entry)
+        except OSError:  # stored concurrently by another run
+            shutil.rmtree(staging, ignore_errors=True)
+        evict_lru(self.root, self.max_size)
+
+    def compile(
+        self, key: str, cwd: Path, source: Path, pre_script: str
+    ) -> None:
+        """ Run `pre_script` from `cwd` and cache the files it created or modified in `cwd` under `key` """
+        before = self._snapshot(cwd)
+        subprocess.check_call(shlex.split(pre_script), cwd=cwd)
+        after = self._snapshot(cwd)
+        artifacts = [
+            name for name, stat in after.items()
+            if name != source.name and before.get(name) != stat
+        ]
+        self._record_outputs(cwd, pre_script, artifacts)
+        if artifacts:
+            self._store(key, cwd, artifacts)
+
+    def _record_outputs(
+        self, cwd: Path, pre_script: str, artifacts: List[str]
+    ) -> None:
+        known = self._known_outputs(cwd, pre_script)
+        if known >= set(artifacts):
+            return
+        path = self._outputs_path(cwd, pre_script)
+        try:
+            self.outputs_root.mkdir(parents=True, exist_ok=True)
+            staging = path.with_suffix(f'.{os.getpid()}.tmp')
+            with open(staging, 'w') as f:
+                json.dump(sorted(known | set(artifacts)), f)
+            os.replace(staging, path)
+        except OSError:
+            pass
+
+
+class CookieCache:
+    ''' Cookies of a logged in session, saved per host and user so that the next runs of kt do not
+    have to log in again. Kattis sessions outlive `ttl` by far, an expired session is detected
+    anyway (see `Action._request`) so the ttl only bounds how long a stale session is tried
+    '''
+    TTL = 12 * 3600
+
+    def __init__(self, root: None | Path = None, ttl: float = TTL):
+        self.root = root or cache_root() / 'cookies'
+        self.ttl = ttl
+
+    def _path(self, host: str, username: str) -> Path:
+        name = hashlib.sha256(f'{host}\0{username}'.encode()).hexdigest()
+        return self.root / f'{name}.json'
+
+    def load(self, host: str, username: str) -> None | List[Dict[str, Any]]:
+        """ Cookies saved for `username` on `host`, None if there is none or they expired """
+        path = self._path(host, username)
+        try:
+            if time.time() - path.stat().st_mtime > self.ttl:
+                path.unlink()
+                return None
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(
+        self, host: str, username: str, cookies: List[Dict[str, Any]]
+    ) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self._path(host, username)
+        # the cookies are as good as the password, keep them private
+        fd = os.open(
+            path.with_suffix('.tmp'), os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+            0o600
+        )
+        with os.fdopen(fd, 'w') as f:
+            json.dump(cookies, f)
+        os.replace(path.with_suffix('.tmp'), path)
+
+    def clear(self, host: str, username: str) -> None:
+        self._path(host, username).unlink(missing_ok=True)
+
+
+@dataclass
+class CachedPage:
+    ''' A problem page along with what has been extracted from it '''
+    content: bytes
+    etag: str = ''
+    last_modified: str = ''
+    # sample inputs and answers, alternating
+    samples: List[str] = field(default_factory=list)
+    limits: Dict[str, float] = field(default_factory=dict)
+
+
+class PageCache:
+    ''' Problem pages keyed by host and problem id, with their ETag / Last-Modified validators so that
+    they can be revalidated with a conditional GET, and read offline. The least recently used pages
+    are evicted beyond `max_size` bytes
+    '''
+    MAX_SIZE = 64 << 20
+    _PAGE = 'page.html'
+    _META = 'meta.json'
+
+    def __init__(self, root: None | Path = None, max_size: int = MAX_SIZE):
+        self.root = root or cache_root() / 'pages'
+        self.max_size = max_size
+
+    def _entry(self, host: str, problem_id: str) -> Path:
+        return self.root / hashlib.sha256(f'{host}/{problem_id}'.encode()
+                                         ).hexdigest()
+
+    def load(self, host: str, problem_id: str) -> None | CachedPage:
+        """ Cached page of `problem_id` on `host`, None if it is not cached """
+        entry = self._entry(host, problem_id)
+        try:
+            with open(entry / self._META) as f:
+                meta = json.load(f)
+            page = CachedPage(content=(entry / self._PAGE).read_bytes(), **meta)
+        except (OSError, ValueError, TypeError):
+            return None
+        os.utime(entry)  # mark as recently used
+        return page
+
+    def save(self, host: str, problem_id: str, page: CachedPage) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        entry = self._entry(host, problem_id)
+        staging = Path(tempfile.mkdtemp(prefix=f'.{entry.name}', dir=self.root))
+        (staging / self._PAGE).write_bytes(page.content)
+        meta = asdict(page)
+        del meta['content']
+        with open(staging / self._META, 'w') as f:
+            json.dump(meta, f)
+        shutil.rmtree(entry, ignore_errors=True)
+        try:
+            staging.rename(entry)
+        except OSError:  # saved concurrently by another run
+            shutil.rmtree(staging, ignore_errors=True)
+        evict_lru(self.root, self.max_size)
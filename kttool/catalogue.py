@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import sqlite3
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, List
+
+from .cache import cache_root
+
+__all__ = ['CataloguedProblem', 'ProblemCatalogue']
+
+
+@dataclass(frozen=True)
+class CataloguedProblem:
+    id: str
+    # a problem whose difficulty is a single value has both bounds equal
+    difficulty_low: float
+    difficulty_high: float
+
+
+class ProblemCatalogue:
+    ''' Problems of each Kattis host with their difficulty, stored in SQLite and indexed on the
+    difficulty so that a difficulty range is a range scan of the index
+    '''
+    _SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS problems (
+        host TEXT NOT NULL,
+        id TEXT NOT NULL,
+        difficulty_low REAL NOT NULL,
+        difficulty_high REAL NOT NULL,
+        seen_at REAL NOT NULL,
+        PRIMARY KEY (host, id)
+    );
+    CREATE INDEX IF NOT EXISTS problems_difficulty
+        ON problems (host, difficulty_low, difficulty_high);
+    CREATE TABLE IF NOT EXISTS crawls (
+        host TEXT PRIMARY KEY,
+        completed_at REAL NOT NULL
+    );
+    '''
+
+    def __init__(self, path: None | Path = None):
+        self.path = path or cache_root() / 'problems.sqlite3'
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path))
+        with self._db:
+            self._db.executescript(self._SCHEMA)
+
+    def close(self) -> None:
+        self._db.close()
+
+    def __enter__(self) -> ProblemCatalogue:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def upsert(
+        self, host: str, problems: Iterable[CataloguedProblem],
+        seen_at: float
+    ) -> None:
+        with self._db:
+            self._db.executemany(
+                'INSERT OR REPLACE INTO problems VALUES (?, ?, ?, ?, ?)', [
+                    (host, x.id, x.difficulty_low, x.difficulty_high, seen_at)
+                    for x in problems
+                ]
+            )
+
+    def complete_crawl(self, host: str, started_at: float) -> None:
+        """ Record a full crawl of `host` started at `started_at`: the problems it did not see are gone """
+        with self._db:
+            self._db.execute(
+                'DELETE FROM problems WHERE host = ? AND seen_at < ?',
+                (host, started_at)
+            )
+            self._db.execute(
+                'INSERT OR REPLACE INTO crawls VALUES (?, ?)',
+                (host, time.time())
+            )
+
+    def last_crawl(self, host: str) -> None | float:
+        """ Time of the last full crawl of `host`, None if it has never been crawled """
+        row = self._db.execute(
+            'SELECT completed_at FROM crawls WHERE host = ?', (host, )
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def query(self, host: str, easiest: float,
+              hardest: float) -> List[CataloguedProblem]:
+        """ Problems of `host` whose whole difficulty range is within [`easiest`, `hardest`] """
+        return [
+            CataloguedProblem(*row) for row in self._db.execute(
+                'SELECT id, difficulty_low, difficulty_high FROM problems '
+                'WHERE host = ? AND difficulty_low BETWEEN ? AND ? AND difficulty_high <= ? '
+                'ORDER BY difficulty_low', (host, easiest, hardest, hardest)
+            )
+        ]
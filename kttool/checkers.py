@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+import abc
+import contextlib
+import io
+import math
+import mmap
+import os
+import shlex
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, List, Type
+
+from .compare import Comparison, compare_streams, compare_tokens
+from .samples import is_compressed, open_case
+
+__all__ = [
+    'Checker', 'LineChecker', 'TokenChecker', 'CaseInsensitiveChecker',
+    'FloatChecker', 'ExternalChecker', 'BUILTIN_CHECKERS', 'make_checker'
+]
+
+DEFAULT_FLOAT_TOLERANCE = 1e-6
+
+
+@contextlib.contextmanager
+def _mapped(stream: BinaryIO) -> Iterator[BinaryIO]:
+    """ Read a file through a read only memory mapping of it, so that the comparison reads its chunks
+    straight from the page cache. Streams that are not plain files (such as a decompressing reader,
+    whose fileno is the one of the compressed file), and empty files (which can not be mapped), are
+    read as they are
+    """
+    size = 0
+    if isinstance(stream, (io.BufferedReader, io.BufferedRandom)):
+        try:
+            fileno = stream.fileno()
+            size = os.fstat(fileno).st_size
+        except io.UnsupportedOperation:
+            pass
+    if not size:
+        yield stream
+        return
+    with mmap.mmap(fileno, 0, access=mmap.ACCESS_READ) as mapped:
+        mapped.seek(stream.tell())
+        yield mapped
+
+
+class Checker(abc.ABC):
+    ''' Decide whether the output of a program is an acceptable answer for a sample '''
+    @abc.abstractmethod
+    def check(
+        self, input_file: Path, answer_file: Path, output: BinaryIO,
+        max_mismatches: int
+    ) -> Comparison:
+        """ Check `output` against the expected answer of a sample
+
+        Parameters
+        ----------
+        input_file : Path
+            input of the sample
+        answer_file : Path
+            expected answer of the sample
+        output : BinaryIO
+            output of the program, opened in binary mode
+        max_mismatches : int
+            stop checking after this number of mismatches
+
+        Returns
+        -------
+        Comparison
+            the mismatches and their rendered diff
+        """
+        raise NotImplementedError()
+
+
+class LineChecker(Checker):
+    ''' Lines have to match, the whitespaces around each line are ignored. This is the default '''
+    def check(
+        self, input_file: Path, answer_file: Path, output: BinaryIO,
+        max_mismatches: int
+    ) -> Comparison:
+        with open_case(answer_file) as f, _mapped(f) as expected, _mapped(
+            output
+        ) as actual:
+            return compare_streams(
+                expected, actual, max_mismatches=max_mismatches
+            )
+
+
+class TokenChecker(Checker):
+    ''' Whitespace separated tokens have to match, the amount and kind of whitespaces are ignored '''
+    def _same(self, expected: bytes, actual: bytes) -> bool:
+        return expected == actual
+
+    def check(
+        self, input_file: Path, answer_file: Path, output: BinaryIO,
+        max_mismatches: int
+    ) -> Comparison:
+        with open_case(answer_file) as f, _mapped(f) as expected, _mapped(
+            output
+        ) as actual:
+            return compare_tokens(
+                expected, actual, self._same, max_mismatches=max_mismatches
+            )
+
+
+class CaseInsensitiveChecker(TokenChecker):
+    ''' Like the token checker, but tokens are compared case insensitively '''
+    def _same(self, expected: bytes, actual: bytes) -> bool:
+        return expected == actual or expected.lower() == actual.lower()
+
+
+class FloatChecker(TokenChecker):
+    ''' Like the token checker, but tokens that are both numbers match if they are close enough,
+    either in absolute or in relative terms
+    '''
+    def __init__(
+        self,
+        absolute_tolerance: float = DEFAULT_FLOAT_TOLERANCE,
+        relative_tolerance: float = DEFAULT_FLOAT_TOLERANCE
+    ):
+        self.absolute_tolerance = absolute_tolerance
+        self.relative_tolerance = relative_tolerance
+
+    def _same(self, expected: bytes, actual: bytes) -> bool:
+        if expected == actual:
+            return True
+        try:
+            expected_value = float(expected)
+            actual_value = float(actual)
+        except ValueError:
+            return False
+        if math.isnan(expected_value) or math.isnan(actual_value):
+            return False
+        delta = abs(expected_value - actual_value)
+        return delta <= self.absolute_tolerance or \
+            delta <= self.relative_tolerance * abs(expected_value)
+
+
+class ExternalChecker(Checker):
+    ''' Kattis style output validator, run as `validator input judge_answer feedback_dir < output`.
+    It exits with 42 if the output is accepted and 43 if it is rejected
+    '''
+    _ACCEPTED = 42
+    _REJECTED = 43
+    _TIME_OUT = 60
+
+    def __init__(self, command: str):
+        self.command = shlex.split(command)
+
+    def check(
+        self, input_file: Path, answer_file: Path, output: BinaryIO,
+        max_mismatches: int
+    ) -> Comparison:
+        with tempfile.TemporaryDirectory(
+            prefix='kt_feedback'
+        ) as feedback_dir, tempfile.TemporaryDirectory(
+            prefix='kt_case'
+        ) as case_dir:
+            args = [
+                *self.command,
+                str(self._plain(input_file, Path(case_dir))),
+                str(self._plain(answer_file, Path(case_dir))), feedback_dir
+            ]
+            if self._has_fileno(output):
+                stdin = {'stdin': output}
+            else:
+                stdin = {'input': output.read()}
+            p = subprocess.run(
+                args,
+                **stdin,
+                stdout=subprocess.DEVNULL,
+                timeout=self._TIME_OUT
+            )
+            if p.returncode == self._ACCEPTED:
+                return Comparison()
+            if p.returncode != self._REJECTED:
+                raise RuntimeError(
+                    f'Checker {self.command[0]} failed with exit code {p.returncode}'
+                )
+            return Comparison(
+                diff=self._read_feedback(Path(feedback_dir)), rejected=True
+            )
+
+    @staticmethod
+    def _plain(path: Path, folder: Path) -> Path:
+        """ `path` itself, or a decompressed copy of it in `folder` if it is compressed, since the
+        validator opens its files by name
+        """
+        if not is_compressed(path):
+            return path
+        plain = folder / path.stem
+        with open_case(path) as source, open(plain, 'wb') as f:
+            shutil.copyfileobj(source, f)
+        return plain
+
+    @staticmethod
+    def _has_fileno(stream: BinaryIO) -> bool:
+        try:
+            stream.fileno()
+            return True
+        except (AttributeError, io.UnsupportedOperation):
+            return False
+
+    @staticmethod
+    def _read_feedback(feedback_dir: Path) -> List[str]:
+        judge_message = feedback_dir / 'judgemessage.txt'
+        if not judge_message.is_file():
+            return []
+        with open(judge_message, errors='replace') as f:
+            return f.read().splitlines()
+
+
+BUILTIN_CHECKERS: Dict[str, Type[Checker]] = {
+    'line': LineChecker,
+    'token': TokenChecker,
+    'case': CaseInsensitiveChecker,
+    'float': FloatChecker,
+}
+
+
+def make_checker(
+    name: str,
+    absolute_tolerance: float = DEFAULT_FLOAT_TOLERANCE,
+    relative_tolerance: float = DEFAULT_FLOAT_TOLERANCE
+) -> Checker:
+    """ Build a checker from its name, anything else than a builtin checker name is considered as the
+    command of a Kattis style output validator
+
+    Parameters
+    ----------
+    name : str
+        one of `BUILTIN_CHECKERS` or a command
+    absolute_tolerance : float, optional
+        absolute tolerance of the float checker
+    relative_tolerance : float, optional
+        relative tolerance of the float checker
+
+    Returns
+    -------
+    Checker
+        the checker
+    """
+    if name == 'float':
+        return FloatChecker(absolute_tolerance, relative_tolerance)
+    if name in BUILTIN_CHECKERS:
+        return BUILTIN_CHECKERS[name]()
+    return ExternalChecker(name)
@@ -0,0 +1,130 @@
+''' Thin client of `kt daemon`. The kt script imports this module before anything else, so it only
+depends on the standard library modules that the interpreter has loaded anyway
+'''
+from __future__ import annotations
+
+import array
+import json
+import os
+import signal
+import socket
+from pathlib import Path
+from typing import Any, Dict, List, Sequence, Tuple
+
+__all__ = [
+    'NO_DAEMON_ENV', 'connect', 'recv_fds', 'recv_message', 'run_in_daemon',
+    'send_fds', 'send_message', 'socket_path'
+]
+
+# set to run commands in the kt process even when a daemon is running
+NO_DAEMON_ENV = 'KT_NO_DAEMON'
+_MAX_MESSAGE = 1 << 20
+# commands that always run in the kt process
+_IN_PROCESS = (['daemon'], ['d'], ['update'], ['u'])
+
+
+def socket_path() -> Path:
+    """ Socket of the daemon, in the cache folder of kttool (see `kttool.cache.cache_root`, which is
+    not imported here to keep the client light)
+    """
+    xdg_cache_home = os.environ.get('XDG_CACHE_HOME')
+    root = Path(xdg_cache_home) if xdg_cache_home else Path.home() / '.cache'
+    return root / 'kt' / 'daemon.sock'
+
+
+def send_fds(sock: socket.socket, data: bytes, fds: Sequence[int]) -> None:
+    """ `socket.send_fds` of python 3.9 """
+    sock.sendmsg(
+        [data],
+        [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array('i', fds))]
+    )
+
+
+def recv_fds(sock: socket.socket, bufsize: int,
+             maxfds: int) -> Tuple[bytes, List[int]]:
+    """ `socket.recv_fds` of python 3.9 """
+    fds = array.array('i')
+    data, ancdata, _, _ = sock.recvmsg(
+        bufsize, socket.CMSG_LEN(maxfds * fds.itemsize)
+    )
+    for level, kind, cmsg_data in ancdata:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            fds.frombytes(
+                cmsg_data[:len(cmsg_data) - (len(cmsg_data) % fds.itemsize)]
+            )
+    return data, list(fds)
+
+
+def send_message(sock: socket.socket, message: Dict[str, Any]) -> None:
+    sock.sendall(json.dumps(message).encode() + b'\n')
+
+
+def recv_message(reader) -> None | Dict[str, Any]:
+    """ Next message of a `socket.makefile('rb')`, None once the other side is gone """
+    line = reader.readline(_MAX_MESSAGE)
+    return json.loads(line) if line else None
+
+
+def connect() -> None | socket.socket:
+    """ Connection to the running daemon, None if there is none """
+    if not hasattr(socket, 'AF_UNIX'):
+        return None
+    path = socket_path()
+    if not path.exists():
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(str(path))
+    except OSError:
+        # a daemon that did not shut down cleanly leaves its socket behind
+        sock.close()
+        return None
+    return sock
+
+
+def run_in_daemon(args: List[str]) -> None | int:
+    """ Have the daemon run the kt command `args` on the terminal (stdin, stdout and stderr) of this
+    process
+
+    Returns
+    -------
+    None | int
+        exit code of the command, None when there is no daemon to run it
+    """
+    # `kt update` replaces the code the daemon has loaded
+    if os.environ.get(NO_DAEMON_ENV) or args[:1] in _IN_PROCESS:
+        return None
+    sock = connect()
+    if sock is None:
+        return None
+    with sock:
+        # the files the command creates follow the umask of this process, as they would without
+        # the daemon. It can only be read by setting it
+        umask = os.umask(0)
+        os.umask(umask)
+        request = {
+            'args': args,
+            'cwd': os.getcwd(),
+            'env': dict(os.environ),
+            'umask': umask
+        }
+        try:
+            send_fds(sock, json.dumps(request).encode() + b'\n', [0, 1, 2])
+        except OSError:
+            return None
+        reader = sock.makefile('rb')
+        pid = None
+        while True:
+            try:
+                message = recv_message(reader)
+            except KeyboardInterrupt:
+                # the command runs in another session, Ctrl+C only reaches this process
+                if pid is not None:
+                    os.kill(pid, signal.SIGINT)
+                continue
+            if message is None:
+                return 1
+            if 'pid' in message:
+                pid = message['pid']
+            if 'exit' in message:
+                return message['exit']
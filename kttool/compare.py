@@ -0,0 +1,309 @@
+from __future__ import annotations
+
+from collections import deque
+from dataclasses import dataclass, field
+from itertools import zip_longest
+from typing import BinaryIO, Callable, Deque, Iterator, List, Tuple
+
+from .logger import color_green, color_red, strike_through
+
+__all__ = ['Comparison', 'Mismatch', 'compare_streams', 'compare_tokens']
+
+_CHUNK_SIZE = 1 << 20
+# number of tokens rendered around the first differing token of a mismatched line
+_TOKENS_BEFORE = 5
+_TOKENS_AFTER = 20
+_STRIPPED = b' \r\n'
+
+
+@dataclass(frozen=True)
+class Mismatch:
+    line_no: int
+    expected: bytes
+    actual: bytes
+
+
+@dataclass
+class Comparison:
+    mismatches: List[Mismatch] = field(default_factory=list)
+    # rendered lines around the mismatches, with the line number of each line
+    diff: List[str] = field(default_factory=list)
+    # set by checkers that judge the output as a whole
+    rejected: bool = False
+
+    @property
+    def is_ac(self) -> bool:
+        return not (self.mismatches or self.rejected)
+
+
+def _iter_lines(head: bytes, stream: BinaryIO,
+                chunk_size: int) -> Iterator[bytes]:
+    """ Yield the lines of `head` followed by the rest of `stream`, reading `chunk_size` bytes at a time.
+    Only the current chunk and the current line are held in memory
+    """
+    carry: List[bytes] = []
+    chunk = head
+    while chunk:
+        carry.append(chunk)
+        if b'\n' in chunk:
+            lines = b''.join(carry).split(b'\n')
+            carry = [lines.pop()]
+            yield from lines
+        chunk = stream.read(chunk_size)
+    last = b''.join(carry)
+    if last:
+        yield last
+
+
+def _iter_tokens(head: bytes, stream: BinaryIO, chunk_size: int,
+                 first_line: int) -> Iterator[Tuple[int, bytes]]:
+    """ Yield the whitespace separated tokens of `head` followed by the rest of `stream`, along with
+    the line number of each token
+    """
+    for line_no, line in enumerate(
+        _iter_lines(head, stream, chunk_size), first_line
+    ):
+        for token in line.split():
+            yield line_no, token
+
+
+@dataclass
+class _IdenticalPrefix:
+    line_no: int  # number of complete lines that are identical on both sides
+    expected_head: bytes  # remaining data read from each side, from the first line that differs
+    actual_head: bytes
+    # up to `context` identical lines before the first line that differs, with their line number
+    before: List[Tuple[int, bytes]]
+
+
+def _skip_identical_prefix(expected: BinaryIO, actual: BinaryIO,
+                           chunk_size: int,
+                           context: int = 0) -> None | _IdenticalPrefix:
+    """ Read both streams chunk by chunk for as long as they are identical. Only the last chunks,
+    just enough of them to hold `context` lines, are kept around
+
+    Returns
+    -------
+    None | _IdenticalPrefix
+        None if both streams are identical
+    """
+    line_no = 0
+    head: List[bytes] = []  # start of the current line
+    recent: Deque[Tuple[bytes, int]] = deque()
+    recent_newlines = 0
+    from_start = True  # whether `recent` holds the beginning of the streams
+    while True:
+        expected_chunk = expected.read(chunk_size)
+        actual_chunk = actual.read(chunk_size)
+        if expected_chunk != actual_chunk:
+            break
+        if not expected_chunk:
+            return None
+        newlines = expected_chunk.count(b'\n')
+        recent.append((expected_chunk, newlines))
+        recent_newlines += newlines
+        while len(recent) > 1 and recent_newlines - recent[0][1] > context:
+            recent_newlines -= recent.popleft()[1]
+            from_start = False
+        if newlines:
+            line_no += newlines
+            head = [expected_chunk[expected_chunk.rfind(b'\n') + 1:]]
+        else:
+            head.append(expected_chunk)
+
+    before: List[Tuple[int, bytes]] = []
+    consumed = b''.join(chunk for chunk, _ in recent)
+    if context and b'\n' in consumed:
+        lines = consumed[:consumed.rfind(b'\n')].split(b'\n')
+        if not from_start:
+            lines = lines[1:]  # the first one may be truncated
+        lines = lines[-context:]
+        before = [
+            (line_no - len(lines) + i + 1, line) for i, line in enumerate(lines)
+        ]
+    head_bytes = b''.join(head)
+    return _IdenticalPrefix(
+        line_no, head_bytes + expected_chunk, head_bytes + actual_chunk, before
+    )
+
+
+def _decode(data: bytes) -> str:
+    return data.decode('utf-8', 'replace')
+
+
+def _render_token(actual: bytes, expected: bytes) -> str:
+    # compared as bytes, two invalid utf-8 tokens may decode to the same text
+    if actual == expected:
+        return f'{_decode(actual)} '
+    return f'{color_red(strike_through(_decode(actual)))}{color_green(_decode(expected))} '
+
+
+def _render_mismatch(expected: bytes, actual: bytes) -> str:
+    """ Render the tokens of a mismatched line around its first differing token: the actual token
+    is struck through, followed by the expected one
+    """
+    pairs: List[Tuple[bytes, bytes]] = list(
+        zip_longest(actual.split(b' '), expected.split(b' '), fillvalue=b'')
+    )
+    first = next((i for i, (lhs, rhs) in enumerate(pairs) if lhs != rhs), 0)
+    start = max(0, first - _TOKENS_BEFORE)
+    end = first + _TOKENS_AFTER
+    rendered = ''.join(_render_token(lhs, rhs) for lhs, rhs in pairs[start:end])
+    if start > 0:
+        rendered = f'... {rendered}'
+    if end < len(pairs):
+        rendered = f'{rendered}...'
+    return rendered
+
+
+def _render_line(line_no: int, text: str) -> str:
+    return f'{line_no:>6} | {text}'
+
+
+def compare_streams(
+    expected: BinaryIO,
+    actual: BinaryIO,
+    max_mismatches: int = 1,
+    context: int = 2,
+    chunk_size: int = _CHUNK_SIZE
+) -> Comparison:
+    """ Compare the output of a program with the expected answer without loading either of them fully.
+    Lines are compared after stripping the surrounding whitespaces, which means the tokens of a line
+    have to be the same and in the same order. Trailing empty lines are ignored.
+
+    Both sides are first compared chunk by chunk. From the first chunk that differs, they are compared
+    line by line, until `max_mismatches` lines differ.
+
+    Parameters
+    ----------
+    expected : BinaryIO
+        expected answer, opened in binary mode
+    actual : BinaryIO
+        output of the program, opened in binary mode
+    max_mismatches : int, optional
+        stop after this number of mismatched lines, by default 1
+    context : int, optional
+        number of lines rendered before and after each mismatched line, by default 2
+    chunk_size : int, optional
+        number of bytes read at a time from each side
+
+    Returns
+    -------
+    Comparison
+        the mismatched lines and their rendered diff
+    """
+    skipped = _skip_identical_prefix(expected, actual, chunk_size, context)
+    if skipped is None:
+        return Comparison()
+    line_no = skipped.line_no
+    # lines before the current one, rendered as context of the next mismatch
+    before: Deque[Tuple[int, bytes]] = deque(skipped.before, maxlen=context)
+    # restart line by line from the beginning of the first line that differs
+    expected_lines = _iter_lines(skipped.expected_head, expected, chunk_size)
+    actual_lines = _iter_lines(skipped.actual_head, actual, chunk_size)
+
+    comparison = Comparison()
+    last_rendered = 0
+    after = 0  # number of context lines still to render after the last mismatch
+    # set once `max_mismatches` are recorded, the first mismatch always is
+    full = False
+    for expected_line, actual_line in zip_longest(
+        expected_lines, actual_lines, fillvalue=b''
+    ):
+        line_no += 1
+        expected_line = expected_line.strip(_STRIPPED)
+        actual_line = actual_line.strip(_STRIPPED)
+        if expected_line == actual_line:
+            if after:
+                comparison.diff.append(
+                    _render_line(line_no, _decode(expected_line))
+                )
+                last_rendered = line_no
+                after -= 1
+            elif full:
+                break
+            else:
+                before.append((line_no, expected_line))
+            continue
+
+        if full:
+            break
+        while before and before[0][0] <= last_rendered:
+            before.popleft()
+        first_line = before[0][0] if before else line_no
+        if comparison.diff and first_line > last_rendered + 1:
+            comparison.diff.append('...')
+        for context_line_no, line in before:
+            comparison.diff.append(_render_line(context_line_no, _decode(line)))
+        before.clear()
+        comparison.diff.append(
+            _render_line(line_no, _render_mismatch(expected_line, actual_line))
+        )
+        comparison.mismatches.append(
+            Mismatch(line_no, expected_line, actual_line)
+        )
+        last_rendered = line_no
+        after = context
+        full = len(comparison.mismatches) >= max_mismatches
+    return comparison
+
+
+def compare_tokens(
+    expected: BinaryIO,
+    actual: BinaryIO,
+    same: Callable[[bytes, bytes], bool],
+    max_mismatches: int = 1,
+    chunk_size: int = _CHUNK_SIZE
+) -> Comparison:
+    """ Compare the whitespace separated tokens of the output of a program with the ones of the
+    expected answer, ignoring the amount and the kind of whitespaces (including newlines) between them.
+    Like `compare_streams`, both sides are compared chunk by chunk as long as they are identical
+
+    Parameters
+    ----------
+    expected : BinaryIO
+        expected answer, opened in binary mode
+    actual : BinaryIO
+        output of the program, opened in binary mode
+    same : Callable[[bytes, bytes], bool]
+        whether an expected token and an actual token match
+    max_mismatches : int, optional
+        stop after this number of mismatched tokens, by default 1
+    chunk_size : int, optional
+        number of bytes read at a time from each side
+
+    Returns
+    -------
+    Comparison
+        the mismatched tokens, along with the line number of the expected token
+    """
+    skipped = _skip_identical_prefix(expected, actual, chunk_size)
+    if skipped is None:
+        return Comparison()
+
+    comparison = Comparison()
+    missing = (0, b'')
+    for (expected_line_no, expected_token), (actual_line_no, actual_token) in zip_longest(
+        _iter_tokens(
+            skipped.expected_head, expected, chunk_size, skipped.line_no + 1
+        ),
+        _iter_tokens(
+            skipped.actual_head, actual, chunk_size, skipped.line_no + 1
+        ),
+        fillvalue=missing
+    ):
+        if same(expected_token, actual_token):
+            continue
+        mismatch = Mismatch(
+            expected_line_no or actual_line_no, expected_token, actual_token
+        )
+        comparison.mismatches.append(mismatch)
+        comparison.diff.append(
+            _render_line(
+                mismatch.line_no,
+                _render_token(actual_token, expected_token)
+            )
+        )
+        if len(comparison.mismatches) >= max_mismatches:
+            break
+    return comparison
@@ -1,9 +1,9 @@
 import sys, os
 
-__all__ = ['supports_color']
+__all__ = ['detect_color_support', 'supports_color']
 
 
-def __supports_color():
+def detect_color_support() -> bool:
     """
     Returns True if the running system's terminal supports color, and False
     otherwise.
@@ -17,4 +17,4 @@ def __supports_color():
     return supported_platform and is_a_tty
 
 
-supports_color = __supports_color()
+supports_color = detect_color_support()
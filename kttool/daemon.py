@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import json
+import os
+import signal
+import socket
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Set
+
+from .base import warm_config
+from .client import recv_fds, send_message, socket_path
+
+__all__ = ['DaemonServer']
+
+# commands whose modules (and libraries) are imported before the first request. `kt config` is left
+# out as readline binds to the terminal it is imported from
+_PRELOADED = (
+    'gen', 'test', 'submit', 'stress', 'bench', 'surprise', 'open', 'version'
+)
+# how often the idle timeout is checked and finished commands are reaped, in seconds
+_TICK = 1.
+# how long a client may take to send its request, in seconds. The daemon serves one connection at a
+# time, a client that never sends anything must not hold it
+_RECEIVE_TIMEOUT = 5.
+
+
+class DaemonServer:
+    ''' Run kt commands sent over a unix socket. The server imports kt and its libraries and parses
+    the config files once, then forks a child for every command. The child runs the command on the
+    terminal of the client, in its folder and with its environment, exactly like the kt script would.
+
+    Only what is in memory before the fork is shared by the commands: the imported modules and the
+    parsed config files. Each command opens its own http session, as a connection can not be used by
+    two processes, so it reuses the session cookies saved on disk but not the connections of the
+    previous command
+    '''
+    path: Path
+    idle_timeout: float
+    started_at: float
+    served: int
+    _children: Set[int]
+    _last_activity: float
+    _stopped: bool
+
+    __slots__ = 'path', 'idle_timeout', 'started_at', 'served', '_children', \
+        '_last_activity', '_stopped'
+
+    def __init__(self, idle_timeout: float, path: None | Path = None):
+        self.path = path or socket_path()
+        self.idle_timeout = idle_timeout
+        self.started_at = time.time()
+        self.served = 0
+        self._children = set()
+        self._last_activity = time.monotonic()
+        self._stopped = False
+
+    @staticmethod
+    def _preload() -> None:
+        from .parser import load_action
+        from .scrape import available_parsers
+        for key in _PRELOADED:
+            load_action(key)
+        import requests  # noqa: F401
+        available_parsers()
+
+    def _reap(self) -> None:
+        for pid in list(self._children):
+            try:
+                done, _ = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                done = pid
+            if done:
+                self._children.discard(pid)
+                self._last_activity = time.monotonic()
+
+    def _is_idle(self) -> bool:
+        return not self._children and time.monotonic(
+        ) - self._last_activity >= self.idle_timeout
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            'pid': os.getpid(),
+            'started_at': self.started_at,
+            'served': self.served,
+            'running': len(self._children),
+            'idle_timeout': self.idle_timeout,
+        }
+
+    def serve(self) -> None:
+        """ Serve until `kt daemon stop` or until no command arrived for `idle_timeout` seconds """
+        self._preload()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.path.exists():
+            self.path.unlink()
+        # only the user running the daemon may connect to it. The umask is only changed for the
+        # socket, the commands get the one of their client
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        umask = os.umask(0o077)
+        try:
+            server.bind(str(self.path))
+        finally:
+            os.umask(umask)
+        server.listen(16)
+        server.settimeout(_TICK)
+        self._last_activity = time.monotonic()
+        try:
+            while not self._stopped:
+                self._reap()
+                if self._is_idle():
+                    break
+                try:
+                    conn, _ = server.accept()
+                except socket.timeout:
+                    continue
+                self._last_activity = time.monotonic()
+                with conn:
+                    conn.settimeout(_RECEIVE_TIMEOUT)
+                    try:
+                        self._handle(server, conn)
+                    except socket.timeout:
+                        pass  # the client went silent
+        finally:
+            server.close()
+            if self.path.exists():
+                self.path.unlink()
+
+    def _handle(self, server: socket.socket, conn: socket.socket) -> None:
+        data, fds = recv_fds(conn, 1 << 16, 3)
+        try:
+            while not data.endswith(b'\n'):
+                chunk = conn.recv(1 << 16)
+                if not chunk:
+                    return
+                data += chunk
+            request = json.loads(data)
+            if 'control' in request:
+                send_message(conn, self.status())
+                self._stopped = request['control'] == 'stop'
+                return
+            if len(fds) != 3:
+                return
+            self.served += 1
+            warm_config(Path(request['env'].get('HOME', Path.home())))
+            pid = os.fork()
+            if pid == 0:
+                server.close()
+                # the command may run for long, it only writes to the client
+                conn.settimeout(None)
+                os._exit(_run_command(conn, request, fds))
+            self._children.add(pid)
+        finally:
+            for fd in fds:
+                os.close(fd)
+
+
+def _run_command(
+    conn: socket.socket, request: Dict[str, Any], fds: List[int]
+) -> int:
+    """ Run a command in a child of the daemon and tell the client its exit code """
+    from . import logger
+    from .context import detect_color_support
+    from .parser import main
+    from .utils import exit_gracefully
+
+    exit_code = 0
+    try:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        for target, fd in enumerate(fds):
+            os.dup2(fd, target)
+        sys.stdout.reconfigure(line_buffering=True)
+        sys.stderr.reconfigure(line_buffering=True)
+        os.chdir(request['cwd'])
+        os.environ.clear()
+        os.environ.update(request['env'])
+        if 'umask' in request:
+            os.umask(request['umask'])
+        # the daemon itself has no terminal
+        logger.supports_color = detect_color_support()
+        signal.signal(signal.SIGINT, exit_gracefully)
+        send_message(conn, {'pid': os.getpid()})
+        main(request['args'])
+    except SystemExit as e:
+        exit_code = e.code if isinstance(e.code, int) else int(e.code is not None)
+    except BaseException:
+        exit_code = 1
+    try:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        send_message(conn, {'exit': exit_code})
+    except OSError:
+        pass
+    return exit_code
@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable
+
+from .cache import cache_root
+
+__all__ = ['CaseRecord', 'RunHistory', 'HistoricRun', 'source_hash']
+
+
+def source_hash(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+@dataclass(frozen=True)
+class CaseRecord:
+    sample: str  # name of the sample, see `Sample.name`
+    verdict: str
+    wall_time: float  # in seconds
+    cpu_time: float  # in seconds
+    peak_memory: float  # in MB
+    output_size: int  # in bytes
+
+
+@dataclass
+class HistoricRun:
+    id: int
+    problem_id: str
+    source_hash: str
+    lang: str
+    started_at: float
+    cases: Dict[str, CaseRecord] = field(default_factory=dict)
+
+
+class RunHistory:
+    ''' Every `kt test` run with the verdict and the resource usage of each sample, stored in SQLite
+    per problem and per hash of the tested source, so that runs of different revisions of a solution
+    can be compared. Only the last `max_runs` runs of each problem are kept
+    '''
+    MAX_RUNS = 200
+    _SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS runs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        problem_id TEXT NOT NULL,
+        source_hash TEXT NOT NULL,
+        lang TEXT NOT NULL,
+        started_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS runs_problem ON runs (problem_id, source_hash, id);
+    CREATE TABLE IF NOT EXISTS cases (
+        run_id INTEGER NOT NULL REFERENCES runs (id),
+        sample TEXT NOT NULL,
+        verdict TEXT NOT NULL,
+        wall_time REAL NOT NULL,
+        cpu_time REAL NOT NULL,
+        peak_memory REAL NOT NULL,
+        output_size INTEGER NOT NULL,
+        PRIMARY KEY (run_id, sample)
+    );
+    '''
+
+    def __init__(self, path: None | Path = None, max_runs: int = MAX_RUNS):
+        self.path = path or cache_root() / 'history.sqlite3'
+        self.max_runs = max_runs
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path))
+        with self._db:
+            self._db.executescript(self._SCHEMA)
+
+    def close(self) -> None:
+        self._db.close()
+
+    def __enter__(self) -> RunHistory:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def record(
+        self,
+        problem_id: str,
+        source_hash: str,
+        lang: str,
+        cases: Iterable[CaseRecord],
+        started_at: None | float = None
+    ) -> int:
+        """ Store a run and forget the runs of `problem_id` beyond the last `max_runs`, returns its id """
+        with self._db:
+            run_id = self._db.execute(
+                'INSERT INTO runs (problem_id, source_hash, lang, started_at) VALUES (?, ?, ?, ?)',
+                (
+                    problem_id, source_hash, lang,
+                    time.time() if started_at is None else started_at
+                )
+            ).lastrowid
+            self._db.executemany(
+                'INSERT INTO cases VALUES (?, ?, ?, ?, ?, ?, ?)', [
+                    (
+                        run_id, x.sample, x.verdict, x.wall_time, x.cpu_time,
+                        x.peak_memory, x.output_size
+                    ) for x in cases
+                ]
+            )
+            expired = 'SELECT id FROM runs WHERE problem_id = ? ORDER BY id DESC LIMIT -1 OFFSET ?'
+            self._db.execute(
+                f'DELETE FROM cases WHERE run_id IN ({expired})',
+                (problem_id, self.max_runs)
+            )
+            self._db.execute(
+                f'DELETE FROM runs WHERE id IN ({expired})',
+                (problem_id, self.max_runs)
+            )
+        return run_id
+
+    def _load(self, row: None | tuple) -> None | HistoricRun:
+        if row is None:
+            return None
+        run = HistoricRun(*row)
+        for case in self._db.execute(
+            'SELECT sample, verdict, wall_time, cpu_time, peak_memory, output_size '
+            'FROM cases WHERE run_id = ? ORDER BY sample', (run.id, )
+        ):
+            # histories created before samples had names store them as integers
+            record = CaseRecord(str(case[0]), *case[1:])
+            run.cases[record.sample] = record
+        return run
+
+    def previous(
+        self,
+        problem_id: str,
+        before: None | int = None,
+        source_hash: None | str = None
+    ) -> None | HistoricRun:
+        """ Last run of `problem_id` before the run `before` (the very last one by default), optionally
+        only among the runs of the source whose hash is `source_hash`
+        """
+        query = 'SELECT id, problem_id, source_hash, lang, started_at FROM runs WHERE problem_id = ?'
+        params: list = [problem_id]
+        if before is not None:
+            query += ' AND id < ?'
+            params.append(before)
+        if source_hash is not None:
+            query += ' AND source_hash = ?'
+            params.append(source_hash)
+        return self._load(
+            self._db.execute(f'{query} ORDER BY id DESC LIMIT 1',
+                             params).fetchone()
+        )
@@ -1,42 +1,51 @@
 from __future__ import annotations
 
-from typing import List, Type
-from .actions.gen import Gen
-from .actions.test import Test
-from .actions.submit import Submit
-from .actions.config import Config
-from .actions.open import Open
-from .actions.version import Version
-from .actions.update import Update
-from .actions.surprise import Surprise
-from .base import Action
+import importlib
+from typing import TYPE_CHECKING, List, Type
 from .logger import log, log_red
 
+if TYPE_CHECKING:
+    from .base import Action
+
+# module and class of each action. Only the module of the action that is run gets imported, so
+# `kt test` does not pay for the http and html libraries that only `kt gen` or `kt submit` use
 map_key_to_class = {
-    'gen': Gen,
-    'test': Test,
-    'submit': Submit,
-    'config': Config,
-    'open': Open,
-    'version': Version,
-    'update': Update,
-    'surprise': Surprise,
+    'gen': ('.actions.gen', 'Gen'),
+    'test': ('.actions.test', 'Test'),
+    'submit': ('.actions.submit', 'Submit'),
+    'config': ('.actions.config', 'Config'),
+    'open': ('.actions.open', 'Open'),
+    'version': ('.actions.version', 'Version'),
+    'update': ('.actions.update', 'Update'),
+    'surprise': ('.actions.surprise', 'Surprise'),
+    'stress': ('.actions.stress', 'Stress'),
+    'bench': ('.actions.bench', 'Bench'),
+    'daemon': ('.actions.daemon', 'Daemon'),
 }
 
 action_with_aliases = {
     **map_key_to_class,
-    'g': Gen,
-    't': Test,
-    's': Submit,
-    'c': Config,
-    'o': Open,
-    'v': Version,
-    'u': Update,
-    'r': Surprise,
-    'random': Surprise,
+    'g': map_key_to_class['gen'],
+    't': map_key_to_class['test'],
+    's': map_key_to_class['submit'],
+    'c': map_key_to_class['config'],
+    'o': map_key_to_class['open'],
+    'v': map_key_to_class['version'],
+    'u': map_key_to_class['update'],
+    'r': map_key_to_class['surprise'],
+    'random': map_key_to_class['surprise'],
+    'st': map_key_to_class['stress'],
+    'b': map_key_to_class['bench'],
+    'd': map_key_to_class['daemon'],
 }
 
 
+def load_action(key: str) -> Type[Action]:
+    """ Import the module of the action named `key` (or one of its aliases) and return its class """
+    module, name = action_with_aliases[key]
+    return getattr(importlib.import_module(module, __package__), name)
+
+
 def _is_help(args: List[str]) -> bool:
     return any(x in args for x in {'-h', '--help', 'help'})
 
@@ -53,7 +62,7 @@ def arg_parse(args: List[str]) -> None | Action:
         raise ValueError(
             f'First argument should be one of {list(map_key_to_class.keys())}'
         )
-    klass = action_with_aliases[args[0]]
+    klass = load_action(args[0])
     if _is_help(args[1:]):
         return _print_help(klass)
 
@@ -62,3 +71,15 @@ def arg_parse(args: List[str]) -> None | Action:
     except:
         log_red('Invalid usage')
         return _print_help(klass)
+
+
+def main(args: List[str]) -> None:
+    ''' Run the command of `args`, as the kt script does '''
+    try:
+        action = arg_parse(args)
+        if action is not None:
+            action.act()
+    except Exception as e:
+        import traceback
+        log_red(str(e))
+        log(traceback.format_exc())
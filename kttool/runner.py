@@ -0,0 +1,309 @@
+from __future__ import annotations
+
+import math
+import os
+import resource
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Callable, List, Tuple
+
+from .samples import is_compressed, open_case
+from .sandbox import Confined, ProcessSandbox, Sandbox
+
+__all__ = [
+    'AC', 'WA', 'TLE', 'MLE', 'RTE', 'OLE', 'Limits', 'RunResult',
+    'output_file', 'run_program'
+]
+
+AC = 'Accepted'
+WA = 'Wrong Answer'
+TLE = 'Time Limit Exceeded'
+MLE = 'Memory Limit Exceeded'
+RTE = 'Run Time Error'
+OLE = 'Output Limit Exceeded'
+
+# Wall clock limit used when the problem has no known time limit, so that a single run can never stall
+DEFAULT_WALL_TIME_LIMIT = 10.
+# Output limit used when neither the command line nor the problem gives one, in MB
+DEFAULT_OUTPUT_LIMIT = 8.
+
+_MB = 1 << 20
+_ADDRESS_SPACE_FACTOR = 2
+_FIRST_SAMPLE_INTERVAL = 0.001
+_LAST_SAMPLE_INTERVAL = 0.05
+_FEED_CHUNK = 1 << 16
+# time left to the thread feeding a compressed input to give up once the child exited
+_FEED_JOIN_TIMEOUT = 1.
+
+
+@dataclass(frozen=True)
+class Limits:
+    ''' Resource limits of a single run. `None` means unlimited '''
+    time_limit: None | float = None  # CPU time in seconds
+    memory_limit: None | float = None  # in MB
+    output_limit: None | float = None  # in MB
+
+    @property
+    def wall_time_limit(self) -> float:
+        """ Wall clock watchdog of a run. It is looser than the cpu time limit so that a process
+        waiting on the scheduler is not reported as TLE, but still stops a process blocked on io
+        """
+        if self.time_limit is None:
+            return DEFAULT_WALL_TIME_LIMIT
+        return max(2 * self.time_limit, self.time_limit + 1)
+
+
+@dataclass
+class RunResult:
+    returncode: int = 0
+    wall_time: float = 0.
+    cpu_time: float = 0.
+    peak_memory: float = 0.  # in MB
+    # empty when the output went to a file, see `run_program`
+    output: bytes = b''
+    output_size: int = 0
+    timed_out: bool = False
+    # killed by the sandbox for going over its memory cap
+    oom_killed: bool = False
+
+    def verdict(self, limits: Limits) -> None | str:
+        """ Judge the run on its exit status and resource usage only
+
+        Returns
+        -------
+        None | str
+            The rejected verdict, None if the output still has to be checked
+        """
+        if self.timed_out or self.returncode == -signal.SIGXCPU or (
+            limits.time_limit is not None and
+            self.cpu_time > limits.time_limit
+        ):
+            return TLE
+        if self.oom_killed or (
+            limits.memory_limit is not None and
+            self.peak_memory > limits.memory_limit
+        ):
+            return MLE
+        # a process stopped by the file size limit is killed by SIGXFSZ, or fails to write when it
+        # ignores that signal
+        if self.returncode == -signal.SIGXFSZ or (
+            limits.output_limit is not None and
+            self.output_size > limits.output_limit * _MB
+        ):
+            return OLE
+        if self.returncode != 0:
+            return RTE
+        return None
+
+    def describe_exit(self) -> str:
+        if self.returncode < 0:
+            try:
+                return f'killed by {signal.Signals(-self.returncode).name}'
+            except ValueError:
+                return f'killed by signal {-self.returncode}'
+        return f'exit code {self.returncode}'
+
+
+def _limit_child(
+    limits: Limits,
+    limit_file_size: bool = False,
+    cpu: None | int = None,
+    limit_address_space: bool = True
+) -> Callable[[], None]:
+    """ Build the `preexec_fn` run in the child right before exec
+
+    The child gets the cpu time / address space limits, its own session (so that the whole process
+    group can be killed) is set up by `start_new_session` instead. When the soft cpu limit is reached the child receives SIGXCPU,
+    one second later it is killed. The address space is capped at a multiple of the memory limit:
+    it is always larger than the resident set, so the MLE verdict itself is judged on the peak RSS.
+    With `limit_file_size`, the files the child writes (its output among them) can not grow past
+    the output limit by more than a byte, which is enough to tell that it is exceeded. With `cpu`, the
+    child only runs on that cpu. The address space is left alone without `limit_address_space`, for
+    a sandbox that caps the memory itself
+    """
+    def preexec() -> None:
+        # only system calls through modules imported already, see `launch_subprocess`
+        if cpu is not None:
+            os.sched_setaffinity(0, {cpu})
+        if limits.time_limit is not None:
+            cpu_limit = math.ceil(limits.time_limit) + 1
+            resource.setrlimit(
+                resource.RLIMIT_CPU, (cpu_limit, cpu_limit + 1)
+            )
+        if limit_address_space and limits.memory_limit is not None:
+            memory_limit = int(
+                limits.memory_limit * _ADDRESS_SPACE_FACTOR * _MB
+            )
+            resource.setrlimit(
+                resource.RLIMIT_AS, (memory_limit, memory_limit)
+            )
+        if limit_file_size and limits.output_limit is not None:
+            file_size_limit = int(limits.output_limit * _MB) + 1
+            resource.setrlimit(
+                resource.RLIMIT_FSIZE, (file_size_limit, file_size_limit)
+            )
+
+    return preexec
+
+
+def _communicate(confined: Confined, deadline: float) -> Tuple[bytes, bool]:
+    """ Collect the output of a program while sampling its memory usage, with an increasing
+    interval. The program is killed if it is still running at `deadline`
+
+    Returns
+    -------
+    Tuple[bytes, bool]
+        output of the process (empty if it is not piped) and whether it has been killed by the
+        watchdog
+    """
+    p = confined.process
+    interval = _FIRST_SAMPLE_INTERVAL
+    p.sample_memory()
+    while True:
+        timeout = min(interval, max(0., deadline - time.perf_counter()))
+        try:
+            return p.communicate(timeout=timeout)[0] or b'', False
+        except subprocess.TimeoutExpired:
+            pass
+        if p.poll() is not None:
+            # the output is still open, by processes the program started
+            confined.kill_leftovers()
+        p.sample_memory()
+        if time.perf_counter() >= deadline:
+            confined.kill()
+            return p.communicate()[0] or b'', True
+        interval = min(2 * interval, _LAST_SAMPLE_INTERVAL)
+
+
+def _feed(source: BinaryIO, pipe: BinaryIO, errors: List[Exception]) -> None:
+    """ Copy `source` into `pipe` then close both of them. A child that exits without reading all
+    of its input is not an error, failing to read `source` is and is added to `errors`
+    """
+    try:
+        with source, pipe:
+            for chunk in iter(lambda: source.read(_FEED_CHUNK), b''):
+                pipe.write(chunk)
+    except BrokenPipeError:
+        pass
+    except Exception as e:
+        errors.append(e)
+
+
+def output_file() -> BinaryIO:
+    """ Anonymous file to send the output of a run to: a memfd where the system has them (Linux),
+    a temporary file otherwise
+    """
+    if hasattr(os, 'memfd_create'):
+        return open(os.memfd_create('kt_output', os.MFD_CLOEXEC), 'w+b')
+    return tempfile.TemporaryFile()
+
+
+def run_program(
+    args: List[str],
+    stdin: bytes | Path,
+    limits: Limits,
+    cwd: None | Path = None,
+    stdout: None | BinaryIO = None,
+    cpu: None | int = None,
+    sandbox: None | Sandbox = None
+) -> RunResult:
+    """ Run `args` feeding it with `stdin` under `limits` and measure it
+
+    Parameters
+    ----------
+    args : List[str]
+        command to run
+    stdin : bytes | Path
+        data fed to the standard input of the command, or a file the command reads directly. A .gz
+        or .zst file is decompressed on the fly and streamed to the command through a pipe
+    limits : Limits
+        resource limits applied to the child, a wall clock watchdog is always applied
+    cwd : None | Path, optional
+        working directory of the command, by default the current one
+    stdout : None | BinaryIO, optional
+        file the command writes its output to, eg an `output_file()`. By default the output is
+        piped back and kept in `RunResult.output`
+    cpu : None | int, optional
+        pin the command to this cpu (Linux only), by default it runs on any cpu
+    sandbox : None | Sandbox, optional
+        sandbox the command runs in, by default a plain subprocess limited by rlimits
+
+    Returns
+    -------
+    RunResult
+        exit status, resource usage and output of the run
+    """
+    result = RunResult()
+    # The input is read from a file rather than a pipe: once `communicate` timed out, retrying it
+    # never writes the rest of its input, which would leave the child waiting on its stdin
+    # A compressed input is the exception: a thread of its own decompresses it into a pipe, which
+    # keeps writing whatever the watchdog does. Its writes fail once the read end is closed in the
+    # parent and the child is gone, so it never outlives the run
+    feeder = None
+    feed_errors: List[Exception] = []
+    if isinstance(stdin, Path) and is_compressed(stdin):
+        source = open_case(stdin)
+        read_end, write_end = os.pipe()
+        input_file = open(read_end, 'rb', buffering=0)
+        feeder = threading.Thread(
+            target=_feed,
+            args=(source, open(write_end, 'wb', buffering=0), feed_errors),
+            daemon=True
+        )
+        feeder.start()
+    elif isinstance(stdin, Path):
+        input_file = open(stdin, 'rb')
+    else:
+        input_file = tempfile.TemporaryFile()
+        input_file.write(stdin)
+        input_file.seek(0)
+    sandbox = sandbox or ProcessSandbox()
+    with input_file:
+        start_time = time.perf_counter()
+        confined = sandbox.start(
+            args,
+            preexec_fn=_limit_child(
+                limits,
+                limit_file_size=stdout is not None,
+                cpu=cpu,
+                limit_address_space=not sandbox.enforces_memory
+            ),
+            memory_cap=limits.memory_limit and
+            limits.memory_limit * _ADDRESS_SPACE_FACTOR,
+            cpu=cpu,
+            start_new_session=True,
+            stdin=input_file,
+            stdout=subprocess.PIPE if stdout is None else stdout,
+            shell=False,
+            cwd=cwd
+        )
+    try:
+        result.output, result.timed_out = _communicate(
+            confined, start_time + limits.wall_time_limit
+        )
+    finally:
+        usage = confined.release()
+    if feeder is not None:
+        feeder.join(_FEED_JOIN_TIMEOUT)
+        if feed_errors:
+            raise RuntimeError(
+                f'Could not read {stdin.name}: {feed_errors[0]}'
+            )
+    result.output_size = len(result.output) if stdout is None else os.fstat(
+        stdout.fileno()
+    ).st_size
+
+    # wall time is taken up to the moment the child is reaped, the peak memory and cpu time
+    # come from the sandbox: the rusage of the child itself, or the counters of its cgroup
+    p = confined.process
+    result.wall_time = (p.exited_at or time.perf_counter()) - start_time
+    result.returncode = p.returncode
+    result.cpu_time = usage.cpu_time
+    result.peak_memory = usage.peak_memory
+    result.oom_killed = usage.oom_killed
+    return result
@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import os
+import re
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, List, Tuple
+
+from .cache import cache_root
+
+__all__ = [
+    'CASE_FILE', 'Sample', 'SampleIndex', 'find_samples', 'is_compressed',
+    'open_case'
+]
+
+# in{idx}.txt and ans{idx}.txt, optionally compressed
+CASE_FILE = re.compile(r'(in|ans)(\d+)\.txt(\.gz|\.zst)?')
+_COMPRESSED_SUFFIXES = ('.gz', '.zst')
+# folders modified this recently may still change within the resolution of their mtime, their
+# listing is not trusted from the manifest
+_RACY_NS = 1_000_000_000
+
+
+@dataclass
+class Sample:
+    index: int
+    input_file: Path
+    output_file: Path
+    # folder of the sample relative to the problem folder, empty for the problem folder itself
+    group: str = ''
+
+    @property
+    def name(self) -> str:
+        return f'{self.group}/{self.index}' if self.group else str(self.index)
+
+
+def is_compressed(path: Path) -> bool:
+    return path.suffix in _COMPRESSED_SUFFIXES
+
+
+def open_case(path: Path) -> BinaryIO:
+    """ Open the input or the answer of a sample for reading, decompressing it on the fly if it is
+    a .gz or a .zst file. Reading .zst files needs the zstandard package
+    """
+    if path.suffix == '.gz':
+        return gzip.open(path, 'rb')
+    if path.suffix == '.zst':
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError(
+                f'{path.name} is compressed with zstd, `pip install zstandard` to read it'
+            ) from None
+        return zstandard.ZstdDecompressor().stream_reader(
+            open(path, 'rb'), closefd=True
+        )
+    return open(path, 'rb')
+
+
+def _file_digest(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class SampleIndex:
+    ''' Samples of a problem folder and of its subfolders, with the size and the hash of their files.
+
+    The folder tree is listed in a single pass and the inputs are paired with their answers through
+    a dictionary. The result is saved to a manifest in the cache of kt along with the mtime of every
+    folder, so that as long as no folder changed the samples are read from the manifest without
+    listing anything. The hash of a file is computed on demand and kept in the manifest while the
+    size and the mtime of the file do not change
+    '''
+    _VERSION = 1
+
+    def __init__(self, folder: Path, manifest: None | Path = None):
+        self.folder = folder.absolute()
+        self.manifest = manifest or cache_root() / 'samples' / (
+            hashlib.sha256(str(self.folder).encode()).hexdigest() + '.json'
+        )
+        self._folders: Dict[str, int] = {}
+        self._samples: None | List[Sample] = None
+        self._files: Dict[str, Tuple[int, int, str]] = {}
+        self._dirty = False
+
+    @staticmethod
+    def _pick(current: None | Path, candidate: Path) -> Path:
+        """ A sample stored both plain and compressed is read from the plain file """
+        if current is None or is_compressed(current):
+            return candidate
+        return current
+
+    def _relative(self, path: Path) -> str:
+        return str(path.relative_to(self.folder))
+
+    def _scan(self) -> None:
+        started_at = time.time_ns()
+        self._folders = {}
+        inputs: Dict[Tuple[str, int], Path] = {}
+        answers: Dict[Tuple[str, int], Path] = {}
+        pending = [('', self.folder)]
+        while pending:
+            group, folder = pending.pop()
+            mtime = folder.stat().st_mtime_ns
+            self._folders[group] = -1 if mtime >= started_at - _RACY_NS else mtime
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if entry.name.startswith('.'):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(
+                            (
+                                f'{group}/{entry.name}' if group else entry.name,
+                                Path(entry.path)
+                            )
+                        )
+                        continue
+                    match = CASE_FILE.fullmatch(entry.name)
+                    if match is None or not entry.is_file():
+                        continue
+                    files = inputs if match.group(1) == 'in' else answers
+                    key = (group, int(match.group(2)))
+                    files[key] = self._pick(files.get(key), Path(entry.path))
+        self._samples = sorted(
+            (
+                Sample(index, input_file, answers[group, index], group)
+                for (group, index), input_file in inputs.items()
+                if (group, index) in answers
+            ),
+            key=lambda x: (x.group != '', x.group, x.index)
+        )
+        present = {
+            self._relative(path)
+            for x in self._samples for path in (x.input_file, x.output_file)
+        }
+        self._files = {k: v for k, v in self._files.items() if k in present}
+        self._dirty = True
+
+    def _load(self) -> bool:
+        """ Read the samples from the manifest, False if it is missing or out of date """
+        try:
+            with open(self.manifest) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if manifest.get('version') != self._VERSION or manifest.get(
+            'folder'
+        ) != str(self.folder):
+            return False
+        # the hashes outlive a change of the folders, they are checked against each file anyway
+        self._files = {k: tuple(v) for k, v in manifest['files'].items()}
+        folders: Dict[str, int] = manifest['folders']
+        for group, mtime in folders.items():
+            try:
+                if (self.folder / group).stat().st_mtime_ns != mtime:
+                    return False
+            except OSError:
+                return False
+        self._folders = folders
+        self._samples = [
+            Sample(
+                x['index'], self.folder / x['input'], self.folder / x['answer'],
+                x['group']
+            ) for x in manifest['samples']
+        ]
+        return True
+
+    def save(self) -> None:
+        """ Write the manifest if anything changed since it was read """
+        if not self._dirty or self._samples is None:
+            return
+        manifest: Dict[str, Any] = {
+            'version': self._VERSION,
+            'folder': str(self.folder),
+            'folders': self._folders,
+            'samples': [
+                {
+                    'index': x.index,
+                    'group': x.group,
+                    'input': self._relative(x.input_file),
+                    'answer': self._relative(x.output_file),
+                } for x in self._samples
+            ],
+            'files': self._files,
+        }
+        try:
+            self.manifest.parent.mkdir(parents=True, exist_ok=True)
+            staging = self.manifest.with_suffix(f'.{os.getpid()}.tmp')
+            with open(staging, 'w') as f:
+                json.dump(manifest, f)
+            os.replace(staging, self.manifest)
+        except OSError:
+            return
+        self._dirty = False
+
+    def samples(self) -> List[Sample]:
+        """ Samples in ascending index order, the ones of the problem folder first, then the ones of
+        each subfolder
+        """
+        if self._samples is None and not self._load():
+            self._scan()
+            self.save()
+        return list(self._samples)
+
+    def digest(self, path: Path) -> str:
+        """ sha256 of the file `path` of the folder, as stored (so compressed for a compressed file) """
+        key = self._relative(path)
+        st = path.stat()
+        cached = self._files.get(key)
+        if cached is not None and cached[:2] == (st.st_size, st.st_mtime_ns):
+            return cached[2]
+        digest = _file_digest(path)
+        self._files[key] = (st.st_size, st.st_mtime_ns, digest)
+        self._dirty = True
+        return digest
+
+
+def find_samples(folder: Path) -> List[Sample]:
+    """ Samples of a problem folder, see `SampleIndex` """
+    return SampleIndex(folder).samples()
@@ -0,0 +1,378 @@
+from __future__ import annotations
+
+import abc
+import contextlib
+import itertools
+import os
+import queue
+import signal
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Type
+
+from .utils import MeasuredPopen, launch_subprocess
+
+__all__ = [
+    'Usage', 'Confined', 'Sandbox', 'ProcessSandbox', 'CgroupSandbox',
+    'SANDBOXES', 'make_sandbox', 'CpuPool'
+]
+
+_MB = 1 << 20
+# attempts at removing the cgroup of a finished program, 1 ms apart
+_REMOVE_ATTEMPTS = 100
+
+
+@dataclass
+class Usage:
+    ''' Resources used by a finished program '''
+    cpu_time: float = 0.  # in seconds
+    peak_memory: float = 0.  # in MB
+    # killed by the sandbox for going over its memory limit
+    oom_killed: bool = False
+
+
+class Confined:
+    ''' A program started by a `Sandbox`. Its process group is killed on demand, and its usage is
+    the one of the child as reported when it was reaped
+    '''
+    def __init__(self, process: MeasuredPopen):
+        self.process = process
+
+    def kill(self) -> None:
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            self.process.kill()
+
+    def kill_leftovers(self) -> None:
+        """ Kill the processes the program left behind once it exited, when the sandbox can find
+        them. They may hold its output open
+        """
+
+    def release(self) -> Usage:
+        """ Usage of the program, once it has been reaped """
+        return Usage(self.process.cpu_time, self.process.peak_memory)
+
+
+class Sandbox(abc.ABC):
+    ''' How the programs under test are started, confined and measured '''
+    name = ''
+    # whether the sandbox caps the memory of the program itself, its address space is not capped then
+    enforces_memory = False
+
+    def unavailable_reason(self) -> None | str:
+        """ Why programs can not be run in this sandbox here, None if they can """
+        return None
+
+    @abc.abstractmethod
+    def describe(self) -> str:
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def start(
+        self, args: List[str], preexec_fn: Callable[[], None],
+        memory_cap: None | float, cpu: None | int, **kwargs
+    ) -> Confined:
+        """ Start `args` in the sandbox
+
+        Parameters
+        ----------
+        args : List[str]
+            command to run
+        preexec_fn : Callable[[], None]
+            run in the child right before exec, see `runner._limit_child`
+        memory_cap : None | float
+            memory the program can not go over in MB, None if it is unlimited. This is a backstop
+            above the memory limit, the MLE verdict is judged on the peak memory
+        cpu : None | int
+            cpu the program is pinned to, None if it may run on any cpu
+        kwargs
+            passed on to `subprocess.Popen` (stdin, stdout, cwd...)
+
+        Returns
+        -------
+        Confined
+            the running program
+        """
+        raise NotImplementedError()
+
+
+class ProcessSandbox(Sandbox):
+    ''' Programs run as plain subprocesses, limited by the rlimits of their `preexec_fn` only '''
+    name = 'process'
+
+    def describe(self) -> str:
+        return 'process (rlimits)'
+
+    def start(
+        self, args: List[str], preexec_fn: Callable[[], None],
+        memory_cap: None | float, cpu: None | int, **kwargs
+    ) -> Confined:
+        return Confined(
+            launch_subprocess(args, preexec_fn=preexec_fn, **kwargs)
+        )
+
+
+class _CgroupConfined(Confined):
+    ''' A program running in a cgroup of its own, which is removed once it is released '''
+    def __init__(self, process: MeasuredPopen, cgroup: Path):
+        super().__init__(process)
+        self.cgroup = cgroup
+
+    def _read(self, name: str) -> str:
+        with open(self.cgroup / name) as f:
+            return f.read()
+
+    def _read_keys(self, name: str) -> Dict[str, int]:
+        try:
+            return {
+                k: int(v)
+                for k, v in (x.split() for x in self._read(name).splitlines())
+            }
+        except (OSError, ValueError):
+            return {}
+
+    def kill(self) -> None:
+        super().kill()
+        self._kill_all()
+
+    def kill_leftovers(self) -> None:
+        self._kill_all()
+
+    def _kill_all(self) -> None:
+        """ Kill every process left in the cgroup, including the ones that left the process group """
+        try:
+            with open(self.cgroup / 'cgroup.kill', 'w') as f:
+                f.write('1')
+            return
+        except OSError:
+            pass
+        # cgroup.kill needs Linux 5.14
+        with contextlib.suppress(OSError, ValueError):
+            for pid in self._read('cgroup.procs').split():
+                with contextlib.suppress(ProcessLookupError):
+                    os.kill(int(pid), signal.SIGKILL)
+
+    def release(self) -> Usage:
+        usage = super().release()
+        # the whole tree of the program is accounted for, not only the child that was reaped
+        cpu_stat = self._read_keys('cpu.stat')
+        if 'usage_usec' in cpu_stat:
+            usage.cpu_time = cpu_stat['usage_usec'] / 1e6
+        try:
+            peak = int(self._read('memory.peak')) / _MB
+        except (OSError, ValueError):
+            peak = None  # memory.peak needs Linux 5.19, the peak RSS of the child is kept then
+        if peak is not None:
+            # the pages of the output file written by the program are charged to its cgroup and
+            # still are when it exits, they are not memory of the program
+            usage.peak_memory = max(
+                0., peak - self._read_keys('memory.stat').get('shmem', 0) / _MB
+            )
+        usage.oom_killed = self._read_keys('memory.events').get('oom_kill', 0) > 0
+        self._remove()
+        return usage
+
+    def _remove(self) -> None:
+        self._kill_all()
+        # the killed processes leave the cgroup asynchronously
+        for _ in range(_REMOVE_ATTEMPTS):
+            try:
+                self.cgroup.rmdir()
+                return
+            except FileNotFoundError:
+                return
+            except OSError:
+                time.sleep(0.001)
+
+
+class CgroupSandbox(Sandbox):
+    ''' Every program runs in a cgroup (v2) of its own, created under `root`. The memory of the
+    program is capped by memory.max and its number of processes and threads by pids.max, and the
+    cpu time and the peak memory of all of its processes are read from the cgroup. When it is
+    pinned, the program is also confined to its cpu by cpuset.cpus.
+
+    `root` defaults to $KT_CGROUP, or else to the cgroup of kt itself. The memory and pids
+    controllers have to be enabled in its cgroup.subtree_control. With `enable_controllers`, kt
+    enables them (and cpuset with `pin`) when they are not: that is possible for the root cgroup, or
+    for a cgroup delegated to the user that holds no process, eg `systemd-run --user --scope -p
+    Delegate=yes` then `KT_CGROUP` set to a child of that scope. Otherwise the configuration of the
+    cgroup is only read, never changed
+    '''
+    name = 'cgroup'
+    enforces_memory = True
+
+    _REQUIRED_CONTROLLERS = ('memory', 'pids')
+    # threads count as processes, a JVM alone starts a few dozens
+    _MAX_PROCESSES = 256
+
+    def __init__(
+        self,
+        root: None | Path = None,
+        enable_controllers: bool = False,
+        pin: bool = False
+    ):
+        self.root = root or self._default_root()
+        self.enable_controllers = enable_controllers
+        # cpuset is only of use to confine programs pinned to a cpu
+        self._wanted = self._REQUIRED_CONTROLLERS + (('cpuset', ) if pin else ())
+        self._names = itertools.count()
+        self._controllers: None | List[str] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _default_root() -> None | Path:
+        if os.environ.get('KT_CGROUP'):
+            return Path(os.environ['KT_CGROUP'])
+        try:
+            with open('/proc/self/mountinfo') as f:
+                mount = next(
+                    x.split()[4] for x in f
+                    if x.split(' - ')[-1].startswith('cgroup2 ')
+                )
+            with open('/proc/self/cgroup') as f:
+                own = next(x[3:].strip() for x in f if x.startswith('0::'))
+        except (OSError, StopIteration):
+            return None
+        return Path(mount) / own.lstrip('/')
+
+    def _load_controllers(self) -> List[str]:
+        """ Controllers enabled for the children of the root, after enabling the missing ones that
+        kt uses with `enable_controllers`
+        """
+        subtree_control = self.root / 'cgroup.subtree_control'
+        with open(subtree_control) as f:
+            enabled = f.read().split()
+        if not self.enable_controllers:
+            return enabled
+        with open(self.root / 'cgroup.controllers') as f:
+            available = f.read().split()
+        missing = [
+            x for x in self._wanted if x in available and x not in enabled
+        ]
+        for controller in missing:
+            # refused for a cgroup that holds processes, unless it is the root cgroup
+            with contextlib.suppress(OSError), open(subtree_control, 'w') as f:
+                f.write(f'+{controller}')
+        if not missing:
+            return enabled
+        with open(subtree_control) as f:
+            return f.read().split()
+
+    def unavailable_reason(self) -> None | str:
+        if not hasattr(os, 'sched_setaffinity'):
+            return 'cgroups are only supported on Linux'
+        if self.root is None:
+            return 'no cgroup v2 hierarchy is mounted'
+        with self._lock:
+            if self._controllers is None:
+                try:
+                    self._controllers = self._load_controllers()
+                except OSError as e:
+                    return f'{self.root} can not be used: {e.strerror}'
+        missing = [
+            x for x in self._REQUIRED_CONTROLLERS if x not in self._controllers
+        ]
+        if missing and not self.enable_controllers:
+            return f'the {", ".join(missing)} controller(s) are not enabled in {self.root}'
+        if missing:
+            return f'the {", ".join(missing)} controller(s) can not be enabled in {self.root}, ' \
+                'point KT_CGROUP to a delegated cgroup'
+        return None
+
+    def describe(self) -> str:
+        return f'cgroup ({self.root})'
+
+    def _create(self, memory_cap: None | float, cpu: None | int) -> Path:
+        cgroup = self.root / f'kt-{os.getpid()}-{next(self._names)}'
+        cgroup.mkdir()
+        settings = {'pids.max': str(self._MAX_PROCESSES)}
+        if memory_cap is not None:
+            settings['memory.max'] = str(int(memory_cap * _MB))
+            # swapped out pages would not count towards the peak
+            settings['memory.swap.max'] = '0'
+        if cpu is not None:
+            settings['cpuset.cpus'] = str(cpu)
+        for name, value in settings.items():
+            # the files of a controller only exist when it is enabled, and memory.swap.max only
+            # with swap accounting
+            if not (cgroup / name).exists():
+                continue
+            try:
+                with open(cgroup / name, 'w') as f:
+                    f.write(value)
+            except OSError:
+                cgroup.rmdir()
+                raise
+        return cgroup
+
+    def start(
+        self, args: List[str], preexec_fn: Callable[[], None],
+        memory_cap: None | float, cpu: None | int, **kwargs
+    ) -> Confined:
+        cgroup = self._create(memory_cap, cpu)
+        procs = str(cgroup / 'cgroup.procs')
+
+        def preexec() -> None:
+            # joined before anything else, so that everything the child does is accounted for
+            fd = os.open(procs, os.O_WRONLY)
+            try:
+                os.write(fd, b'0')
+            finally:
+                os.close(fd)
+            preexec_fn()
+
+        try:
+            process = launch_subprocess(args, preexec_fn=preexec, **kwargs)
+        except BaseException:
+            cgroup.rmdir()
+            raise
+        return _CgroupConfined(process, cgroup)
+
+
+SANDBOXES: Dict[str, Type[Sandbox]] = {
+    'process': ProcessSandbox,
+    'cgroup': CgroupSandbox,
+}
+
+
+def make_sandbox(name: str, pin: bool = False) -> Sandbox:
+    """ The sandbox called `name`, 'auto' picks cgroup when it can be used here as it is and
+    process otherwise. Only an explicit 'cgroup' enables the controllers kt needs (and cpuset if the
+    programs are pinned, `pin`) in the cgroup it runs under. Raises a RuntimeError if the sandbox
+    can not be used
+    """
+    if name == 'auto':
+        sandbox = CgroupSandbox(pin=pin)
+        return sandbox if sandbox.unavailable_reason() is None else ProcessSandbox()
+    if name not in SANDBOXES:
+        raise ValueError(
+            f'Unknown sandbox {name}, it should be one of auto, {", ".join(SANDBOXES)}'
+        )
+    if name == 'cgroup':
+        sandbox = CgroupSandbox(enable_controllers=True, pin=pin)
+    else:
+        sandbox = SANDBOXES[name]()
+    reason = sandbox.unavailable_reason()
+    if reason is not None:
+        raise RuntimeError(f'The {name} sandbox can not be used: {reason}')
+    return sandbox
+
+
+class CpuPool:
+    ''' Cpus handed out to concurrent runs, so that each of them has a cpu of its own '''
+    def __init__(self, cpus: Iterable[int]):
+        self._free: queue.SimpleQueue[int] = queue.SimpleQueue()
+        for cpu in sorted(cpus):
+            self._free.put(cpu)
+
+    @contextlib.contextmanager
+    def take(self) -> Iterator[int]:
+        """ A free cpu for the duration of the block, waiting for one if they are all taken """
+        cpu = self._free.get()
+        try:
+            yield cpu
+        finally:
+            self._free.put(cpu)
@@ -0,0 +1,247 @@
+from __future__ import annotations
+
+import abc
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Tuple, Type
+
+__all__ = [
+    'SubmissionRow', 'available_parsers', 'parse_page_text',
+    'parse_problem_list', 'parse_samples', 'parse_submission', 'parser_name'
+]
+
+# name of the backend to use instead of the fastest one available
+PARSER_ENV = 'KT_HTML_PARSER'
+
+
+@dataclass
+class SubmissionRow:
+    ''' What kt reads from a submission page '''
+    # classes of each test case of the submission, in order
+    test_cases: List[List[str]]
+    status: str
+    run_time: str
+
+
+class _Parser(abc.ABC):
+    ''' Extract the few nodes kt needs from Kattis pages. Each backend only looks at those nodes '''
+    @abc.abstractmethod
+    def samples(self, html: bytes) -> List[str]:
+        """ Text of the `table.sample pre` blocks of a problem page: inputs and answers, alternating """
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def page_text(self, html: bytes) -> str:
+        """ Whitespace separated text of a whole page """
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def submission(self, html: bytes) -> None | SubmissionRow:
+        """ `div.status`, `.runtime` and the test cases of `div.testcase-row` of a submission page,
+        None if the page has no status
+        """
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def problem_list(self, html: bytes) -> List[Tuple[str, str]]:
+        """ Link and difficulty text of every row of `table.table2 tbody` of a problem listing page """
+        raise NotImplementedError()
+
+
+class _SelectolaxParser(_Parser):
+    ''' Lexbor (C) based parser of selectolax, the fastest of the three '''
+    def __init__(self):
+        from selectolax.lexbor import LexborHTMLParser
+        self._parse = LexborHTMLParser
+
+    def samples(self, html: bytes) -> List[str]:
+        return [
+            node.text(deep=True)
+            for node in self._parse(html).css('table.sample pre')
+        ]
+
+    def page_text(self, html: bytes) -> str:
+        root = self._parse(html).root
+        return root.text(separator=' ') if root is not None else ''
+
+    def submission(self, html: bytes) -> None | SubmissionRow:
+        tree = self._parse(html)
+        status = tree.css_first('div.status')
+        if status is None:
+            return None
+        run_time = tree.css_first('.runtime')
+        row = tree.css_first('div.testcase-row')
+        test_cases = [] if row is None else [
+            (node.attributes.get('class') or '').split()
+            for node in row.iter()
+        ]
+        return SubmissionRow(
+            test_cases, status.text(deep=True).strip(),
+            run_time.text(deep=True).strip() if run_time is not None else ''
+        )
+
+    def problem_list(self, html: bytes) -> List[Tuple[str, str]]:
+        ret = []
+        for row in self._parse(html).css('table.table2 tbody tr'):
+            link = row.css_first('a[href]')
+            difficulty = row.css_first('span.difficulty_number')
+            if link is not None and difficulty is not None:
+                ret.append(
+                    (link.attributes['href'], difficulty.text(deep=True).strip())
+                )
+        return ret
+
+
+class _LxmlParser(_Parser):
+    ''' libxml2 (C) based parser of lxml, queried with XPath '''
+    _SAMPLES = "//table[contains(concat(' ', normalize-space(@class), ' '), ' sample ')]//pre"
+    _STATUS = "//div[contains(concat(' ', normalize-space(@class), ' '), ' status ')]"
+    _RUN_TIME = "//*[contains(concat(' ', normalize-space(@class), ' '), ' runtime ')]"
+    _TEST_CASES = "//div[contains(concat(' ', normalize-space(@class), ' '), ' testcase-row ')]"
+    _ROWS = "//table[contains(concat(' ', normalize-space(@class), ' '), ' table2 ')]//tbody/tr"
+    _DIFFICULTY = ".//span[contains(concat(' ', normalize-space(@class), ' '), ' difficulty_number ')]"
+
+    def __init__(self):
+        import lxml.html
+        self._parse = lxml.html.document_fromstring
+
+    def samples(self, html: bytes) -> List[str]:
+        return [node.text_content() for node in self._parse(html).xpath(self._SAMPLES)]
+
+    def page_text(self, html: bytes) -> str:
+        return ' '.join(self._parse(html).itertext())
+
+    def submission(self, html: bytes) -> None | SubmissionRow:
+        tree = self._parse(html)
+        status = tree.xpath(self._STATUS)
+        if not status:
+            return None
+        run_time = tree.xpath(self._RUN_TIME)
+        row = tree.xpath(self._TEST_CASES)
+        test_cases = [] if not row else [
+            (node.get('class') or '').split() for node in row[0]
+        ]
+        return SubmissionRow(
+            test_cases, status[0].text_content().strip(),
+            run_time[0].text_content().strip() if run_time else ''
+        )
+
+    def problem_list(self, html: bytes) -> List[Tuple[str, str]]:
+        ret = []
+        for row in self._parse(html).xpath(self._ROWS):
+            link = row.xpath('.//a[@href]')
+            difficulty = row.xpath(self._DIFFICULTY)
+            if link and difficulty:
+                ret.append(
+                    (link[0].get('href'), difficulty[0].text_content().strip())
+                )
+        return ret
+
+
+class _SoupParser(_Parser):
+    ''' Pure python fallback, only the nodes that are needed are built when possible '''
+    def __init__(self):
+        from bs4 import BeautifulSoup, SoupStrainer
+        self._soup = BeautifulSoup
+        self._strainer = SoupStrainer
+
+    def _only(self, name: str, class_name: str):
+        # while parsing, the class attribute is not split into classes yet
+        return self._strainer(
+            name,
+            class_=lambda x: x is not None and class_name in x.split()
+        )
+
+    def samples(self, html: bytes) -> List[str]:
+        soup = self._soup(
+            html, 'html.parser', parse_only=self._only('table', 'sample')
+        )
+        return [node.text for node in soup.select('table.sample pre')]
+
+    def page_text(self, html: bytes) -> str:
+        return self._soup(html, 'html.parser').get_text(' ')
+
+    def submission(self, html: bytes) -> None | SubmissionRow:
+        soup = self._soup(html, 'html.parser')
+        status = soup.select_one('div.status')
+        if status is None:
+            return None
+        run_time = soup.select_one('.runtime')
+        row = soup.select_one('div.testcase-row')
+        test_cases = [] if row is None else [
+            list(node.get('class') or []) for node in row.find_all(recursive=False)
+        ]
+        return SubmissionRow(
+            test_cases, status.text.strip(),
+            run_time.text.strip() if run_time is not None else ''
+        )
+
+    def problem_list(self, html: bytes) -> List[Tuple[str, str]]:
+        soup = self._soup(html, 'html.parser')
+        ret = []
+        for row in soup.select('table.table2 tbody tr'):
+            link = row.find('a', href=True)
+            difficulty = row.find('span', class_='difficulty_number')
+            if link is not None and difficulty is not None:
+                ret.append((link['href'], difficulty.text.strip()))
+        return ret
+
+
+_PARSERS: Dict[str, Type[_Parser]] = {
+    'selectolax': _SelectolaxParser,
+    'lxml': _LxmlParser,
+    'bs4': _SoupParser,
+}
+_parser: None | _Parser = None
+
+
+def available_parsers() -> List[str]:
+    """ Name of the backends that can be imported, fastest first """
+    ret = []
+    for name, klass in _PARSERS.items():
+        try:
+            klass()
+        except ImportError:
+            continue
+        ret.append(name)
+    return ret
+
+
+def _get_parser() -> _Parser:
+    """ The backend named by `$KT_HTML_PARSER`, otherwise the fastest one available """
+    global _parser
+    if _parser is not None:
+        return _parser
+    names = list(_PARSERS)
+    forced = os.environ.get(PARSER_ENV)
+    if forced:
+        if forced not in _PARSERS:
+            raise ValueError(f'{PARSER_ENV} should be one of {names}')
+        names = [forced]
+    for name in names:
+        try:
+            _parser = _PARSERS[name]()
+            return _parser
+        except ImportError:
+            continue
+    raise ImportError(f'None of {names} is installed')
+
+
+def parser_name() -> str:
+    return next(k for k, v in _PARSERS.items() if type(_get_parser()) is v)
+
+
+def parse_samples(html: bytes) -> List[str]:
+    return _get_parser().samples(html)
+
+
+def parse_page_text(html: bytes) -> str:
+    return _get_parser().page_text(html)
+
+
+def parse_submission(html: bytes) -> None | SubmissionRow:
+    return _get_parser().submission(html)
+
+
+def parse_problem_list(html: bytes) -> List[Tuple[str, str]]:
+    return _get_parser().problem_list(html)
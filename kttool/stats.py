@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import math
+import statistics
+from dataclasses import dataclass
+from typing import Sequence
+
+__all__ = ['Summary', 'summarize', 'welch_test']
+
+
+@dataclass(frozen=True)
+class Summary:
+    ''' Summary of repeated measures of the same quantity '''
+    count: int
+    min: float
+    median: float
+    p95: float
+    mean: float
+    stddev: float
+
+    def describe(self, unit: str = 's') -> str:
+        return f'min {self.min:.3f} {unit}   median {self.median:.3f} {unit}   ' \
+            f'p95 {self.p95:.3f} {unit}   stddev {self.stddev:.3f} {unit}'
+
+
+def summarize(values: Sequence[float]) -> Summary:
+    """ Summary of `values`, which must not be empty. The 95th percentile is interpolated between the
+    measures, and the standard deviation is the sample one (0 for a single measure)
+    """
+    if len(values) == 1:
+        value = values[0]
+        return Summary(1, value, value, value, value, 0.)
+    return Summary(
+        count=len(values),
+        min=min(values),
+        median=statistics.median(values),
+        p95=statistics.quantiles(values, n=20, method='inclusive')[-1],
+        mean=statistics.fmean(values),
+        stddev=statistics.stdev(values)
+    )
+
+
+def welch_test(a: Sequence[float], b: Sequence[float]) -> float:
+    """ Two sided p-value of Welch's t-test of the hypothesis that `a` and `b` have the same mean.
+    The t statistic is compared with a standard normal distribution rather than a Student one, which
+    slightly overstates the significance of small samples. Nan with less than two measures on a side
+    """
+    if len(a) < 2 or len(b) < 2:
+        return math.nan
+    difference = statistics.fmean(a) - statistics.fmean(b)
+    error = math.sqrt(
+        statistics.variance(a) / len(a) + statistics.variance(b) / len(b)
+    )
+    if error == 0:
+        return 1. if difference == 0 else 0.
+    return 2 * statistics.NormalDist().cdf(-abs(difference) / error)
@@ -1,6 +1,12 @@
+from __future__ import annotations
+
+import contextlib
+import os
 import signal
 import subprocess
 import sys
+import threading
+import time
 from collections import namedtuple
 from pathlib import Path
 from typing import NoReturn, Union
@@ -8,6 +14,11 @@ import shlex
 from .logger import color_cyan, log_green
 
 __test_subprocesses = []
+# guards __test_subprocesses, processes are launched from worker threads. Reentrant since
+# `exit_gracefully` kills them from a signal handler, which may interrupt the main thread holding it
+__test_subprocesses_lock = threading.RLock()
+# held while a process with a `preexec_fn` is spawned, see `launch_subprocess`
+_spawn_lock = threading.Lock()
 
 CATCH_PHRASE = 'Great is the art of beginning, but greater is the art of ending.'
 
@@ -18,19 +29,121 @@ def exit_gracefully(signum: signal.Signals, frame) -> NoReturn:
     # restore the original signal handler as otherwise evil things will happen
     # in raw_input when CTRL+C is pressed, and our signal handler is not re-entrant
     signal.signal(signal.SIGINT, original_sigint)
-    for sp in __test_subprocesses:
+    kill_test_subprocesses()
+    log_green(CATCH_PHRASE)
+    sys.exit(1)
+
+
+def _current_rss() -> float:
+    """ Resident set size of the current process in MB, 0 if it can not be read """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1 << 20)
+    except (OSError, ValueError, IndexError):
+        return 0.
+
+
+class MeasuredPopen(subprocess.Popen):
+    """ `subprocess.Popen` that reaps its child with `os.wait4` so the resource usage of that very
+    child (peak RSS, user and system CPU time) is recorded. Unlike `resource.getrusage(RUSAGE_CHILDREN)`,
+    this stays accurate when several children are running at the same time.
+    """
+    rusage = None
+    exited_at: None | float = None
+    fork_rss: float = 0.
+    sampled_peak: float = 0.
+
+    def __init__(self, *args, **kwargs):
+        self.fork_rss = _current_rss()
+        super().__init__(*args, **kwargs)
+
+    def _try_wait(self, wait_flags):
+        # `Popen.wait` reaps the child through this hook on POSIX
+        if not hasattr(os, 'wait4'):
+            return super()._try_wait(wait_flags)
+        try:
+            pid, sts, rusage = os.wait4(self.pid, wait_flags)
+        except ChildProcessError:
+            return self.pid, 0
+        if pid == self.pid:
+            self.rusage = rusage
+            self.exited_at = time.perf_counter()
+        return pid, sts
+
+    def sample_memory(self) -> None:
+        """ Sample the peak resident set size of the running child (Linux only).
+        The constructor only returns once the child has exec'ed, so the sample never sees the
+        forked copy of this process
+        """
         try:
-            sp.kill()
+            with open(f'/proc/{self.pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        self.sampled_peak = max(
+                            self.sampled_peak,
+                            int(line.split()[1]) / (1 << 10)
+                        )
+                        return
+        except (OSError, ValueError):
+            pass
+
+    @property
+    def cpu_time(self) -> float:
+        """ User + system CPU time of the child in seconds """
+        if self.rusage is None:
+            return 0.
+        return self.rusage.ru_utime + self.rusage.ru_stime
+
+    @property
+    def peak_memory(self) -> float:
+        """ Peak resident set size of the child in MB """
+        if self.rusage is None:
+            return self.sampled_peak
+        # ru_maxrss is in kilobytes on Linux but in bytes on macOS
+        denom = 1 << 20 if sys.platform == 'darwin' else 1 << 10
+        peak = self.rusage.ru_maxrss / denom
+        # On Linux the high water mark starts at the size of the forked copy of this process, so
+        # it is only meaningful once the child outgrew it. Below that, rely on the samples instead
+        if self.fork_rss and peak <= self.fork_rss:
+            return self.sampled_peak
+        return peak
+
+
+def kill_test_subprocesses() -> None:
+    """ Kill every running process launched by `launch_subprocess`, along with its process group
+    when it leads one
+    """
+    with __test_subprocesses_lock:
+        running = list(__test_subprocesses)
+    for sp in running:
+        if sp.returncode is not None:
+            continue
+        try:
+            if os.getpgid(sp.pid) == sp.pid:
+                os.killpg(sp.pid, signal.SIGKILL)
+            else:
+                sp.kill()
         except:
             pass
-    log_green(CATCH_PHRASE)
-    sys.exit(1)
 
 
-def launch_subprocess(*args, **kwargs) -> subprocess.Popen:
-    global __test_subprocesses
-    p = subprocess.Popen(*args, **kwargs)
-    __test_subprocesses.append(p)
+def launch_subprocess(*args, **kwargs) -> MeasuredPopen:
+    """ Start a process that `kill_test_subprocesses` kills on demand.
+
+    A `preexec_fn` runs in the forked child before exec, and the child only has the thread that
+    forked: a lock held by another thread at that moment is never released in the child. The
+    preexec functions of kt (see `runner._limit_child` and `CgroupSandbox.start`) only make system
+    calls through modules imported beforehand, so they take no such lock, and the processes that
+    have one are spawned one at a time so that a fork never happens in the middle of another one
+    """
+    with _spawn_lock if kwargs.get('preexec_fn') else contextlib.nullcontext():
+        p = MeasuredPopen(*args, **kwargs)
+    with __test_subprocesses_lock:
+        # forget about the processes that have been reaped already
+        __test_subprocesses[:] = [
+            sp for sp in __test_subprocesses if sp.returncode is None
+        ]
+        __test_subprocesses.append(p)
     return p
 
 
@@ -80,6 +193,8 @@ def make_list_equal(lhs: list, rhs: list, pad_element: str = '') -> None:
 
 
 KATTIS_RC_URL = 'https://open.kattis.com/download/kattisrc'
+# per problem settings (eg time and memory limits), stored in the problem folder
+KT_PROBLEM_CONFIG = '.ktproblem'
 HEADERS = {'User-Agent': 'kt'}
 
 PLanguage = namedtuple(
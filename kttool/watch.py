@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import abc
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, Set, Tuple
+
+__all__ = ['Watcher', 'make_watcher', 'wait_for_changes']
+
+# a burst of events closer than this is treated as a single change (eg editors writing a file in
+# several steps or saving several files at once)
+DEBOUNCE = 0.2
+
+
+class Watcher(abc.ABC):
+    ''' Watch the files of a folder (not recursively) '''
+    @abc.abstractmethod
+    def poll(self, timeout: None | float) -> Set[str]:
+        """ Wait up to `timeout` seconds (forever if None) for files to change
+
+        Returns
+        -------
+        Set[str]
+            name of the files created, modified or removed, empty if nothing changed in time
+        """
+        raise NotImplementedError()
+
+    def close(self) -> None:
+        ...
+
+
+class InotifyWatcher(Watcher):
+    ''' Watcher based on Linux inotify, called through libc '''
+    _IN_CLOSE_WRITE = 0x008
+    _IN_MOVED_FROM = 0x040
+    _IN_MOVED_TO = 0x080
+    _IN_CREATE = 0x100
+    _IN_DELETE = 0x200
+    _EVENT = struct.Struct('iIII')
+
+    def __init__(self, directory: Path):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        mask = self._IN_CLOSE_WRITE | self._IN_MOVED_FROM | self._IN_MOVED_TO | \
+            self._IN_CREATE | self._IN_DELETE
+        if libc.inotify_add_watch(self._fd, os.fsencode(directory), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(errno, f'inotify_add_watch failed on {directory}')
+
+    def poll(self, timeout: None | float) -> Set[str]:
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return set()
+        changed: Set[str] = set()
+        try:
+            data = os.read(self._fd, 1 << 16)
+        except BlockingIOError:
+            return changed
+        offset = 0
+        while offset < len(data):
+            _, _, _, length = self._EVENT.unpack_from(data, offset)
+            offset += self._EVENT.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if name:
+                changed.add(os.fsdecode(name))
+        return changed
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+class PollingWatcher(Watcher):
+    ''' Fallback watcher comparing the modification time and size of the files '''
+    INTERVAL = 0.25
+
+    def __init__(self, directory: Path):
+        self._directory = directory
+        self._snapshot = self._take_snapshot()
+
+    def _take_snapshot(self) -> Dict[str, Tuple[int, int]]:
+        ret = {}
+        for p in self._directory.iterdir():
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            ret[p.name] = (st.st_mtime_ns, st.st_size)
+        return ret
+
+    def poll(self, timeout: None | float) -> Set[str]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            snapshot = self._take_snapshot()
+            changed = {
+                name
+                for name in snapshot.keys() | self._snapshot.keys()
+                if snapshot.get(name) != self._snapshot.get(name)
+            }
+            self._snapshot = snapshot
+            if changed:
+                return changed
+            if deadline is not None and time.monotonic() >= deadline:
+                return changed
+            sleep_time = self.INTERVAL
+            if deadline is not None:
+                sleep_time = min(sleep_time, deadline - time.monotonic())
+            time.sleep(max(0., sleep_time))
+
+
+def make_watcher(directory: Path) -> Watcher:
+    ''' inotify watcher on Linux, polling watcher elsewhere or if inotify is not available '''
+    if sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(directory)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(directory)
+
+
+def wait_for_changes(watcher: Watcher,
+                     is_relevant: Callable[[str], bool]) -> Set[str]:
+    """ Block until some relevant files change, then keep collecting the changes until none
+    happened for `DEBOUNCE` seconds
+
+    Parameters
+    ----------
+    watcher : Watcher
+        the watcher of the folder
+    is_relevant : Callable[[str], bool]
+        whether a change of the file with this name should be reported
+
+    Returns
+    -------
+    Set[str]
+        name of the changed files
+    """
+    changed: Set[str] = set()
+    while not changed:
+        changed = {name for name in watcher.poll(None) if is_relevant(name)}
+    while True:
+        more = watcher.poll(DEBOUNCE)
+        if not more:
+            return changed
+        changed |= {name for name in more if is_relevant(name)}
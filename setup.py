@@ -32,8 +32,9 @@ setup(
         'Operating System :: POSIX',
         "License :: OSI Approved :: MIT License",
         "Programming Language :: Python :: 3",
-        "Programming Language :: Python :: 3.7",
+        "Programming Language :: Python :: 3.8",
     ],
+    python_requires='>=3.8',
     packages=find_packages(),
     include_package_data=True,
     package_data={'kttool': required_files},
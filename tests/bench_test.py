@@ -0,0 +1,68 @@
+from kttool.actions.bench import Bench
+
+SLOW = '''\
+import time
+while time.process_time() < 0.15:
+    pass
+print(int(input()) * 2)
+'''
+FAST = 'print(int(input()) * 2)\n'
+WRONG = 'print(int(input()) * 2 + int(input()))\n'
+SPACED = 'print(int(input()) * 2, end=" \\n")\n'
+# counts its runs in runs.txt, and goes over the time limit
+LOOPING = '''\
+with open('runs.txt', 'a') as f:
+    f.write('.')
+while True:
+    pass
+'''
+
+
+def _problem(problem):
+    return problem(
+        'double',
+        files={'slow.py': SLOW, 'fast.py': FAST},
+        samples=[(f'{i}\n0\n', f'{2 * i}\n') for i in range(1, 3)]
+    )
+
+
+def test_bench(problem, capsys):
+    folder = _problem(problem)
+    Bench('slow.py', 'fast.py', '--runs', '4', '--warmup', '0',
+          cwd=folder).act()
+    out = capsys.readouterr().out
+    assert 'Both solutions print the same outputs' in out
+    assert 'fast.py is' in out and 'faster than slow.py' in out
+    assert 'significant on 2' in out
+
+
+def test_bench_outputs_differ(problem, capsys):
+    folder = _problem(problem)
+    (folder / 'spaced.py').write_text(SPACED)
+    Bench('fast.py', 'spaced.py', '-n', '2', '--checker', 'token',
+          cwd=folder).act()
+    out = capsys.readouterr().out
+    assert 'The outputs differ on 2 sample(s): #1, #2' in out
+
+
+def test_bench_wrong_answer(problem, capsys):
+    folder = _problem(problem)
+    (folder / 'in2.txt').write_text('2\n1\n')
+    (folder / 'wrong.py').write_text(WRONG)
+    Bench('fast.py', 'wrong.py', '-n', '2', cwd=folder).act()
+    out = capsys.readouterr().out
+    assert 'Wrong Answer' in out
+    # only the outputs of accepted solutions are compared
+    assert 'outputs differ' not in out
+    assert 'on the samples they both pass' in out
+
+
+def test_bench_stops_failed_solution(problem, capsys):
+    folder = _problem(problem)
+    (folder / 'looping.py').write_text(LOOPING)
+    Bench('fast.py', 'looping.py', '-n', '5', '--time-limit', '0.2',
+          cwd=folder).act()
+    out = capsys.readouterr().out
+    assert 'Time Limit Exceeded' in out
+    # judged on its first run of each sample, then not run again
+    assert (folder / 'runs.txt').read_text() == '..'
@@ -0,0 +1,147 @@
+import os
+from pathlib import Path
+
+from kttool.cache import (
+    BuildCache, CachedPage, CookieCache, PageCache, evict_lru
+)
+
+
+def test_build_cache(tmp_path):
+    cwd = tmp_path / 'problem'
+    cwd.mkdir()
+    source = cwd / 'a.txt'
+    source.write_text('v1')
+    cache = BuildCache(root=tmp_path / 'cache')
+    pre_script = 'cp a.txt a.out'
+
+    key = cache.key(cwd, source, pre_script)
+    assert not cache.restore(key, cwd)
+    cache.compile(key, cwd, source, pre_script)
+    assert (cwd / 'a.out').read_text() == 'v1'
+
+    (cwd / 'a.out').unlink()
+    assert cache.restore(key, cwd)
+    assert (cwd / 'a.out').read_text() == 'v1'
+
+    source.write_text('v2')
+    assert cache.key(cwd, source, pre_script) != key
+    assert cache.key(cwd, source, f'{pre_script} ') != key
+
+
+def test_build_cache_key_ignores_outputs(tmp_path):
+    cwd = tmp_path / 'problem'
+    cwd.mkdir()
+    source = cwd / 'a.cpp'
+    source.write_text('v1')
+    cache = BuildCache(root=tmp_path / 'cache')
+
+    # named as the output of the compiler
+    for pre_script in ('g++ a.cpp -o a.out', 'g++ a.cpp -oa.out'):
+        key = cache.key(cwd, source, pre_script)
+        (cwd / 'a.out').write_text('binary')
+        assert cache.key(cwd, source, pre_script) == key
+        (cwd / 'a.out').unlink()
+
+    # produced by the previous run of the command
+    pre_script = 'cp a.cpp a.bin'
+    key = cache.key(cwd, source, pre_script)
+    cache.compile(key, cwd, source, pre_script)
+    assert cache.key(cwd, source, pre_script) == key
+    # reverting the source restores its build, whatever binary the other version left
+    source.write_text('v2')
+    cache.compile(cache.key(cwd, source, pre_script), cwd, source, pre_script)
+    source.write_text('v1')
+    assert cache.key(cwd, source, pre_script) == key
+    assert cache.restore(key, cwd) and (cwd / 'a.bin').read_text() == 'v1'
+
+
+def test_evict_lru(tmp_path):
+    for i, name in enumerate(['old', 'recent', 'new']):
+        entry = tmp_path / name
+        entry.mkdir()
+        (entry / 'bin').write_bytes(b'0' * 10)
+        os.utime(entry, (i, i))
+    os.utime(tmp_path / 'recent', (10, 10))
+    evict_lru(tmp_path, 20)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['new', 'recent']
+
+
+def test_cookie_cache(tmp_path):
+    cache = CookieCache(root=tmp_path, ttl=60)
+    cookies = [{'name': 'EduSiteCookie', 'value': 'abc', 'domain': 'open.kattis.com'}]
+    assert cache.load('open.kattis.com', 'me') is None
+    cache.save('open.kattis.com', 'me', cookies)
+    assert cache.load('open.kattis.com', 'me') == cookies
+    assert cache.load('open.kattis.com', 'someone') is None
+    assert all(p.stat().st_mode & 0o077 == 0 for p in tmp_path.iterdir())
+
+    saved = next(tmp_path.iterdir())
+    os.utime(saved, (0, 0))
+    assert cache.load('open.kattis.com', 'me') is None
+    assert not saved.exists()
+
+    cache.save('open.kattis.com', 'me', cookies)
+    cache.clear('open.kattis.com', 'me')
+    assert cache.load('open.kattis.com', 'me') is None
+
+
+def test_page_cache(tmp_path):
+    cache = PageCache(root=tmp_path, max_size=1 << 10)
+    small = CachedPage(content=b'0' * 400)
+    page = CachedPage(
+        content=b'<html></html>',
+        etag='"v1"',
+        samples=['1 2\n', '3\n'],
+        limits={'time_limit': 1.0}
+    )
+    assert cache.load('open.kattis.com', 'hello') is None
+    cache.save('open.kattis.com', 'hello', page)
+    assert cache.load('open.kattis.com', 'hello') == page
+    assert cache.load('other.kattis.com', 'hello') is None
+
+    # the least recently used page goes first
+    cache.save('open.kattis.com', 'a', small)
+    entries = sorted(tmp_path.iterdir(), key=lambda x: x.stat().st_mtime)
+    for i, entry in enumerate(entries):
+        os.utime(entry, (i, i))
+    assert cache.load('open.kattis.com', 'hello') == page
+    cache.save('open.kattis.com', 'b', small)
+    assert cache.load('open.kattis.com', 'a') is None
+    assert cache.load('open.kattis.com', 'hello') == page
+    assert cache.load('open.kattis.com', 'b') == small
+
+
+def test_build_cache_compiler_version(tmp_path, monkeypatch):
+    import subprocess
+    from kttool import cache as cache_module
+    compiler = tmp_path / 'bin' / 'cc'
+    compiler.parent.mkdir()
+    compiler.write_text('#!/bin/sh\necho cc 1.0\n')
+    compiler.chmod(0o755)
+    monkeypatch.setenv('PATH', str(compiler.parent), prepend=os.pathsep)
+    monkeypatch.setattr(cache_module, '_compiler_versions', {})
+    cwd = tmp_path / 'problem'
+    cwd.mkdir()
+    source = cwd / 'a.c'
+    source.write_text('v1')
+    cache = BuildCache(root=tmp_path / 'cache')
+    calls = []
+    run = subprocess.run
+
+    def counting_run(args, **kwargs):
+        calls.append(args)
+        return run(args, **kwargs)
+
+    monkeypatch.setattr(subprocess, 'run', counting_run)
+    key = cache.key(cwd, source, 'cc a.c')
+    assert cache.key(cwd, source, 'cc a.c') == key
+    # nor in another run of kt, which reads the versions saved on disk
+    monkeypatch.setattr(cache_module, '_compiler_versions', {})
+    assert BuildCache(root=tmp_path / 'cache').key(cwd, source, 'cc a.c') == key
+    assert len(calls) == 1
+
+    # a new compiler is asked for its version
+    compiler.write_text('#!/bin/sh\necho cc 2.0\n')
+    os.utime(compiler, ns=(0, 0))
+    assert cache.key(cwd, source, 'cc a.c') != key
+    assert len(calls) == 2
@@ -0,0 +1,36 @@
+from kttool.catalogue import CataloguedProblem, ProblemCatalogue
+
+
+def test_problem_catalogue(tmp_path):
+    with ProblemCatalogue(tmp_path / 'problems.sqlite3') as catalogue:
+        assert catalogue.last_crawl('open.kattis.com') is None
+        catalogue.upsert(
+            'open.kattis.com', [
+                CataloguedProblem('hello', 1.2, 1.2),
+                CataloguedProblem('twostones', 1.4, 1.4),
+                CataloguedProblem('ranged', 4.4, 5.1),
+                CataloguedProblem('hard', 9.0, 9.0),
+            ],
+            seen_at=1.
+        )
+        catalogue.upsert(
+            'other.kattis.com', [CataloguedProblem('mine', 1.3, 1.3)],
+            seen_at=1.
+        )
+        assert [x.id for x in catalogue.query('open.kattis.com', 1., 2.)
+               ] == ['hello', 'twostones']
+        assert catalogue.query('open.kattis.com', 4.5, 5.5) == []
+        assert [x.id for x in catalogue.query('open.kattis.com', 4., 5.5)
+               ] == ['ranged']
+
+        # a complete crawl forgets the problems it did not see
+        catalogue.upsert(
+            'open.kattis.com', [CataloguedProblem('hello', 1.5, 1.5)],
+            seen_at=2.
+        )
+        catalogue.complete_crawl('open.kattis.com', started_at=2.)
+        assert catalogue.last_crawl('open.kattis.com') is not None
+        assert catalogue.query('open.kattis.com', 0., 10.) == [
+            CataloguedProblem('hello', 1.5, 1.5)
+        ]
+        assert len(catalogue.query('other.kattis.com', 0., 10.)) == 1
@@ -0,0 +1,111 @@
+import io
+import sys
+from pathlib import Path
+
+import pytest
+
+from kttool.checkers import make_checker
+
+
+def _check(checker_name: str, expected: bytes, actual: bytes,
+           tmp_path: Path, **kwargs) -> bool:
+    input_file = tmp_path / 'in1.txt'
+    input_file.write_bytes(b'')
+    answer_file = tmp_path / 'ans1.txt'
+    answer_file.write_bytes(expected)
+    checker = make_checker(checker_name, **kwargs)
+    return checker.check(input_file, answer_file, io.BytesIO(actual), 1).is_ac
+
+
+@pytest.mark.parametrize(
+    "checker_name, expected, actual, is_ac", [
+        ('line', b'1 2\n3\n', b'1 2\n3\n', True),
+        ('line', b'1 2\n3\n', b'1\n2 3\n', False),
+        ('token', b'1 2\n3\n', b'1\n2   3', True),
+        ('token', b'1 2\n3\n', b'1 2 3 4', False),
+        ('case', b'Yes\n', b'YES\n', True),
+        ('token', b'Yes\n', b'YES\n', False),
+        ('float', b'3.14159265\n', b'3.141592\n', True),
+        ('float', b'1000000\n', b'1000000.5\n', True),
+        ('float', b'3.14159265\n', b'3.1415\n', False),
+        ('float', b'3.1 abc\n', b'3.1 abd\n', False),
+    ]
+)
+def test_builtin_checkers(checker_name, expected, actual, is_ac, tmp_path):
+    assert _check(checker_name, expected, actual, tmp_path) == is_ac
+
+
+def test_float_tolerance(tmp_path):
+    assert _check(
+        'float', b'0.5\n', b'0.51\n', tmp_path, absolute_tolerance=0.1
+    )
+
+
+def test_external_checker(tmp_path):
+    validator = tmp_path / 'validator.py'
+    validator.write_text(
+        '''\
+import sys
+from pathlib import Path
+expected = Path(sys.argv[2]).read_text().split()
+actual = sys.stdin.read().split()
+if sorted(expected) == sorted(actual):
+    sys.exit(42)
+(Path(sys.argv[3]) / 'judgemessage.txt').write_text('not a permutation')
+sys.exit(43)
+'''
+    )
+    name = f'{sys.executable} {validator}'
+    assert _check(name, b'1 2 3\n', b'3 1 2\n', tmp_path)
+    assert not _check(name, b'1 2 3\n', b'3 1 1\n', tmp_path)
+
+
+@pytest.mark.parametrize('checker_name', ['line', 'token'])
+def test_checkers_read_files(checker_name, tmp_path):
+    answer = b''.join(b'%d %d\n' % (i, 7 * i) for i in range(100000))
+    (tmp_path / 'in1.txt').write_bytes(b'')
+    (tmp_path / 'ans1.txt').write_bytes(answer)
+    checker = make_checker(checker_name)
+    for output, is_ac in (
+        (answer, True), (answer.replace(b'99999 ', b'99998 '), False),
+        (b'', False)
+    ):
+        with open(tmp_path / 'out.txt', 'w+b') as f:
+            f.write(output)
+            f.seek(0)
+            assert checker.check(
+                tmp_path / 'in1.txt', tmp_path / 'ans1.txt', f, 1
+            ).is_ac == is_ac
+
+
+@pytest.mark.parametrize('cli, expected', [
+    ((), (1e-3, 1e-2)),
+    (('--float-tolerance', '0.5'), (0.5, 0.5)),
+    (('--float-tolerance', '0'), (0., 0.)),
+])
+def test_float_tolerance_precedence(tmp_path, cli, expected):
+    from kttool.actions.test import Test as TestAction
+    (tmp_path / '.ktproblem').write_text(
+        '{"checker": "float", "float_absolute_tolerance": 1e-3, "float_relative_tolerance": 1e-2}'
+    )
+    action = TestAction(*cli, cwd=tmp_path)
+    checker = action.load_checker(action._opts)
+    assert (checker.absolute_tolerance, checker.relative_tolerance) == expected
+
+
+@pytest.mark.parametrize('module, name, positional', [
+    ('kttool.actions.test', 'Test', ()),
+    ('kttool.actions.stress', 'Stress', ('gen.py', 'brute.py', 'sol.py')),
+    ('kttool.actions.bench', 'Bench', ('a.py', 'b.py')),
+])
+def test_judge_options_are_shared(tmp_path, module, name, positional):
+    import importlib
+    (tmp_path / '.ktproblem').write_text(
+        '{"time_limit": 2, "output_limit": 16, "checker": "float", "float_tolerance": 1e-3}'
+    )
+    cli = ('--memory-limit', '64', '--output-limit', '0', '--float-tolerance', '0.5')
+    instance = getattr(importlib.import_module(module), name)(*positional, *cli, cwd=tmp_path)
+    limits = instance.load_limits(instance._opts)
+    assert (limits.time_limit, limits.memory_limit, limits.output_limit) == (2, 64, None)
+    checker = instance.load_checker(instance._opts)
+    assert (checker.absolute_tolerance, checker.relative_tolerance) == (0.5, 0.5)
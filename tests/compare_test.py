@@ -0,0 +1,63 @@
+import io
+
+import pytest
+
+from kttool.compare import compare_streams
+
+
+def _compare(expected: bytes, actual: bytes, **kwargs):
+    return compare_streams(io.BytesIO(expected), io.BytesIO(actual), **kwargs)
+
+
+@pytest.mark.parametrize(
+    "expected, actual", [
+        (b'1 2\n3\n', b'1 2\n3\n'),
+        (b'1 2\n3\n', b'1 2  \n3'),
+        (b'1 2\r\n3\r\n', b'1 2\n3\n\n\n'),
+        (b'', b''),
+    ]
+)
+def test_accepted(expected, actual):
+    assert _compare(expected, actual, chunk_size=2).is_ac
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 1 << 20])
+def test_first_mismatch(chunk_size):
+    expected = b''.join(f'{i}\n'.encode() for i in range(100))
+    actual = expected.replace(b'\n42\n', b'\n24\n').replace(b'\n77\n', b'\n0\n')
+    comparison = _compare(expected, actual, chunk_size=chunk_size, context=1)
+    assert not comparison.is_ac
+    assert [m.line_no for m in comparison.mismatches] == [43]
+    assert comparison.mismatches[0].expected == b'42'
+    assert comparison.mismatches[0].actual == b'24'
+    assert len(comparison.diff) == 3
+    assert comparison.diff[0].split('|')[0].strip() == '42'
+
+
+def test_max_mismatches():
+    expected = b'a\nb\nc\nd\n'
+    comparison = _compare(expected, b'a\nx\nc\ny\nz\n', max_mismatches=2)
+    assert [m.line_no for m in comparison.mismatches] == [2, 4]
+    comparison = _compare(expected, b'a\nb\nc\nd\ne\n', max_mismatches=2)
+    assert [m.line_no for m in comparison.mismatches] == [5]
+
+
+def test_invalid_utf8_mismatch():
+    # both lines decode to the same replacement characters, they still differ
+    comparison = _compare(b'1 \xff\n', b'1 \xfe\n')
+    assert not comparison.is_ac
+    assert comparison.mismatches[0].actual == b'1 \xfe'
+    assert '\ufffd' in comparison.diff[-1]
+
+
+@pytest.mark.parametrize("max_mismatches", [0, -1])
+def test_first_mismatch_always_recorded(max_mismatches):
+    comparison = _compare(b'0\n1\n', b'0\n2\n', max_mismatches=max_mismatches, chunk_size=1)
+    assert not comparison.is_ac
+    assert [m.line_no for m in comparison.mismatches] == [2]
+
+
+def test_mismatches_option():
+    from kttool.actions.test import Test as TestAction
+    with pytest.raises(SystemExit):
+        TestAction('--mismatches', '0')
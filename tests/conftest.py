@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from fake_kattis import FakeKattis
+
+
+@pytest.fixture
+def kattis():
+    """ Fake Kattis serving `fake_kattis.default_problems()` on a free port """
+    with FakeKattis() as server:
+        yield server
+
+
+@pytest.fixture
+def home(tmp_path, monkeypatch, kattis):
+    """ Home folder whose kattisrc points at the fake Kattis, with a python template """
+    ret = tmp_path / 'home'
+    ret.mkdir()
+    (ret / 'template.py').write_text('print(input())\n')
+    (ret / '.kattisrc').write_text(kattis.kattisrc())
+    (ret / '.ktconfig').write_text(
+        json.dumps({
+            'py3': {
+                'path': str(ret / 'template.py'),
+                'pre_script': '',
+                'script': 'python3 $%file%$.py',
+                'post_script': '',
+                'default': True
+            }
+        })
+    )
+    monkeypatch.setenv('HOME', str(ret))
+    monkeypatch.setenv('XDG_CACHE_HOME', str(ret / '.cache'))
+    monkeypatch.setenv('KT_NO_DAEMON', '1')
+    return ret
+
+
+@pytest.fixture
+def problem(home):
+    """ Factory of problem folders in `home`. `problem(name)` makes a folder `name` holding
+    `{name}.py`, a program that prints its input. `files` replaces that program, with the content of
+    each file by name, `samples` are the (input, answer) pairs of the samples and `parent` is where
+    the folder is made instead of `home`
+    """
+    def make(name, files=None, samples=(), parent=None):
+        folder = (parent or home) / name
+        folder.mkdir(parents=True)
+        if files is None:
+            files = {f'{name}.py': 'print(input())\n'}
+        for filename, content in files.items():
+            (folder / filename).write_text(content)
+        for i, (raw_input, answer) in enumerate(samples, 1):
+            (folder / f'in{i}.txt').write_text(raw_input)
+            (folder / f'ans{i}.txt').write_text(answer)
+        return folder
+
+    return make
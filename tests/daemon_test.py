@@ -0,0 +1,69 @@
+import os
+import socket
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+KT = Path(__file__).absolute().parent.parent / 'kt'
+
+pytestmark = pytest.mark.skipif(
+    not hasattr(os, 'fork'), reason='kt daemon needs fork'
+)
+
+
+def _kt(
+    env: dict, cwd: Path, *args: str, umask: int = 0o022
+) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, str(KT), *args],
+        cwd=cwd,
+        env=env,
+        preexec_fn=lambda: os.umask(umask),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        universal_newlines=True,
+        timeout=60
+    )
+
+
+def test_daemon_runs_commands(tmp_path):
+    (tmp_path / '.kattisrc').write_text(
+        '[user]\nusername = tester\ntoken = abc\n\n[kattis]\nhostname = open.kattis.com\n'
+    )
+    (tmp_path / '.ktconfig').write_text(
+        '{"py3": {"path": "", "pre_script": "", "script": "%s $%%file%%$.py", '
+        '"post_script": "", "default": true}}' % sys.executable
+    )
+    problem = tmp_path / 'hello'
+    problem.mkdir()
+    (problem / 'hello.py').write_text('print(input())\n')
+    (problem / 'in1.txt').write_text('5\n')
+    (problem / 'ans1.txt').write_text('5\n')
+    env = {
+        **os.environ, 'HOME': str(tmp_path),
+        'XDG_CACHE_HOME': str(tmp_path / 'cache')
+    }
+    env.pop('KT_NO_DAEMON', None)
+
+    assert 'started' in _kt(env, tmp_path, 'daemon', 'start').stdout
+    try:
+        version = _kt(env, problem, 'version')
+        assert version.returncode == 0
+        assert 'Current version' in version.stdout
+        assert 'Accepted' in _kt(env, problem, 'test', umask=0o027).stdout
+        # the files of the command follow the umask of the client, not the one of the socket
+        manifest, = (tmp_path / 'cache' / 'kt' / 'samples').iterdir()
+        assert manifest.stat().st_mode & 0o777 == 0o640
+        assert '2 commands served' in _kt(env, tmp_path, 'daemon',
+                                          'status').stdout
+        # a client that connects and sends nothing does not hold the daemon
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as silent:
+            silent.connect(str(tmp_path / 'cache' / 'kt' / 'daemon.sock'))
+            assert 'Current version' in _kt(env, problem, 'version').stdout
+    finally:
+        assert 'stopped' in _kt(env, tmp_path, 'daemon', 'stop').stdout
+    assert 'not running' in _kt(env, tmp_path, 'daemon', 'status').stdout
+    # without a daemon, commands run in the kt process
+    assert 'Accepted' in _kt(env, problem, 'test').stdout
@@ -0,0 +1,505 @@
+''' Local stand-in for the pages of Kattis that kt uses: login, problem pages, the problem listing,
+submit and the submission pages (html and json views). Each problem judges its submissions along a
+scripted timeline and every request can be delayed, so the whole CLI can be tested, and load tested,
+offline against `hostname = localhost:<port>`
+
+    python tests/fake_kattis.py [--port PORT] [--latency SEC]
+
+serves the problems of `default_problems()` and prints the kattisrc to use
+'''
+from __future__ import annotations
+
+import argparse
+import hashlib
+import html
+import json
+import re
+import secrets
+import threading
+import time
+from dataclasses import dataclass, field
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qs, urlparse
+
+__all__ = [
+    'FakeKattis', 'FakeProblem', 'FakeSubmission', 'Step', 'accepted',
+    'default_problems', 'rejected'
+]
+
+# status ids of the json view of a submission, see kttool/actions/submit.py
+COMPILING = 3
+RUNNING = 5
+WRONG_ANSWER = 14
+ACCEPTED = 16
+_STATUS_TEXT = {
+    COMPILING: 'Compiling',
+    RUNNING: 'Running',
+    8: 'Compile Error',
+    9: 'Run-Time Error',
+    10: 'Memory Limit Exceeded',
+    11: 'Output Limit Exceeded',
+    12: 'Time Limit Exceeded',
+    WRONG_ANSWER: 'Wrong Answer',
+    ACCEPTED: 'Accepted',
+}
+_COOKIE = 'EduSiteCookie'
+
+
+@dataclass(frozen=True)
+class Step:
+    ''' State of a submission from `after` seconds after it was received '''
+    after: float
+    status_id: int
+    # test case being judged, 1 based. Once the submission is rejected, the one that failed
+    testcase_index: int = 0
+
+
+def accepted(test_cases: int, per_test_case: float = 0.) -> List[Step]:
+    """ Compiled, then every test case judged one after the other """
+    return [
+        Step(0., COMPILING),
+        *(
+            Step(i * per_test_case, RUNNING, i)
+            for i in range(1, test_cases + 1)
+        ),
+        Step((test_cases + 1) * per_test_case, ACCEPTED, test_cases),
+    ]
+
+
+def rejected(
+    test_cases: int,
+    failing: int,
+    per_test_case: float = 0.,
+    status_id: int = WRONG_ANSWER
+) -> List[Step]:
+    """ Like `accepted`, until test case `failing` is rejected with `status_id` """
+    steps = accepted(test_cases, per_test_case)[:failing + 1]
+    return [*steps, Step((failing + 1) * per_test_case, status_id, failing)]
+
+
+@dataclass
+class FakeProblem:
+    id: str
+    # inputs and answers of the samples
+    samples: List[Tuple[str, str]]
+    # as shown in the problem listing, eg '2.3' or '3.1 - 4.5'
+    difficulty: str = '2.0'
+    time_limit: float = 1.
+    memory_limit: int = 1024
+    test_cases: int = 3
+    timeline: List[Step] = field(default_factory=list)
+
+    def __post_init__(self):
+        if not self.timeline:
+            self.timeline = accepted(self.test_cases)
+
+
+@dataclass
+class FakeSubmission:
+    id: int
+    problem: FakeProblem
+    language: str
+    files: Dict[str, bytes]
+    submitted_at: float
+
+    def state(self) -> Step:
+        elapsed = time.monotonic() - self.submitted_at
+        reached = [x for x in self.problem.timeline if x.after <= elapsed]
+        return reached[-1] if reached else self.problem.timeline[0]
+
+
+def default_problems() -> List[FakeProblem]:
+    return [
+        FakeProblem(
+            'hello', [('', 'Hello World!\n')], difficulty='1.2', test_cases=1
+        ),
+        FakeProblem(
+            'oddmanout', [
+                (
+                    '3\n3\n1 2147483647 2147483647\n5\n3 4 7 4 3\n5\n2 10 2 10 5\n',
+                    'Case #1: 1\nCase #2: 7\nCase #3: 5\n'
+                )
+            ],
+            difficulty='1.8',
+            time_limit=1.,
+            memory_limit=1024
+        ),
+        FakeProblem(
+            'twostones', [('1\n', 'Alice\n'), ('2\n', 'Bob\n')],
+            difficulty='1.4'
+        ),
+        FakeProblem(
+            'different', [('10 12\n71293781758123 72784\n', '2\n71293781685339\n')],
+            difficulty='2.6 - 2.9',
+            test_cases=5,
+            timeline=rejected(5, 4)
+        ),
+        FakeProblem(
+            'guessthedatastructure', [('4\n1 1\n1 2\n2 1\n2 2\n', 'stack\n')],
+            difficulty='4.5',
+            time_limit=2.,
+            memory_limit=512
+        ),
+    ]
+
+
+class FakeKattis:
+    ''' The server, run on a background thread
+
+    Parameters
+    ----------
+    problems : None | List[FakeProblem], optional
+        problems of the instance, `default_problems()` by default
+    username, token : str, optional
+        the only credentials `/login` accepts
+    latency : float, optional
+        seconds every request waits before it is answered
+    page_size : int, optional
+        number of problems of a page of the listing
+    '''
+    def __init__(
+        self,
+        problems: None | List[FakeProblem] = None,
+        *,
+        username: str = 'tester',
+        token: str = 'secret',
+        latency: float = 0.,
+        page_size: int = 2,
+        port: int = 0
+    ):
+        self.problems = {x.id: x for x in problems or default_problems()}
+        self.username = username
+        self.token = token
+        self.latency = latency
+        self.page_size = page_size
+        # method and path of every request, in order
+        self.requests: List[Tuple[str, str]] = []
+        self.submissions: Dict[int, FakeSubmission] = {}
+        # pages of the listing answered with a 503, as a rate limited Kattis does
+        self.failing_pages: Set[int] = set()
+        # problems whose page is answered with a 503
+        self.failing_problems: Set[str] = set()
+        self._sessions = set()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), _make_handler(self))
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    @property
+    def hostname(self) -> str:
+        return f'localhost:{self.port}'
+
+    @property
+    def url(self) -> str:
+        return f'http://{self.hostname}'
+
+    def kattisrc(self) -> str:
+        return f'[user]\nusername = {self.username}\ntoken = {self.token}\n\n' \
+            f'[kattis]\nhostname = {self.hostname}\n'
+
+    def start(self) -> FakeKattis:
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> FakeKattis:
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    def expire_sessions(self) -> None:
+        """ Forget every login, as Kattis does when a session expires """
+        with self._lock:
+            self._sessions.clear()
+
+    def count(self, method: str, path: str) -> int:
+        """ Number of requests to `path` (without its query) """
+        return sum(
+            1 for m, p in self.requests
+            if m == method and urlparse(p).path == path
+        )
+
+    def submit(
+        self, problem_id: str, language: str, files: Dict[str, bytes]
+    ) -> FakeSubmission:
+        with self._lock:
+            submission = FakeSubmission(
+                id=len(self.submissions) + 1000,
+                problem=self.problems[problem_id],
+                language=language,
+                files=files,
+                submitted_at=time.monotonic()
+            )
+            self.submissions[submission.id] = submission
+        return submission
+
+    def _login(self, form: Dict[str, str]) -> None | str:
+        """ The cookie of a new session, None if the credentials are wrong """
+        if form.get('user') != self.username or self.token not in (
+            form.get('token'), form.get('password')
+        ):
+            return None
+        session = secrets.token_hex(8)
+        with self._lock:
+            self._sessions.add(session)
+        return session
+
+    def _is_logged_in(self, cookie_header: str) -> bool:
+        cookie = SimpleCookie(cookie_header or '')
+        return _COOKIE in cookie and cookie[_COOKIE].value in self._sessions
+
+
+def _etag(body: bytes) -> str:
+    return f'"{hashlib.sha1(body).hexdigest()[:16]}"'
+
+
+def _page(title: str, body: str) -> bytes:
+    return f'<!DOCTYPE html><html><head><title>{html.escape(title)}</title></head>' \
+        f'<body><main class="container">{body}</main></body></html>'.encode()
+
+
+def _problem_page(problem: FakeProblem) -> bytes:
+    samples = ''.join(
+        f'<table class="sample"><tbody><tr><th>Sample Input {i}</th><th>Sample Output {i}</th></tr>'
+        f'<tr><td><pre>{html.escape(raw_input)}</pre></td><td><pre>{html.escape(answer)}</pre></td>'
+        f'</tr></tbody></table>' for i, (raw_input, answer) in enumerate(problem.samples, 1)
+    )
+    return _page(
+        problem.id,
+        f'<h1>{problem.id}</h1><div class="problem-sidebar">'
+        f'<p>CPU Time limit {problem.time_limit:g} second{"s" if problem.time_limit != 1 else ""}</p>'
+        f'<p>Memory limit {problem.memory_limit} MB</p></div>'
+        f'<div class="problembody"><p>Statement of {problem.id}.</p>{samples}</div>'
+    )
+
+
+def _listing_page(problems: List[FakeProblem]) -> bytes:
+    rows = ''.join(
+        f'<tr><td><a href="/problems/{x.id}">{x.id}</a></td>'
+        f'<td><span class="difficulty_number">{x.difficulty}</span></td></tr>'
+        for x in problems
+    )
+    return _page(
+        'Problems', f'<table class="table2"><thead><tr><th>Name</th><th>Difficulty</th></tr>'
+        f'</thead><tbody>{rows}</tbody></table>'
+    )
+
+
+def _test_cases(submission: FakeSubmission, state: Step) -> List[str]:
+    """ Status of each test case: accepted, rejected or not judged yet """
+    total = submission.problem.test_cases
+    if state.status_id == ACCEPTED:
+        return ['Accepted'] * total
+    if state.status_id in (COMPILING, RUNNING):
+        judged = max(0, state.testcase_index - 1)
+        return ['Accepted'] * judged + [''] * (total - judged)
+    failing = state.testcase_index
+    return ['Accepted'] * (failing - 1) + [_STATUS_TEXT[state.status_id]] + [''] * (total - failing)
+
+
+def _row_html(submission: FakeSubmission, state: Step) -> str:
+    cases = _test_cases(submission, state)
+    icons = ''.join(
+        f'<i class="status-icon" title="Test case {i}/{len(cases)}: {x or "not checked"}"></i>'
+        for i, x in enumerate(cases, 1)
+    )
+    return f'<td data-type="cpu">0.01&nbsp;s</td><td>{icons}</td>'
+
+
+def _submission_page(submission: FakeSubmission, state: Step) -> bytes:
+    classes = {'Accepted': 'is-accepted', '': 'is-empty'}
+    cases = ''.join(
+        f'<span class="testcase {classes.get(x, "is-rejected")}"></span>'
+        for x in _test_cases(submission, state)
+    )
+    return _page(
+        f'Submission {submission.id}',
+        f'<table class="table2"><tbody><tr><td>{submission.id}</td>'
+        f'<td class="status"><div class="status"><span>{_STATUS_TEXT[state.status_id]}</span></div></td>'
+        f'<td class="runtime">0.01&nbsp;s</td>'
+        f'<td><div class="testcase-row">{cases}</div></td></tr></tbody></table>'
+    )
+
+
+def _make_handler(kattis: FakeKattis):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args) -> None:
+            pass
+
+        def _send(
+            self,
+            status: int,
+            body: bytes = b'',
+            headers: None | Dict[str, str] = None
+        ) -> None:
+            self.send_response(status)
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_cached(
+            self, body: bytes, content_type: str = 'text/html'
+        ) -> None:
+            etag = _etag(body)
+            if self.headers.get('If-None-Match') == etag:
+                self._send(304, headers={'ETag': etag})
+                return
+            self._send(200, body, {'ETag': etag, 'Content-Type': content_type})
+
+        def _redirect_to_login(self) -> None:
+            self._send(302, headers={'Location': '/login'})
+
+        def _start(self) -> Tuple[str, Dict[str, List[str]]]:
+            kattis.requests.append((self.command, self.path))
+            if kattis.latency:
+                time.sleep(kattis.latency)
+            url = urlparse(self.path)
+            return url.path.rstrip('/') or '/', parse_qs(url.query, keep_blank_values=True)
+
+        def do_GET(self) -> None:
+            path, query = self._start()
+            if path == '/login':
+                self._send(200, _page('Login', '<form method="post"></form>'))
+                return
+            if path == '/problems':
+                page = int(query.get('page', ['0'])[0])
+                if page in kattis.failing_pages:
+                    self._send(503, _page('Unavailable', 'Try again later'))
+                    return
+                problems = sorted(
+                    kattis.problems.values(),
+                    key=lambda x: (float(x.difficulty.split('-')[0]), x.id)
+                )
+                self._send_cached(
+                    _listing_page(
+                        problems[page * kattis.page_size:(page + 1) * kattis.page_size]
+                    )
+                )
+                return
+            match = re.fullmatch(r'/problems/([\w-]+)', path)
+            if match is not None:
+                if match.group(1) in kattis.failing_problems:
+                    self._send(503, _page('Unavailable', 'Try again later'))
+                    return
+                problem = kattis.problems.get(match.group(1))
+                if problem is None:
+                    self._send(404, _page('Not found', 'No such problem'))
+                    return
+                self._send_cached(_problem_page(problem))
+                return
+            match = re.fullmatch(r'/submissions/(\d+)', path)
+            if match is not None:
+                if not kattis._is_logged_in(self.headers.get('Cookie')):
+                    self._redirect_to_login()
+                    return
+                submission = kattis.submissions.get(int(match.group(1)))
+                if submission is None:
+                    self._send(404, _page('Not found', 'No such submission'))
+                    return
+                state = submission.state()
+                if 'json' in query:
+                    self._send_cached(
+                        json.dumps(
+                            {
+                                'status_id': state.status_id,
+                                'testcase_index': state.testcase_index,
+                                'row_html': _row_html(submission, state),
+                            }
+                        ).encode(), 'application/json'
+                    )
+                else:
+                    self._send_cached(_submission_page(submission, state))
+                return
+            self._send(404, _page('Not found', path))
+
+        def do_POST(self) -> None:
+            path, _ = self._start()
+            body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            if path == '/login':
+                form = {
+                    k: v[0]
+                    for k, v in parse_qs(body.decode()).items()
+                }
+                session = kattis._login(form)
+                if session is None:
+                    self._send(403, b'Incorrect username or password')
+                    return
+                self._send(
+                    200, b'Login successful',
+                    {'Set-Cookie': f'{_COOKIE}={session}; Path=/'}
+                )
+                return
+            if path == '/submit':
+                if not kattis._is_logged_in(self.headers.get('Cookie')):
+                    self._redirect_to_login()
+                    return
+                fields, files = _parse_multipart(self.headers['Content-Type'], body)
+                if fields.get('problem') not in kattis.problems:
+                    self._send(400, b'Problem not found')
+                    return
+                submission = kattis.submit(
+                    fields['problem'], fields.get('language', ''), files
+                )
+                self._send(
+                    200,
+                    f'Submission received. Submission ID: {submission.id}.'.encode()
+                )
+                return
+            self._send(404, _page('Not found', path))
+
+    return Handler
+
+
+def _parse_multipart(content_type: str,
+                     body: bytes) -> Tuple[Dict[str, str], Dict[str, bytes]]:
+    """ Form fields and uploaded files of a multipart/form-data body """
+    message = BytesParser(policy=HTTP).parsebytes(
+        f'Content-Type: {content_type}\r\n\r\n'.encode() + body
+    )
+    fields: Dict[str, str] = {}
+    files: Dict[str, bytes] = {}
+    for part in message.iter_parts():
+        name = part.get_param('name', header='content-disposition')
+        filename = part.get_filename()
+        payload = part.get_payload(decode=True) or b''
+        if filename:
+            files[filename] = payload
+        else:
+            fields[name] = payload.decode()
+    return fields, files
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.)
+    opts = parser.parse_args()
+    with FakeKattis(latency=opts.latency, port=opts.port) as kattis:
+        print(f'Serving {kattis.url}, use this kattisrc:\n\n{kattis.kattisrc()}')
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
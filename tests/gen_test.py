@@ -1,26 +1,69 @@
-from pathlib import Path
-import tempfile
-from kttool.actions.gen import Gen
-import unittest
 import shutil
+
 import pytest
 
+from kttool.actions.gen import Gen
+
 
-@pytest.mark.parametrize(
-    "test_id", ['oddmanout', 'https://open.kattis.com/problems/oddmanout']
-)
-def test_gen_action(test_id):
-    temp_dir = Path(tempfile.gettempdir()) / 'kttool' / 'gen_test'
+@pytest.mark.parametrize("url", [False, True])
+def test_gen_action(home, kattis, url):
+    test_id = f'{kattis.url}/problems/oddmanout' if url else 'oddmanout'
 
-    action = Gen(test_id, cwd=temp_dir)
+    action = Gen(test_id, cwd=home)
     action.act()
-    assert (temp_dir / 'oddmanout/ans1.txt').is_file()
-    assert (temp_dir / 'oddmanout/in1.txt').is_file()
+    assert (home / 'oddmanout/ans1.txt').is_file()
+    assert (home / 'oddmanout/in1.txt').is_file()
 
-    with open(temp_dir / 'oddmanout/in1.txt', 'r') as f:
+    with open(home / 'oddmanout/in1.txt', 'r') as f:
         assert f.read(
         ) == """3\n3\n1 2147483647 2147483647\n5\n3 4 7 4 3\n5\n2 10 2 10 5\n"""
-    with open(temp_dir / 'oddmanout/ans1.txt', 'r') as f:
+    with open(home / 'oddmanout/ans1.txt', 'r') as f:
         assert f.read() == """Case #1: 1\nCase #2: 7\nCase #3: 5\n"""
 
-    shutil.rmtree(temp_dir)
+
+def test_gen_batch_login_failure(home, kattis):
+    kattis.token = 'revoked'
+    with pytest.raises(RuntimeError, match='Login failed'):
+        Gen('hello', 'oddmanout', 'twostones', cwd=home).act()
+    # the workers did not try to log in again
+    assert kattis.count('POST', '/login') == 1
+    assert not (home / 'hello').exists()
+
+
+def test_gen_batch_unreachable(home, kattis, capsys):
+    Gen('hello', 'oddmanout', cwd=home).act()
+    kattis.stop()
+    # the saved session is gone too, the login of the batch fails
+    shutil.rmtree(home / '.cache' / 'kt' / 'cookies')
+    for problem_id in ('hello', 'oddmanout'):
+        (home / problem_id / 'in1.txt').unlink()
+    Gen('hello', 'oddmanout', cwd=home).act()
+    out = capsys.readouterr().out
+    # the batch goes offline at once, the workers do not try to reach the server
+    assert 'using the cached pages' in out and 'using the cached page\n' not in out
+    assert (home / 'hello/in1.txt').is_file() and (home / 'oddmanout/in1.txt').is_file()
+
+
+def test_gen_unknown_problem(home, kattis, capsys):
+    with pytest.raises(RuntimeError, match='does not exist'):
+        Gen('nosuchproblem', cwd=home).act()
+    # in a batch, the other problems are still generated
+    Gen('hello', 'nosuchproblem', cwd=home).act()
+    assert 'Unable to generate nosuchproblem: Problem nosuchproblem does not exist' in \
+        capsys.readouterr().out
+    assert (home / 'hello/in1.txt').is_file()
+    assert not (home / 'nosuchproblem').exists()
+
+
+def test_gen_server_error(home, kattis, capsys):
+    kattis.failing_problems.add('hello')
+    with pytest.raises(RuntimeError, match='Status code: 503'):
+        Gen('hello', cwd=home).act()
+    kattis.failing_problems.clear()
+    Gen('hello', cwd=home).act()
+    (home / 'hello/in1.txt').unlink()
+    # once cached, the page is used when the server fails
+    kattis.failing_problems.add('hello')
+    Gen('hello', cwd=home).act()
+    assert 'answered 503, using the cached page' in capsys.readouterr().out
+    assert (home / 'hello/in1.txt').is_file()
@@ -0,0 +1,127 @@
+import json
+from xml.etree import ElementTree
+
+from kttool.history import CaseRecord, RunHistory
+
+
+def test_run_history(tmp_path):
+    with RunHistory(tmp_path / 'history.sqlite3') as history:
+        assert history.previous('hello') is None
+        first = history.record(
+            'hello', 'a', 'Python 3',
+            [CaseRecord('1', 'Accepted', 0.1, 0.08, 10., 2)]
+        )
+        second = history.record(
+            'hello', 'b', 'Python 3', [
+                CaseRecord('1', 'Accepted', 0.2, 0.18, 12., 2),
+                CaseRecord('2', 'Wrong Answer', 0.1, 0.09, 11., 5)
+            ]
+        )
+        history.record('other', 'b', 'Python 3', [])
+
+        last = history.previous('hello')
+        assert last.id == second and last.source_hash == 'b'
+        assert last.cases['2'] == CaseRecord('2', 'Wrong Answer', 0.1, 0.09, 11., 5)
+        assert history.previous('hello', before=second).id == first
+        assert history.previous('hello', source_hash='a').id == first
+        assert history.previous('hello', before=first) is None
+
+
+def test_run_history_retention(tmp_path):
+    with RunHistory(tmp_path / 'history.sqlite3', max_runs=2) as history:
+        runs = [
+            history.record(
+                'hello', 'a', 'Python 3',
+                [CaseRecord('1', 'Accepted', 0.1, 0.08, 10., 2)]
+            ) for _ in range(3)
+        ]
+        history.record('other', 'a', 'Python 3', [])
+        # the oldest run of hello is forgotten along with its cases, other problems are kept
+        assert history.previous('hello', before=runs[1]) is None
+        assert history.previous('hello', before=runs[2]).id == runs[1]
+        assert history.previous('other') is not None
+        assert history._db.execute('SELECT COUNT(*) FROM cases').fetchone() == (2, )
+
+
+def test_run_history_integer_samples(tmp_path):
+    import sqlite3
+    path = tmp_path / 'history.sqlite3'
+    # samples used to be stored as integers
+    db = sqlite3.connect(str(path))
+    with db:
+        db.executescript(
+            RunHistory._SCHEMA.replace('sample TEXT', 'sample INTEGER')
+        )
+    db.close()
+    with RunHistory(path) as history:
+        history.record(
+            'hello', 'a', 'Python 3',
+            [CaseRecord('3', 'Accepted', 0.1, 0.08, 10., 2)]
+        )
+        assert list(history.previous('hello').cases) == ['3']
+
+
+def _problem(problem, monkeypatch):
+    folder = problem('hello', samples=[('1\n', '1\n'), ('2\n', '3\n')])
+    # kt runs the code from the current folder
+    monkeypatch.chdir(folder)
+    return folder
+
+
+def test_reports(home, problem, capsys, monkeypatch):
+    from kttool.actions.test import Test as TestAction
+    folder = _problem(problem, monkeypatch)
+
+    TestAction('--format', 'json', cwd=folder).act()
+    captured = capsys.readouterr()
+    report = json.loads(captured.out)
+    assert 'Test Case #1' in captured.err
+    assert (report['problem_id'], report['passed'], report['total']) == ('hello', 1, 2)
+    assert [x['verdict'] for x in report['cases']] == ['Accepted', 'Wrong Answer']
+    assert report['cases'][1]['output_size'] == 2
+    assert report['cases'][1]['diff']
+
+    TestAction('--report', str(home / 'report.xml'), cwd=folder).act()
+    suite = ElementTree.parse(home / 'report.xml').getroot().find('testsuite')
+    assert (suite.get('tests'), suite.get('failures')) == ('2', '1')
+    failure = suite.find("testcase[@name='sample 2']/failure")
+    assert failure.get('type') == 'Wrong Answer'
+
+    with RunHistory() as history:
+        last = history.previous('hello')
+        assert history.previous('hello', before=last.id, source_hash=last.source_hash)
+    assert last.cases['1'].verdict == 'Accepted'
+
+
+def test_compare(problem, capsys, monkeypatch):
+    from kttool.actions.test import Test as TestAction
+    folder = _problem(problem, monkeypatch)
+    TestAction(cwd=folder).act()
+    # the second sample is fixed and the first one now allocates much more memory
+    (folder / 'hello.py').write_text(
+        'n = int(input())\nx = [0] * 4000000 if n == 1 else []\nprint(n * 2 - 1)\n'
+    )
+    capsys.readouterr()
+    TestAction('--compare', cwd=folder).act()
+    out = capsys.readouterr().out
+    assert 'another revision of the source' in out
+    lines = {x.split(':')[0]: x for x in out.splitlines()}
+    assert lines['Test Case #2'].endswith('Wrong Answer -> Accepted')
+    assert 'test case(s) regressed' in out
+
+
+def test_repeat(problem, capsys, monkeypatch):
+    from kttool.actions.test import Test as TestAction
+    folder = _problem(problem, monkeypatch)
+    TestAction(
+        '--repeat', '3', '--warmup', '1', '--time-limit', '5', '--margin',
+        '0.999', '--format', 'json', cwd=folder
+    ).act()
+    captured = capsys.readouterr()
+    accepted, rejected = json.loads(captured.out)['cases']
+    assert accepted['runs'] == 3 and accepted['cpu_time_summary']['count'] == 3
+    assert accepted['near_time_limit']
+    # a wrong answer stops the sample
+    assert rejected['runs'] == 1 and not rejected['near_time_limit']
+    assert 'median of 3 runs' in captured.err
+    assert 'within 100% of the time limit' in captured.err
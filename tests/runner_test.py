@@ -0,0 +1,87 @@
+import os
+import sys
+
+import pytest
+
+from kttool.runner import OLE, Limits, output_file, run_program
+
+COPY = 'import sys\nsys.stdout.buffer.write(sys.stdin.buffer.read())\n'
+
+
+def test_run_program_from_file_to_file(tmp_path):
+    input_file = tmp_path / 'in1.txt'
+    input_file.write_bytes(b'1 2 3\n' * 1000)
+    with output_file() as output:
+        run = run_program([sys.executable, '-c', COPY], input_file, Limits(),
+                          stdout=output)
+        assert run.verdict(Limits()) is None
+        assert run.output == b''
+        assert run.output_size == 6000
+        output.seek(0)
+        assert output.read() == input_file.read_bytes()
+
+
+@pytest.mark.parametrize(
+    'program', [
+        # python ignores SIGXFSZ, its writes fail instead
+        [sys.executable, '-c', 'print("x" * (2 << 20))'],
+        ['sh', '-c', 'yes | head -c 3000000'],
+    ]
+)
+def test_output_limit_on_file(program):
+    limits = Limits(output_limit=1)
+    with output_file() as output:
+        run = run_program(program, b'', limits, stdout=output)
+    assert run.verdict(limits) == OLE
+    assert run.output_size <= (1 << 20) + 1
+
+
+@pytest.mark.skipif(
+    not hasattr(os, 'sched_setaffinity'), reason='no cpu affinity'
+)
+def test_run_program_pinned():
+    cpu = max(os.sched_getaffinity(0))
+    run = run_program(
+        [sys.executable, '-c', 'import os; print(sorted(os.sched_getaffinity(0)))'],
+        b'', Limits(),
+        cpu=cpu
+    )
+    assert run.output.decode().strip() == f'[{cpu}]'
+
+
+def test_run_program_compressed_input(tmp_path):
+    import gzip
+    data = b'1 2 3\n' * 100000
+    input_file = tmp_path / 'in1.txt.gz'
+    input_file.write_bytes(gzip.compress(data))
+    run = run_program([sys.executable, '-c', COPY], input_file, Limits())
+    assert run.verdict(Limits()) is None and run.output == data
+
+    # a program that does not read its input is not blocked by it
+    run = run_program([sys.executable, '-c', 'print(1)'], input_file, Limits())
+    assert run.output == b'1\n'
+
+    input_file.write_bytes(b'not gzip')
+    with pytest.raises(RuntimeError, match='in1.txt.gz'):
+        run_program([sys.executable, '-c', COPY], input_file, Limits())
+
+
+def test_kill_subprocesses_launched_concurrently():
+    from concurrent.futures import ThreadPoolExecutor
+
+    from kttool.utils import kill_test_subprocesses, launch_subprocess
+    with ThreadPoolExecutor(8) as executor:
+        processes = list(
+            executor.map(
+                lambda _: launch_subprocess(['sleep', '30']), range(32)
+            )
+        )
+    kill_test_subprocesses()
+    # none of them was lost by a concurrent launch
+    assert all(p.wait(timeout=5) == -9 for p in processes)
+
+
+def test_run_program_new_session():
+    program = 'import os\nprint(os.getsid(0) == os.getpid())\n'
+    run = run_program([sys.executable, '-c', program], b'', Limits(time_limit=1))
+    assert run.output == b'True\n'
@@ -0,0 +1,105 @@
+import gzip
+import os
+
+import pytest
+
+from kttool.samples import SampleIndex, find_samples, open_case
+
+
+def _write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(gzip.compress(data) if path.suffix == '.gz' else data)
+
+
+def _age(folder):
+    """ Make the folder look untouched for a while, its listing is not trusted from the manifest
+    otherwise
+    """
+    for root, dirs, _ in os.walk(folder):
+        os.utime(root, ns=(0, 10**18))
+
+
+def test_find_samples(tmp_path):
+    _write(tmp_path / 'in2.txt', b'2\n')
+    _write(tmp_path / 'ans2.txt', b'2\n')
+    _write(tmp_path / 'in10.txt', b'10\n')
+    _write(tmp_path / 'ans10.txt', b'10\n')
+    _write(tmp_path / 'in3.txt', b'orphan\n')
+    _write(tmp_path / 'large' / 'in1.txt.gz', b'1\n')
+    _write(tmp_path / 'large' / 'ans1.txt', b'1\n')
+    # the plain file wins over the compressed one
+    _write(tmp_path / 'large' / 'in2.txt', b'2\n')
+    _write(tmp_path / 'large' / 'in2.txt.gz', b'2\n')
+    _write(tmp_path / 'large' / 'ans2.txt.gz', b'2\n')
+    _write(tmp_path / '.hidden' / 'in1.txt', b'1\n')
+    _write(tmp_path / '.hidden' / 'ans1.txt', b'1\n')
+
+    samples = find_samples(tmp_path)
+    assert [x.name for x in samples] == ['2', '10', 'large/1', 'large/2']
+    assert samples[2].input_file == tmp_path / 'large' / 'in1.txt.gz'
+    assert samples[3].input_file.name == 'in2.txt'
+    assert samples[3].output_file.name == 'ans2.txt.gz'
+    with open_case(samples[3].output_file) as f:
+        assert f.read() == b'2\n'
+
+
+def test_manifest(tmp_path):
+    folder = tmp_path / 'problem'
+    manifest = tmp_path / 'manifest.json'
+    _write(folder / 'in1.txt', b'1\n')
+    _write(folder / 'ans1.txt', b'1\n')
+    _age(folder)
+    index = SampleIndex(folder, manifest)
+    assert len(index.samples()) == 1
+    digest = index.digest(folder / 'in1.txt')
+    index.save()
+
+    # the samples and the hashes are read from the manifest while the folders did not change
+    os.rename(folder / 'ans1.txt', folder / 'moved')
+    _age(folder)
+    index = SampleIndex(folder, manifest)
+    assert [x.name for x in index.samples()] == ['1']
+    os.rename(folder / 'moved', folder / 'ans1.txt')
+    assert index.digest(folder / 'in1.txt') == digest
+    assert not index._dirty
+
+    # a new sample changes the mtime of its folder
+    _write(folder / 'sub' / 'in1.txt', b'1\n')
+    _write(folder / 'sub' / 'ans1.txt', b'1\n')
+    index = SampleIndex(folder, manifest)
+    assert [x.name for x in index.samples()] == ['1', 'sub/1']
+    assert index.digest(folder / 'in1.txt') == digest
+
+    # a file whose size changed is hashed again
+    _write(folder / 'in1.txt', b'12\n')
+    assert index.digest(folder / 'in1.txt') != digest
+
+
+def test_open_zstd(tmp_path):
+    zstandard = pytest.importorskip('zstandard')
+    path = tmp_path / 'in1.txt.zst'
+    path.write_bytes(zstandard.ZstdCompressor().compress(b'1 2\n'))
+    with open_case(path) as f:
+        assert f.read() == b'1 2\n'
+
+
+def test_kt_test(problem, capsys, monkeypatch):
+    import json
+    from kttool.actions.test import Test as TestAction
+    folder = problem(
+        'hello',
+        files={'hello.py': 'import sys\nsys.stdout.write(sys.stdin.read())\n'},
+        samples=[('1\n', '1\n')]
+    )
+    monkeypatch.chdir(folder)
+    _write(folder / 'large' / 'in1.txt.gz', b'7\n' * 2000)
+    _write(folder / 'large' / 'ans1.txt.gz', b'7\n' * 1999 + b'8\n')
+
+    TestAction('--format', 'json', cwd=folder).act()
+    captured = capsys.readouterr()
+    cases = json.loads(captured.out)['cases']
+    assert [(x['sample'], x['verdict']) for x in cases] == [
+        ('1', 'Accepted'), ('large/1', 'Wrong Answer')
+    ]
+    assert cases[1]['input'] == 'large/in1.txt.gz'
+    assert 'bytes compressed in total' in captured.err
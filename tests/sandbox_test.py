@@ -0,0 +1,85 @@
+import os
+import sys
+
+import pytest
+
+from kttool.runner import MLE, Limits, RunResult, run_program
+from kttool.sandbox import CgroupSandbox, CpuPool, ProcessSandbox, make_sandbox
+
+cgroup = pytest.mark.skipif(
+    CgroupSandbox().unavailable_reason() is not None,
+    reason='cgroups can not be used here'
+)
+
+
+def test_make_sandbox():
+    assert isinstance(make_sandbox('process'), ProcessSandbox)
+    assert make_sandbox('auto').name in ('cgroup', 'process')
+    with pytest.raises(ValueError):
+        make_sandbox('jail')
+
+
+def test_cgroup_unavailable(tmp_path):
+    assert 'can not be used' in CgroupSandbox(tmp_path).unavailable_reason()
+
+
+@pytest.mark.skipif(not hasattr(os, 'sched_setaffinity'), reason='Linux only')
+@pytest.mark.parametrize('enable, pin, written', [
+    (False, False, 'cpu io'),
+    (True, False, '+pids'),
+    (True, True, '+cpuset'),
+])
+def test_cgroup_controllers(tmp_path, enable, pin, written):
+    (tmp_path / 'cgroup.controllers').write_text('cpu cpuset io memory pids')
+    (tmp_path / 'cgroup.subtree_control').write_text('cpu io')
+    sandbox = CgroupSandbox(tmp_path, enable_controllers=enable, pin=pin)
+    assert sandbox.unavailable_reason() is not None
+    # the controllers kt needs are enabled one by one, only when asked to, and no other one
+    assert (tmp_path / 'cgroup.subtree_control').read_text() == written
+
+
+def test_oom_killed():
+    assert RunResult(returncode=-9, oom_killed=True).verdict(Limits()) == MLE
+
+
+def test_cpu_pool():
+    pool = CpuPool([3, 1])
+    with pool.take() as first, pool.take() as second:
+        assert (first, second) == (1, 3)
+    # a cpu given back is taken again
+    with pool.take() as cpu, pool.take() as other:
+        assert {cpu, other} == {1, 3}
+
+
+@cgroup
+def test_cgroup_sandbox():
+    sandbox = CgroupSandbox()
+    # the grand child leaves the process group and keeps the output open, it is killed with the
+    # rest of the cgroup
+    program = 'import subprocess\n' \
+        'subprocess.Popen(["sleep", "30"], start_new_session=True)\n' \
+        'print(sum(range(10 ** 6)))\n'
+    run = run_program([sys.executable, '-c', program], b'', Limits(), sandbox=sandbox)
+    assert run.verdict(Limits()) is None and not run.timed_out
+    assert run.cpu_time > 0
+    assert not [x for x in os.listdir(sandbox.root) if x.startswith(f'kt-{os.getpid()}-')]
+
+    limits = Limits(memory_limit=50)
+    run = run_program(
+        [sys.executable, '-c', 'x = bytearray(400 << 20)'], b'', limits, sandbox=sandbox
+    )
+    assert run.verdict(limits) == MLE
+
+
+def test_kt_test_sandbox(home, problem, capsys, monkeypatch):
+    from kttool.actions.test import Test as TestAction
+    folder = problem('hello', samples=[('1\n', '1\n')])
+    monkeypatch.chdir(folder)
+
+    TestAction('--sandbox', 'process', cwd=folder).act()
+    out = capsys.readouterr().out
+    assert 'Sandbox    : process' in out and 'Accepted' in out
+    if CgroupSandbox().unavailable_reason() is not None:
+        monkeypatch.setenv('KT_CGROUP', str(home))
+        with pytest.raises(RuntimeError, match='cgroup sandbox can not be used'):
+            TestAction('--sandbox', 'cgroup', cwd=folder).act()
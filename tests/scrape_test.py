@@ -0,0 +1,48 @@
+from pathlib import Path
+
+import pytest
+
+from kttool import scrape
+from kttool.actions.submit import SubmissionParseResult, Submit
+
+PAGES = Path(__file__).absolute().parent.parent / 'benchmarks' / 'pages'
+
+
+@pytest.fixture(params=scrape.available_parsers())
+def backend(request, monkeypatch):
+    monkeypatch.setenv(scrape.PARSER_ENV, request.param)
+    monkeypatch.setattr(scrape, '_parser', None)
+    return request.param
+
+
+def test_parse_samples(backend):
+    samples = scrape.parse_samples((PAGES / 'problem.html').read_bytes())
+    assert len(samples) == 6
+    assert samples[0] == '3\n3\n1 2147483647 2147483647\n5\n3 4 7 4 3\n5\n2 10 2 10 5\n'
+    assert samples[1] == 'Case #1: 1\nCase #2: 7\nCase #3: 5\n'
+    text = ' '.join(
+        scrape.parse_page_text((PAGES / 'problem.html').read_bytes()).split()
+    )
+    assert 'CPU Time limit 1 second' in text
+
+
+def test_parse_submission(backend):
+    row = scrape.parse_submission((PAGES / 'submission.html').read_bytes())
+    assert row.status == 'Wrong Answer'
+    assert row.run_time == '0.05\xa0s'
+    assert len(row.test_cases) == 48
+    assert 'is-rejected' in row.test_cases[-1]
+
+    verdict = Submit._parse_verdict(
+        SubmissionParseResult(row.test_cases, row.status, row.run_time)
+    )
+    assert verdict.is_done and verdict.is_rejected
+    assert verdict.ac_test_cases == 47
+    assert scrape.parse_submission(b'<html></html>') is None
+
+
+def test_parse_problem_list(backend):
+    problems = scrape.parse_problem_list((PAGES / 'problems.html').read_bytes())
+    assert len(problems) == 100
+    assert all(href.startswith('/problems/') for href, _ in problems)
+    assert problems[0][1] == '4.7 - 5.3'
@@ -0,0 +1,57 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+
+KT = Path(__file__).absolute().parent.parent / 'kt'
+# time kt may spend importing modules, on top of the interpreter startup
+BUDGET_MS = float(os.environ.get('KT_STARTUP_BUDGET_MS', 100))
+# only the commands that talk to Kattis or the user need these
+HEAVY_MODULES = {
+    'bs4', 'emoji', 'lxml', 'readline', 'reprint', 'requests', 'selectolax',
+    'webbrowser'
+}
+
+
+def _import_times(args: List[str], cwd: Path) -> Dict[str, int]:
+    """ Cumulative import time in us of each top level import, from `python -X importtime` """
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', *args],
+        cwd=cwd,
+        env={
+            **os.environ, 'HOME': str(cwd),
+            'KT_NO_DAEMON': '1'
+        },
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True
+    )
+    ret = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line.split('|')
+        if cumulative.strip().isdigit():
+            # nested imports are indented
+            ret[name[1:]] = int(cumulative)
+    return ret
+
+
+@pytest.mark.parametrize('command', ['version', 'test'])
+def test_startup(tmp_path, command):
+    (tmp_path / '.kattisrc').write_text(
+        '[user]\nusername = tester\ntoken = abc\n\n[kattis]\nhostname = open.kattis.com\n'
+    )
+    interpreter = _import_times(['-c', 'pass'], tmp_path)
+    imports = _import_times([str(KT), command], tmp_path)
+
+    heavy = {x.strip().split('.')[0] for x in imports} & HEAVY_MODULES
+    assert not heavy, f'kt {command} should not import {heavy}'
+    taken = sum(
+        v for k, v in imports.items()
+        if not k.startswith(' ') and k not in interpreter
+    ) / 1e3
+    assert taken < BUDGET_MS, f'kt {command} spent {taken:.1f} ms importing modules'
@@ -0,0 +1,24 @@
+import math
+
+import pytest
+
+from kttool.stats import Summary, summarize, welch_test
+
+
+def test_summarize():
+    assert summarize([0.5]) == Summary(1, 0.5, 0.5, 0.5, 0.5, 0.)
+
+    summary = summarize([float(x) for x in range(1, 21)])
+    assert (summary.count, summary.min, summary.median) == (20, 1., 10.5)
+    assert summary.p95 == pytest.approx(19.05)
+    assert summary.mean == 10.5
+    assert summary.stddev == pytest.approx(5.9160797831)
+
+
+def test_welch_test():
+    assert math.isnan(welch_test([1.], [1., 2.]))
+    assert welch_test([1., 1.], [1., 1.]) == 1.
+    assert welch_test([1., 1.], [2., 2.]) == 0.
+    # t = 1 / sqrt(2 / 3)
+    assert welch_test([1., 2., 3.], [2., 3., 4.]) == pytest.approx(0.2207, abs=1e-4)
+    assert welch_test([0.10, 0.11, 0.12, 0.10], [0.05, 0.06, 0.05, 0.05]) < 0.001
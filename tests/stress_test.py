@@ -0,0 +1,54 @@
+from kttool.actions.stress import Stress
+
+GENERATOR = '''\
+import random, sys
+random.seed(int(sys.argv[1]))
+n = random.randint(1, 6)
+print(n)
+print(*[random.randint(-5, 5) for _ in range(n)])
+'''
+
+REFERENCE = '''\
+n = int(input())
+a = list(map(int, input().split()))
+print(max(sum(a[i:j]) for i in range(n) for j in range(i + 1, n + 1)))
+'''
+
+# wrong when every number is negative
+SOLUTION = '''\
+input()
+best = cur = 0
+for x in map(int, input().split()):
+    cur = max(0, cur + x)
+    best = max(best, cur)
+print(best)
+'''
+
+
+def _problem(problem, solution, samples=()):
+    return problem(
+        'maxsum',
+        files={'gen.py': GENERATOR, 'brute.py': REFERENCE, 'sol.py': solution},
+        samples=samples
+    )
+
+
+def test_stress_saves_failing_input(problem):
+    folder = _problem(problem, SOLUTION, samples=[('1\n1\n', '1\n')])
+
+    Stress('gen.py', 'brute.py', 'sol.py', '-n', '200', '-j', '2',
+           cwd=folder).act()
+
+    raw_input = (folder / 'in2.txt').read_text().split()
+    assert all(int(x) < 0 for x in raw_input[1:])
+    assert (folder / 'ans2.txt').read_text().strip() == str(
+        max(int(x) for x in raw_input[1:])
+    )
+
+
+def test_stress_without_difference(problem):
+    folder = _problem(problem, REFERENCE)
+
+    Stress('gen.py', 'brute.py', 'sol.py', '-n', '10', cwd=folder).act()
+
+    assert not list(folder.glob('in*.txt'))
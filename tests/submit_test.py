@@ -1,30 +1,186 @@
-import shutil
-import tempfile
-import unittest
-from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 
 import pytest
 
-from kttool.actions.gen import Gen
-from kttool.actions.submit import SubmissionResult, Submit
+from kttool.actions.submit import SubmissionPoller, SubmissionResult, Submit
 
 
 @pytest.mark.parametrize(
-    "submission_result", [
-        SubmissionResult(
-            '10060968', 'https://open.kattis.com/submissions/10060968'
-        ),
-        SubmissionResult(
-            '8043679', 'https://open.kattis.com/submissions/8043679'
-        ),
+    "problem_id,status,rejected", [
+        ('oddmanout', 'Accepted', False),
+        ('different', 'Wrong Answer', True),
     ]
 )
-def test_submit_action(submission_result):
-    action = Submit()
+def test_submit_action(home, kattis, problem_id, status, rejected):
+    submission = kattis.submit(problem_id, 'Python 3', {})
+    submission_result = SubmissionResult(
+        str(submission.id), f'{kattis.url}/submissions/{submission.id}'
+    )
+    action = Submit(cwd=home)
     action.read_config_from_file()
-    soup = action._query_submission_id_url(submission_result)
-    result = action._parse_results_from_soup(soup)
-    verdict = action._parse_verdict(result)
-    assert verdict.is_done
-    assert not verdict.is_rejected
-    assert verdict.verdict == 'Accepted'
+    action.login()
+    # through the json view, then through the full page as for a server without one
+    for json_supported in (True, False):
+        poller = SubmissionPoller(action, submission_result)
+        poller.json_supported = json_supported
+        verdict = poller.poll()
+        assert verdict.is_done
+        assert verdict.is_rejected == rejected
+        assert verdict.status == status
+
+
+def test_submit_cli(problem, kattis):
+    folder = problem('oddmanout')
+    Submit(cwd=folder).act()
+
+    submission, = kattis.submissions.values()
+    assert submission.problem.id == 'oddmanout'
+    assert submission.files == {'oddmanout.py': b'print(input())\n'}
+    assert kattis.count('POST', '/login') == 1
+    # judged straight away, a single poll of the json view
+    assert kattis.count('GET', f'/submissions/{submission.id}') == 1
+
+
+def test_submit_relogin(problem, kattis):
+    folder = problem('hello')
+    Submit(cwd=folder).act()
+    # the next action reuses the saved session, until the server forgets it
+    kattis.expire_sessions()
+    Submit(cwd=folder).act()
+
+    assert len(kattis.submissions) == 2
+    assert kattis.count('POST', '/login') == 2
+    # the first upload of the second action was rejected, then sent again
+    assert kattis.count('POST', '/submit') == 3
+
+
+def test_concurrent_relogin(home, kattis):
+    submission = kattis.submit('hello', 'Python 3', {})
+    action = Submit(cwd=home)
+    action.read_config_from_file()
+    action.login()
+    kattis.expire_sessions()
+    kattis.latency = 0.05
+    url = f'{kattis.url}/submissions/{submission.id}'
+    # the threads share the session and all see it expire, only one of them logs in again
+    with ThreadPoolExecutor(8) as executor:
+        responses = list(executor.map(lambda _: action._request_get(url), range(8)))
+
+    assert all(x.status_code == 200 and not x.history for x in responses)
+    assert kattis.count('POST', '/login') == 2
+
+
+def test_submit_batch(home, problem, kattis):
+    for problem_id in ('hello', 'twostones', 'different'):
+        problem(problem_id)
+    Submit('--all', cwd=home).act()
+
+    assert sorted(x.problem.id for x in kattis.submissions.values()) == [
+        'different', 'hello', 'twostones'
+    ]
+    assert kattis.count('POST', '/login') == 1
+
+
+def test_submit_batch_same_problem(home, problem, kattis, capsys):
+    for parent in ('mine', 'theirs'):
+        problem('hello', parent=home / parent)
+    Submit('mine/hello', 'theirs/hello', cwd=home).act()
+
+    first, second = kattis.submissions.values()
+    assert first.problem.id == second.problem.id == 'hello'
+    # each folder has its own row, both submissions are followed until judged
+    out = capsys.readouterr().out
+    assert 'mine/hello' in out and 'theirs/hello' in out
+    for submission in (first, second):
+        assert kattis.count('GET', f'/submissions/{submission.id}') >= 1
+
+
+class _Response:
+    def __init__(self, status_code=200, payload=None, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self._payload = payload
+        self.content = b''
+
+    def json(self):
+        if self._payload is None:
+            raise ValueError('not json')
+        return self._payload
+
+
+class _FakeAction:
+    ''' Serve the queued responses, recording the headers of each request '''
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def _request_get(self, url, headers=None):
+        self.requests.append((url, headers))
+        return self.responses.pop(0)
+
+
+ROW_HTML = ''.join(
+    f'<i class="status-icon" title="Test case {i}/3: Accepted"></i>'
+    for i in range(1, 4)
+) + '<td data-type="cpu">0.05&nbsp;s</td>'
+
+
+def test_parse_json_verdict():
+    verdict = Submit._parse_json_verdict(
+        {'status_id': 16, 'testcase_index': 3, 'row_html': ROW_HTML}
+    )
+    assert verdict.is_done and not verdict.is_rejected
+    assert verdict.status == 'Accepted'
+    assert (verdict.ac_test_cases, verdict.num_test_cases) == (3, 3)
+    assert verdict.run_time == '0.05 s'
+
+    verdict = Submit._parse_json_verdict(
+        {'status_id': 14, 'testcase_index': 2, 'row_html': ROW_HTML}
+    )
+    assert verdict.is_done and verdict.is_rejected
+    assert verdict.ac_test_cases == 1
+
+    verdict = Submit._parse_json_verdict(
+        {'status_id': 5, 'testcase_index': 1, 'row_html': ROW_HTML}
+    )
+    assert not verdict.is_done and verdict.status == 'Running'
+
+
+def test_submission_poller():
+    submission = SubmissionResult('1', 'https://open.kattis.com/submissions/1')
+    running = {'status_id': 5, 'testcase_index': 1, 'row_html': ROW_HTML}
+    action = _FakeAction(
+        [
+            _Response(payload={'status_id': 3, 'row_html': ''}),
+            _Response(payload=running, headers={'ETag': '"v1"'}),
+            _Response(status_code=304),
+            _Response(status_code=304),
+            _Response(payload={**running, 'testcase_index': 2}),
+        ]
+    )
+    poller = SubmissionPoller(action, submission)
+
+    assert poller.poll().status == 'Compiling'
+    assert poller.interval == SubmissionPoller.FAST_INTERVAL
+    assert poller.poll().ac_test_cases == 1
+    assert poller.interval == SubmissionPoller.RUNNING_INTERVAL
+    # nothing changed, back off
+    assert poller.poll().ac_test_cases == 1
+    assert action.requests[-1][1] == {'If-None-Match': '"v1"'}
+    assert poller.interval > SubmissionPoller.RUNNING_INTERVAL
+    poller.poll()
+    assert poller.interval > SubmissionPoller.RUNNING_INTERVAL * SubmissionPoller.BACKOFF
+    # a test case has been judged
+    assert poller.poll().ac_test_cases == 2
+    assert poller.interval == SubmissionPoller.RUNNING_INTERVAL
+    assert all(url.endswith('?json') for url, _ in action.requests)
+
+
+def test_submission_poller_falls_back_to_page():
+    submission = SubmissionResult('1', 'https://open.kattis.com/submissions/1')
+    action = _FakeAction([_Response(), _Response()])
+    poller = SubmissionPoller(action, submission)
+    poller.action._parse_results_from_soup = lambda soup: None
+    assert poller.poll() is None
+    assert not poller.json_supported
+    assert action.requests[-1][0] == submission.submission_url
@@ -0,0 +1,41 @@
+from kttool.actions.surprise import Surprise
+from kttool.catalogue import ProblemCatalogue
+
+
+def test_surprise_action(home, kattis):
+    # problems already attempted are skipped, which leaves oddmanout between 1 and 2
+    (home / 'hello').mkdir()
+    (home / 'twostones').mkdir()
+    Surprise('1', '2', cwd=home).act()
+
+    assert (home / 'oddmanout/in1.txt').is_file()
+    assert (home / 'oddmanout/oddmanout.py').is_file()
+    with ProblemCatalogue() as catalogue:
+        assert sorted(
+            x.id for x in catalogue.query(kattis.hostname, 0., 10.)
+        ) == sorted(kattis.problems)
+        assert catalogue.query(kattis.hostname, 2.5, 3.)[0].id == 'different'
+
+    # the catalogue is fresh, no crawl this time
+    listed = kattis.count('GET', '/problems')
+    (home / 'oddmanout').rename(home / 'done')
+    Surprise('1.5', '2', cwd=home).act()
+    assert kattis.count('GET', '/problems') == listed
+    assert (home / 'oddmanout').is_dir()
+
+
+def test_surprise_incomplete_crawl(home, kattis):
+    (home / 'first').mkdir()
+    Surprise('0', '10', cwd=home / 'first').act()
+    with ProblemCatalogue() as catalogue:
+        crawled = catalogue.last_crawl(kattis.hostname)
+        known = len(catalogue.query(kattis.hostname, 0., 10.))
+
+    # a failing page is not the end of the listing: nothing is forgotten and the crawl is not
+    # recorded as complete
+    kattis.failing_pages = {1}
+    (home / 'second').mkdir()
+    Surprise('0', '10', '--refresh', cwd=home / 'second').act()
+    with ProblemCatalogue() as catalogue:
+        assert catalogue.last_crawl(kattis.hostname) == crawled
+        assert len(catalogue.query(kattis.hostname, 0., 10.)) == known